@@ -1,95 +1,18 @@
 import readline
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Union
 
-from selenium.webdriver import Chrome
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.remote.webelement import WebElement
-from selenium.webdriver.support.select import Select
+from categorizer import Guess, examples_of, load_categorizer, save_categorizer
+from datatypes import ChaseTxn, GoodbudgetTxn, PlannedTxn, TxnsGrouped
+from file_out import Logger
+from prefix_index import SortedPrefixIndex, completer
+from profiling import stage
+from rules import RuleMatcher
+from submit import GB_URL, SUBMIT_HTTP, SUBMIT_SELENIUM, HttpBackend, SubmitBackend, SubmitError
+from submit_queue import MAX_WORKERS, SubmitJournal, SubmitQueue, txn_fingerprints
 
-from datatypes import ChaseTxn, TxnsGrouped, GoodbudgetTxn
-
-
-class Driver:
-    def __init__(self):
-        self.chrome = Chrome()
-        self.chrome.get('https://goodbudget.com/login')
-        self.chrome.implicitly_wait(10)
-
-    def login(self, gb_username: str, gb_password: str):
-        self.chrome.find_element_by_id(
-            'username').send_keys(gb_username)
-        self.chrome.find_element_by_id(
-            'password').send_keys(gb_password)
-
-        # login submit button
-        self.chrome.find_element_by_xpath(
-            '//*[@id="content"]/div/div/div/section[2]/div/div/div/div/div/section/div/div/div[1]/div/div/section/div/div/div/div/div/div[1]/div/form/div/div[4]/button').click()
-
-    def _click_add_txn(self): self.chrome.find_element_by_xpath(
-        '/html/body/div[1]/div/div/div/div[1]/a[2]').click()
-
-    def _click_save_txn(self): self.chrome.find_element_by_id(
-        'addTransactionSave').click()
-
-    def add_expense(self, envelopes_dict: Dict[str, Union[str, None]],
-                    gb_txn: GoodbudgetTxn):
-        self._click_add_txn()
-
-        date_field = self.chrome.find_element_by_id('expense-date')
-        date_field.clear()
-        date_field.send_keys(gb_txn.date)
-
-        payee_el: WebElement = self.chrome.find_element_by_id(
-            'expense-receiver')
-        payee_el.send_keys(gb_txn.title)
-        payee_el.send_keys(Keys.RETURN)
-
-        # flip sign
-        amt = gb_txn.amt_dollars.replace('-', '') \
-            if '-' in gb_txn.amt_dollars \
-            else '-' + gb_txn.amt_dollars
-        amt_el = self.chrome.find_element_by_id('expense-amount')
-        amt_el.click()
-        amt_el.send_keys(amt)
-
-        # select envelope
-        Select(self.chrome.find_element_by_xpath(
-            '//*[@id="expenseCredit"]/form/fieldset/div[4]/div/select')
-        ).select_by_value(
-            envelopes_dict[gb_txn.envelope.replace(' ', '_').upper()])
-
-        if gb_txn.notes:
-            self.chrome \
-                .find_element_by_id('expense-notes') \
-                .send_keys(gb_txn.notes)
-
-        self._click_save_txn()
-
-    def add_income(self, gb_txn: GoodbudgetTxn):
-        self._click_add_txn()
-
-        self.chrome.find_element_by_xpath(
-            '//*[@id="myTab"]/li[3]/a').click()  # click income tab
-
-        date_field = self.chrome.find_element_by_id('income-date')
-        date_field.clear()
-        date_field.send_keys(gb_txn.date)
-
-        payer_el: WebElement = self.chrome.find_element_by_id(
-            'income-payer')
-        payer_el.send_keys(gb_txn.title)
-        payer_el.send_keys(Keys.RETURN)
-
-        self.chrome.find_element_by_xpath(
-            '//*[@id="income"]/form/fieldset/div[3]/div/input') \
-            .send_keys(gb_txn.amt_dollars)
-
-        if gb_txn.notes:
-            self.chrome \
-                .find_element_by_id('income-notes') \
-                .send_keys(gb_txn.notes)
-
-        self._click_save_txn()
+# sources of the planned txns that were asked about
+_ASKED_CONFIRMED = 'confirmed guess'
+_ASKED_ENTERED = 'entered'
 
 
 class MatchedTxn:
@@ -99,33 +22,9 @@ class MatchedTxn:
         self.gb_envelope = gb_envelope
 
 
-def env_completer(envelopes_dict: Dict[str, Union[str, None]]):
-    def index_env(text: str, state: int):
-        options = [
-            x for x in envelopes_dict if x.lower().startswith(text.lower())]
-        try:
-            return options[state]
-        except IndexError:
-            return None
-
-    return index_env
-
-
-def title_completer(matched_txns: List[MatchedTxn]):
-    def index_title(text: str, state: int):
-        options = [matched_txn.gb_title for matched_txn in matched_txns if matched_txn.gb_title.lower(
-        ).startswith(text.lower())]
-        try:
-            return options[state]
-        except IndexError:
-            return None
-
-    return index_title
-
-
-def is_correct_match(matched_txn: MatchedTxn):
+def is_correct_match(guess: Guess):
     print(
-        f'\tTitle: {matched_txn.gb_title}. Envelope: {matched_txn.gb_envelope}')
+        f'\tTitle: {guess.gb_title}. Envelope: {guess.gb_envelope}. ({guess.confidence:.0%} sure)')
     answer = input('\tIs this correct? (yes): ')
     return not answer or answer.lower() in ['y', 'yes']
 
@@ -136,45 +35,114 @@ def should_add(chase_txn: ChaseTxn):
     return not answer or answer.lower() in ['y', 'yes']
 
 
+def _is_plan_accepted(amt_unasked: int):
+    answer = input(f'Add the {amt_unasked} txns in the plan that weren\'t asked about? (yes): ')
+    return not answer or answer.lower() in ['y', 'yes']
+
+
+def _logged_in_backend(submit_backend: str, gb_url: str, gb_username: str, gb_password: str,
+                       max_workers: int) -> SubmitBackend:
+    # the http backend falls back to selenium if it can't log in
+    if submit_backend == SUBMIT_HTTP:
+        backend = HttpBackend(gb_url, max_workers)
+        try:
+            backend.login(gb_username, gb_password)
+            return backend
+        except (OSError, SubmitError) as e:
+            backend.close()
+            print(f'Couldn\'t log in over http ({e}), adding with selenium instead')
+
+    # selenium is only imported when it's used, since it takes a while
+    from selenium_backend import Driver
+
+    driver = Driver()
+    driver.login(gb_username, gb_password)
+    return driver
+
+
 def add_new_txns(txns_grouped: TxnsGrouped,
                  envelopes_dict: Dict[str, Union[str, None]],
                  gb_username: str,
                  gb_password: str,
-                 last_gb_txn_ts: int):
+                 last_gb_txn_ts: int,
+                 log: Logger,
+                 auto_accept: Optional[float] = None,
+                 rules: Optional[RuleMatcher] = None,
+                 submit_backend: str = SUBMIT_SELENIUM,
+                 gb_url: str = GB_URL,
+                 max_workers: int = MAX_WORKERS,
+                 confirm_plan: bool = False):
+    # the title and envelope of every txn is decided by a rule in `rules`, by
+    # a guess that is at least `auto_accept` sure, or else by asking. the ones
+    # that were asked about are added right away, by up to `max_workers`
+    # threads. the others are added once the plan with every txn is written,
+    # without asking, so that a run that nothing has to be asked about can be
+    # left alone. with `confirm_plan`, they're only added if the plan is
+    # accepted
+
     # cast MergedTxns which were matched into MatchedTxns. remove quotes from titles and envelopes
     matched_txns: List[MatchedTxn] = [MatchedTxn(
         x.ch_txn.title, x.gb_txn.title.replace('"', ''), x.gb_txn.envelope.replace('"', ''))
         for x in txns_grouped.both_txns]
 
+    # learn the matched txns that weren't learned in previous runs, to guess
+    # the goodbudget title and envelope of new txns
+    with stage('learn') as s:
+        categorizer = load_categorizer()
+        categorizer.sync(examples_of(txns_grouped.both_txns))
+        save_categorizer(categorizer)
+        s.add_rows(len(txns_grouped.both_txns))
+
     # set up tab completion
     readline.parse_and_bind("tab: complete")
-    title_completer_injected = title_completer(matched_txns)
-    env_completer_injected = env_completer(envelopes_dict)
-
-    driver = Driver()
-    driver.login(gb_username, gb_password)
-
-    # add each txn
-    for txn in txns_grouped.only_ch_txns:
-        if txn.ts > last_gb_txn_ts and not txn.is_pending and should_add(txn):
-            # find txn in `matched_txns` with most similar chase title to `txn`
-            similar_txn = matched_txns[0] if len(matched_txns) > 0 else None
-            max_eq_chars = -1
-            for matched_txn in matched_txns:
-                i = 0
-                while i < len(txn.title) and i < len(matched_txn.ch_title) and txn.title[i] == matched_txn.ch_title[i]:
-                    i += 1
-                if i > max_eq_chars:
-                    max_eq_chars = i
-                    similar_txn = matched_txn
-
+    gb_titles = SortedPrefixIndex(x.gb_title for x in matched_txns)
+    title_completer_injected = completer(gb_titles)
+    env_completer_injected = completer(SortedPrefixIndex(envelopes_dict))
+
+    journal = SubmitJournal()
+    queue = SubmitQueue(
+        lambda: _logged_in_backend(submit_backend, gb_url, gb_username, gb_password, max_workers),
+        envelopes_dict, journal, max_workers)
+
+    # decide each txn, except the ones that were added in a previous run
+    # that stopped before goodbudget was downloaded again
+    new_txns = [x for x in txns_grouped.only_ch_txns
+                if x.ts > last_gb_txn_ts and not x.is_pending]
+    to_decide = [(txn, fingerprint) for txn, fingerprint in zip(new_txns, txn_fingerprints(new_txns))
+                 if not journal.is_submitted(fingerprint)]
+    amt_submitted_before = len(new_txns) - len(to_decide)
+
+    # log in before asking about anything, so that answers aren't lost if it
+    # fails
+    if to_decide:
+        try:
+            queue.start()
+        except Exception as e:
+            journal.close()
+            print(f'Couldn\'t log in to goodbudget, nothing was added: {e}')
+            return
+
+    planned_txns: List[PlannedTxn] = []
+    for txn, fingerprint in to_decide:
+        rule = rules.match(txn) if rules else None
+        guess = categorizer.guess(txn.title, txn.amt_cents, txn.ts) if rule is None else None
+        if rule is not None:
+            gb_txn = GoodbudgetTxn(-1, txn.ts, txn.date, rule.gb_title, rule.gb_envelope,
+                                   txn.amt_dollars, rule.notes)
+            source = f'rule on line {rule.line_num}'
+        elif guess is not None and auto_accept is not None and guess.confidence >= auto_accept:
+            gb_txn = GoodbudgetTxn(-1, txn.ts, txn.date, guess.gb_title, guess.gb_envelope,
+                                   txn.amt_dollars, '')
+            source = f'guess {guess.confidence:.0%} sure'
+        elif should_add(txn):
             # get user input info for this new txn
             while True:
                 try:
-                    gb_title = similar_txn.gb_title if similar_txn else ""
-                    gb_envelope = similar_txn.gb_envelope if similar_txn else ""
+                    gb_title = guess.gb_title if guess else ""
+                    gb_envelope = guess.gb_envelope if guess else ""
+                    source = _ASKED_CONFIRMED
 
-                    if similar_txn is None or not is_correct_match(similar_txn):
+                    if guess is None or not is_correct_match(guess):
                         readline.set_completer(title_completer_injected)
                         gb_title = input('\tTitle: ')
 
@@ -182,11 +150,8 @@ def add_new_txns(txns_grouped: TxnsGrouped,
                             readline.set_completer(env_completer_injected)
                             gb_envelope = input('\tEnvelope: ')
 
-                        # add this new txn to `matched_txns` so that it could
-                        # be guessed as a `similar_txn` for a future `txn`
-                        matched_txns.append(MatchedTxn(
-                            ch_title=txn.title, gb_title=gb_title,
-                            gb_envelope=gb_envelope))
+                        gb_titles.insert(gb_title)
+                        source = _ASKED_ENTERED
 
                     gb_notes = input('\tNote? (none): ')
 
@@ -197,11 +162,37 @@ def add_new_txns(txns_grouped: TxnsGrouped,
                     # if user made a mistake, they press `Ctrl+D`, which will print a
                     # new line and let them re-insert the information
                     print('\n')
-
-            # run selenium code to add to GB
-            if txn.is_debit:
-                driver.add_expense(envelopes_dict, gb_txn)
-            else:
-                driver.add_income(gb_txn)
+        else:
+            continue
+
+        # learn this new txn so that it can be guessed better for a future
+        # `txn`. once it's in goodbudget, it's one of the matched txns, so
+        # the next run doesn't learn it again
+        categorizer.learn((txn.title, txn.amt_cents, txn.ts, gb_txn.title, gb_txn.envelope))
+        planned_txn = PlannedTxn(txn, gb_txn, source, fingerprint)
+        planned_txns.append(planned_txn)
+        if source in [_ASKED_CONFIRMED, _ASKED_ENTERED]:
+            queue.put(planned_txn)
+
+    save_categorizer(categorizer)
+    log.plan(planned_txns)
+    print(f'Saved plan to: {log.plan_file}')
+    if amt_submitted_before:
+        print(f'Skipped {amt_submitted_before} txns that were already added')
+
+    # txns that weren't asked about are added once the plan is written, and
+    # with `confirm_plan`, accepted
+    unasked_txns = [x for x in planned_txns if x.source not in [_ASKED_CONFIRMED, _ASKED_ENTERED]]
+    if unasked_txns and (not confirm_plan or _is_plan_accepted(len(unasked_txns))):
+        for planned_txn in unasked_txns:
+            queue.put(planned_txn)
+
+    # txns that were asked about may still be getting added
+    with stage('wait_for_added'):
+        failed = queue.join()
+    journal.close()
+    for planned_txn, e in failed:
+        ch_txn = planned_txn.ch_txn
+        print(f'Couldn\'t add {ch_txn.date}, {ch_txn.title}, {ch_txn.amt_dollars}: {e}')
 
     return
@@ -0,0 +1,81 @@
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from itertools import repeat
+import os
+import time
+from typing import List, Optional
+
+from datatypes import BatchJob, BatchResult
+from file_in import read_ch_txns, read_gb_txns
+from file_out import Logger, OUT_CSV, OUT_PARQUET
+from match import MATCH_GREEDY, get_txns_grouped
+
+# reconciles many pairs of Chase and Goodbudget files, each one in its own
+# process. the pairs come from a manifest: a csv file with a header and one
+# line per pair. relative paths in it are relative to the manifest. start
+# balances are in cents, like in the .env file
+MANIFEST_FIELD_NAMES = ['ch_file', 'gb_file', 'ch_start_bal', 'gb_start_bal', 'out_dir']
+
+
+def read_manifest(manifest_file: str) -> List[BatchJob]:
+    base_dir = os.path.dirname(manifest_file)
+    jobs: List[BatchJob] = []
+    with open(manifest_file, newline='') as in_file:
+        reader = csv.DictReader(in_file)
+        missing = set(MANIFEST_FIELD_NAMES) - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f'{manifest_file} is missing columns: {", ".join(sorted(missing))}')
+
+        for row in reader:
+            try:
+                jobs.append(BatchJob(
+                    ch_file=os.path.join(base_dir, row['ch_file']),
+                    gb_file=os.path.join(base_dir, row['gb_file']),
+                    ch_start_bal=int(row['ch_start_bal'] or 0),
+                    gb_start_bal=int(row['gb_start_bal'] or 0),
+                    out_dir=os.path.join(base_dir, row['out_dir'])))
+            except ValueError:
+                raise ValueError(f'{manifest_file}, line {reader.line_num}: start balances '
+                                 'must be whole amounts of cents')
+    return jobs
+
+
+def run_job(job: BatchJob, match_mode: str = MATCH_GREEDY, out_format: str = OUT_CSV) -> BatchResult:
+    # does what `python3 main.py` does for one pair. an error in one pair
+    # doesn't stop the others
+    start = time.perf_counter()
+    try:
+        log = Logger(job.out_dir)
+        with log.failed_lines_writer() as ch_failed:
+            ch_txns = read_ch_txns(job.ch_start_bal, ch_failed.write, job.ch_file).txns
+        with log.failed_lines_writer() as gb_failed:
+            gb_txns = read_gb_txns(job.gb_start_bal, gb_failed.write, job.gb_file).txns
+
+        txns_grouped = get_txns_grouped(
+            ch_txns, gb_txns, job.ch_start_bal, job.gb_start_bal, match_mode)
+        log.amt_matched_and_unmatched(txns_grouped)
+        if out_format == OUT_PARQUET:
+            log.txns_grouped_parquet(txns_grouped)
+        else:
+            log.txns_grouped(txns_grouped)
+    except (OSError, ValueError) as e:
+        return BatchResult(job, secs=time.perf_counter() - start, error=str(e))
+    except Exception as e:
+        # anything else, like a bug that only some file hits, is recorded too,
+        # instead of stopping the whole batch
+        return BatchResult(job, secs=time.perf_counter() - start, error=f'{type(e).__name__}: {e}')
+
+    return BatchResult(job, ch_failed.amt_failed, gb_failed.amt_failed,
+                       len(txns_grouped.only_ch_txns), len(txns_grouped.only_gb_txns),
+                       len(txns_grouped.both_txns), time.perf_counter() - start)
+
+
+def run_batch(jobs: List[BatchJob], max_workers: Optional[int] = None,
+              match_mode: str = MATCH_GREEDY, out_format: str = OUT_CSV) -> List[BatchResult]:
+    # `max_workers` defaults to the number of cores. results are in the order
+    # of `jobs`
+    if max_workers == 1 or len(jobs) <= 1:
+        return [run_job(job, match_mode, out_format) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers) as executor:
+        return list(executor.map(run_job, jobs, repeat(match_mode), repeat(out_format)))
@@ -0,0 +1,707 @@
+from collections import Counter
+from datetime import datetime as dt
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+from batch import read_manifest, run_batch
+from categorizer import (
+    AUTO_ACCEPT_CONFIDENCE,
+    Categorizer,
+    Example,
+    load_categorizer,
+    save_categorizer,
+)
+from check import _cmp_sort_merged_txns
+from datatypes import (
+    ChaseTxn,
+    GoodbudgetTxn,
+    MergedTxn,
+    MergedTxn_ChaseTxn,
+    MergedTxn_GoodbudgetTxn,
+    PlannedTxn,
+    TxnsGrouped,
+)
+import file_in
+from file_out import (
+    _CH_FIELD_NAMES,
+    _GB_FIELD_NAMES,
+    _MERGED_TXN_FIELD_NAMES,
+    Logger,
+    _bal_and_freq_to_row,
+    _ch_txn_to_row,
+    _gb_txn_to_row,
+)
+from match import MATCH_GREEDY, MATCH_OPTIMAL, _sort_merged_txns, get_txns_grouped
+from prefix_index import SortedPrefixIndex
+from regex import CH_REGEX, GB_EXPENSE_REGEX, GB_INCOME_REGEX
+from store import ReconcileStore
+from submit import HttpBackend
+from submit_queue import SubmitJournal, SubmitQueue, txn_fingerprints
+from synthetic import synthetic_lines, write_synthetic_files
+
+# benchmarks for the slow parts of this repo, on synthetic data.
+# usage: python3 bench.py {parse|memory|match|sort|optimal|incremental|batch|write|parquet|graph|cache|render|balance|prefix|categorize|submit|startup} [amt_rows]
+
+
+### Previous implementations, kept to compare against ###################
+def _regex_shorten(s: str) -> str:
+    s = re.sub(r',', '', s)
+    s = re.sub(r'\s+', ' ', s)
+    s = s[0:26]
+    if ' ' in s and s[-1] != '"':
+        s += '"'
+
+    return s
+
+
+def _regex_parse_ch_line(i: int, line: str) -> Optional[ChaseTxn]:
+    if not (txn := CH_REGEX.match(line)):
+        return None
+
+    txn = txn.groupdict()
+    return ChaseTxn(
+        id_=i,
+        ts=int(dt.strptime(txn['date'], "%m/%d/%Y").timestamp()),
+        is_debit=txn['deb_or_cred'] == 'DEBIT',
+        is_pending=txn['balance'] == ' ',
+        date=txn['date'],
+        title=_regex_shorten(txn['title']),
+        amt_dollars=txn['amt']
+    )
+
+
+def _regex_parse_gb_line(i: int, line: str) -> Optional[GoodbudgetTxn]:
+    if not ((txn := GB_EXPENSE_REGEX.match(line)) or (txn := GB_INCOME_REGEX.match(line))):
+        return None
+
+    txn = txn.groupdict()
+    return GoodbudgetTxn(
+        id_=i,
+        ts=int(dt.strptime(txn['date'], "%m/%d/%Y").timestamp()),
+        date=txn['date'],
+        title=_regex_shorten(txn['title']),
+        envelope=(txn['envelope'] if txn['envelope']
+                  != '' else 'Income'),
+        amt_dollars=txn['amt'],
+        notes=txn['notes']
+    )
+
+
+def _merged_txn_to_row(merged_txn: MergedTxn) -> str:
+    txn_type = 'BOTH'
+
+    if isinstance(merged_txn, MergedTxn_ChaseTxn):
+        txn_type = 'CHASE'
+        gb_row = ',' * 5
+    else:
+        gb_row = _gb_txn_to_row(merged_txn.gb_txn)
+
+    if isinstance(merged_txn, MergedTxn_GoodbudgetTxn):
+        txn_type = 'GOODBUDGET'
+        ch_row = ',' * 4
+    else:
+        ch_row = _ch_txn_to_row(merged_txn.ch_txn)
+
+    return ','.join([txn_type, ch_row, gb_row, str(merged_txn.bal_diff/100)])
+
+
+def _loop_write_txns_grouped(log: Logger, txns_grouped: TxnsGrouped) -> None:
+    with open(log.ch_file, 'w') as out_file:
+        out_file.write(f'{_CH_FIELD_NAMES}\n')
+        for txn in txns_grouped.only_ch_txns:
+            out_file.write(f"{_ch_txn_to_row(txn)}\n")
+
+    with open(log.gb_file, 'w') as out_file:
+        out_file.write(f'{_GB_FIELD_NAMES}\n')
+        for txn in txns_grouped.only_gb_txns:
+            out_file.write(f"{_gb_txn_to_row(txn)}\n")
+
+    with open(log.both_file, 'w') as out_file:
+        out_file.write(f'{_MERGED_TXN_FIELD_NAMES}\n')
+        for txn in txns_grouped.both_txns:
+            out_file.write(f"{_merged_txn_to_row(txn)}\n")
+
+    with open(log.merged_file, 'w') as out_file:
+        out_file.write(f'{_MERGED_TXN_FIELD_NAMES}\n')
+        for txn in txns_grouped.merged_txns:
+            out_file.write(f"{_merged_txn_to_row(txn)}\n")
+
+    with open(log.bal_diff_freq_file, 'w') as out_file:
+        out_file.write('Balance,Frequency\n')
+        for bal_and_freq in txns_grouped.bal_diff_freq:
+            out_file.write(f"{_bal_and_freq_to_row(bal_and_freq)}\n")
+
+
+def _loop_monthly_spending_env(txns: List[GoodbudgetTxn], envelope: str) -> Dict[dt, int]:
+    month_spent: Dict[dt, int] = {}
+    for txn in txns:
+        if txn.envelope == envelope:
+            first_of_month = dt.fromtimestamp(txn.ts).replace(day=1)
+            month_spent[first_of_month] = month_spent.get(first_of_month, 0) + txn.amt_cents
+    return month_spent
+
+
+def _loop_amt_from_most_popular(txns: List[GoodbudgetTxn]) -> Dict[str, Dict[str, int]]:
+    env_to_title_to_amt_txns: Dict[str, Dict[str, int]] = {}
+    for txn in txns:
+        title_to_amt_txns = env_to_title_to_amt_txns.setdefault(txn.envelope, {})
+        title_to_amt_txns[txn.title] = title_to_amt_txns.get(txn.title, 0) + 1
+    return env_to_title_to_amt_txns
+
+
+### Helpers #############################################################
+def _timed(f: Callable[[], int]) -> float:
+    # returns how many rows per second `f` processes
+    start = time.perf_counter()
+    amt_rows = f()
+    return amt_rows / (time.perf_counter() - start)
+
+
+def _count_parsed(path: str, parse_line: Callable) -> int:
+    amt_parsed = 0
+    with open(path) as in_file:
+        for i, line in enumerate(in_file):
+            if parse_line(i, line) is not None:
+                amt_parsed += 1
+    return amt_parsed
+
+
+def _count_streamed(txn_batches) -> int:
+    return sum(len(batch) for batch in txn_batches)
+
+
+def _use_synthetic_files(tmp_dir: str, amt_rows: int) -> None:
+    file_in.IN_CH_FILE = f'{tmp_dir}/chase.csv'
+    file_in.IN_GB_FILE = f'{tmp_dir}/goodbudget.csv'
+    write_synthetic_files(file_in.IN_CH_FILE, file_in.IN_GB_FILE, amt_rows)
+
+
+def _categorized_examples(amt_rows: int) -> List[Example]:
+    # matched txns, oldest first, whose envelope depends on the title, and
+    # for some titles on the amount or on the day of the week. some are
+    # categorized differently than usual, like real ones
+    rand = random.Random(0)
+    envelopes = {'AMAZON': lambda amt, day: 'Groceries' if amt < -5000 else 'Fun',
+                 'VENMO': lambda amt, day: 'Rent' if day == 0 else 'Eating Out',
+                 'NETFLIX': lambda amt, day: 'Bills', 'SPOTIFY': lambda amt, day: 'Bills',
+                 'TRADER': lambda amt, day: 'Groceries', 'CON': lambda amt, day: 'Bills',
+                 'UBER': lambda amt, day: 'Transportation',
+                 'SHELL': lambda amt, day: 'Transportation',
+                 'DUANE': lambda amt, day: 'Groceries', 'ACME': lambda amt, day: 'Income',
+                 'STARBUCKS': lambda amt, day: 'Eating Out'}
+    ch_lines, _ = synthetic_lines(amt_rows)
+    examples: List[Example] = []
+    for line in reversed(ch_lines[1:]):
+        txn = _regex_parse_ch_line(0, line)
+        first_word = re.split('[ .]', txn.title.strip('"'))[0]
+        ch_title = re.sub('[0-9]+', lambda _: str(rand.randint(1, 99999)), txn.title)
+        gb_title = first_word.title()
+        gb_envelope = envelopes[first_word](
+            txn.amt_cents, dt.fromtimestamp(txn.ts).weekday())
+        if rand.random() < 0.03:
+            gb_envelope = rand.choice(['Groceries', 'Fun', 'Rent', 'Eating Out', 'Bills'])
+        examples.append((ch_title, txn.amt_cents, txn.ts, gb_title, gb_envelope))
+    return examples
+
+
+def _allocated(f: Callable[[], object]) -> int:
+    # returns how many bytes are still allocated by what `f` returns
+    tracemalloc.start()
+    result = f()
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return allocated
+
+
+def _ignore(_: str) -> None:
+    return None
+
+
+def _txn_list(txn_batches) -> list:
+    txns = []
+    for batch in txn_batches:
+        txns.extend(batch)
+    return txns
+
+
+### Benchmarks ##########################################################
+def bench_parse(tmp_dir: str, amt_rows: int) -> None:
+    _use_synthetic_files(tmp_dir, amt_rows)
+    results = [
+        ('chase, regex + strptime', _timed(
+            lambda: _count_parsed(file_in.IN_CH_FILE, _regex_parse_ch_line))),
+        ('chase, cached columns', _timed(
+            lambda: _count_streamed(file_in.iter_ch_txns(0, _ignore)))),
+        ('goodbudget, regex + strptime', _timed(
+            lambda: _count_parsed(file_in.IN_GB_FILE, _regex_parse_gb_line))),
+        ('goodbudget, cached columns', _timed(
+            lambda: _count_streamed(file_in.iter_gb_txns(0, _ignore)))),
+    ]
+    for name, rows_per_sec in results:
+        print(f'{name:<30} {rows_per_sec:>12,.0f} lines/sec')
+
+
+def bench_memory(tmp_dir: str, amt_rows: int) -> None:
+    _use_synthetic_files(tmp_dir, amt_rows)
+
+    results = [
+        ('chase, list of ChaseTxn', _allocated(
+            lambda: _txn_list(file_in.iter_ch_txns(0, _ignore)))),
+        ('chase, ChaseTxnTable', _allocated(
+            lambda: file_in.read_ch_txns(0, _ignore).txns)),
+        ('goodbudget, list of GoodbudgetTxn', _allocated(
+            lambda: _txn_list(file_in.iter_gb_txns(0, _ignore)))),
+        ('goodbudget, GoodbudgetTxnTable', _allocated(
+            lambda: file_in.read_gb_txns(0, _ignore).txns)),
+    ]
+    for name, allocated in results:
+        print(f'{name:<35} {allocated / 2**20:>8.1f} MiB'
+              f' {allocated / amt_rows:>6.0f} bytes/txn')
+
+
+def bench_match(tmp_dir: str, amt_rows: int) -> None:
+    _use_synthetic_files(tmp_dir, amt_rows)
+    ch_txns = file_in.read_ch_txns(0, _ignore).txns
+    gb_txns = file_in.read_gb_txns(0, _ignore).txns
+
+    start = time.perf_counter()
+    txns_grouped = get_txns_grouped(ch_txns, gb_txns, 0, 0)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    get_txns_grouped(ch_txns, gb_txns, 0, 0)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print(f'get_txns_grouped: {elapsed:.2f} s, {len(txns_grouped.merged_txns):,} merged txns,'
+          f' {len(txns_grouped.both_txns):,} matched, {peak / 2**20:.1f} MiB peak')
+
+
+def bench_sort(tmp_dir: str, amt_rows: int) -> None:
+    _use_synthetic_files(tmp_dir, amt_rows)
+    ch_txns = file_in.read_ch_txns(0, _ignore).txns
+    gb_txns = file_in.read_gb_txns(0, _ignore).txns
+    merged_txns = get_txns_grouped(ch_txns, gb_txns, 0, 0).merged_txns
+    random.Random(0).shuffle(merged_txns)
+
+    results = []
+    for name, sort in [('cmp_to_key double sort', _cmp_sort_merged_txns),
+                       ('merge of file orders', _sort_merged_txns)]:
+        start = time.perf_counter()
+        results.append(sort(merged_txns))
+        print(f'{name:<25} {time.perf_counter() - start:>6.2f} s')
+
+    # when the two files disagree about the order of some matched txns there
+    # is no single right order, so count how many txns are still followed by
+    # the same txn in both results
+    old_order, new_order = results
+    next_in_new = {id(x): id(y) for x, y in zip(new_order, new_order[1:])}
+    amt_same = sum(next_in_new.get(id(x)) == id(y)
+                   for x, y in zip(old_order, old_order[1:]))
+    print(f'{amt_same:,} of {len(merged_txns) - 1:,} txns followed by the same txn')
+
+
+def bench_optimal(tmp_dir: str, amt_rows: int) -> None:
+    _use_synthetic_files(tmp_dir, amt_rows)
+    ch_txns = file_in.read_ch_txns(0, _ignore).txns
+    gb_txns = file_in.read_gb_txns(0, _ignore).txns
+
+    pairs = []
+    for match_mode in [MATCH_GREEDY, MATCH_OPTIMAL]:
+        start = time.perf_counter()
+        both_txns = get_txns_grouped(ch_txns, gb_txns, 0, 0, match_mode).both_txns
+        elapsed = time.perf_counter() - start
+
+        days_apart = sum(abs(x.ch_txn.ts - x.gb_txn.ts) for x in both_txns) / (60 * 60 * 24)
+        pairs.append({(x.ch_txn.id_, x.gb_txn.id_) for x in both_txns})
+        print(f'{match_mode:<8} {elapsed:>6.2f} s, {len(both_txns):,} matched,'
+              f' {days_apart:,.0f} days apart in total')
+
+    greedy_pairs, optimal_pairs = pairs
+    amt_different = len(optimal_pairs - greedy_pairs)
+    print(f'{amt_different:,} of {len(optimal_pairs):,} optimal pairs'
+          f' ({amt_different / max(len(optimal_pairs), 1):.1%}) differ from the greedy ones')
+
+
+def bench_incremental(tmp_dir: str, amt_rows: int) -> None:
+    # a full history, then a run after a day's worth of txns were added
+    file_in.IN_CH_FILE = f'{tmp_dir}/chase.csv'
+    file_in.IN_GB_FILE = f'{tmp_dir}/goodbudget.csv'
+    ch_lines, gb_lines = synthetic_lines(amt_rows)
+    amt_new = max(amt_rows // 3650, 1)
+
+    def write_files(amt_skipped: int) -> None:
+        with open(file_in.IN_CH_FILE, 'w') as out_file:
+            out_file.writelines(ch_lines[:1] + ch_lines[1 + amt_skipped:])
+        with open(file_in.IN_GB_FILE, 'w') as out_file:
+            out_file.writelines(gb_lines[:1] + gb_lines[1 + amt_skipped:])
+
+    def run_full() -> int:
+        ch_txns = file_in.read_ch_txns(0, _ignore).txns
+        gb_txns = file_in.read_gb_txns(0, _ignore).txns
+        return len(get_txns_grouped(ch_txns, gb_txns, 0, 0).merged_txns)
+
+    def run_stored() -> int:
+        store = ReconcileStore(f'{tmp_dir}/reconcile.sqlite3')
+        ch_read = store.read_ch_txns(0, _ignore)
+        gb_read = store.read_gb_txns(0, _ignore)
+        txns_grouped = store.get_txns_grouped(ch_read, gb_read, 0, 0, MATCH_GREEDY)
+        store.close()
+        return len(txns_grouped.merged_txns)
+
+    write_files(amt_new)
+    for name, run in [('first run, full', run_full),
+                      ('first run, incremental', run_stored)]:
+        start = time.perf_counter()
+        run()
+        print(f'{name:<30} {time.perf_counter() - start:>6.2f} s')
+
+    write_files(0)
+    for name, run in [(f'+{amt_new} rows, full', run_full),
+                      (f'+{amt_new} rows, incremental', run_stored)]:
+        start = time.perf_counter()
+        run()
+        print(f'{name:<30} {time.perf_counter() - start:>6.2f} s')
+
+
+def bench_batch(tmp_dir: str, amt_rows: int) -> None:
+    # `amt_rows` split across 8 pairs of files, with more and more workers
+    amt_jobs = 8
+    with open(f'{tmp_dir}/manifest.csv', 'w') as manifest:
+        manifest.write('ch_file,gb_file,ch_start_bal,gb_start_bal,out_dir\n')
+        for job in range(amt_jobs):
+            write_synthetic_files(f'{tmp_dir}/chase{job}.csv', f'{tmp_dir}/goodbudget{job}.csv',
+                                  amt_rows // amt_jobs, seed=job)
+            manifest.write(f'chase{job}.csv,goodbudget{job}.csv,0,0,out{job}\n')
+    jobs = read_manifest(f'{tmp_dir}/manifest.csv')
+
+    amt_cores = os.cpu_count() or 1
+    print(f'{amt_jobs} pairs of {amt_rows // amt_jobs} rows, {amt_cores} cores')
+    workers = 1
+    while True:
+        start = time.perf_counter()
+        results = run_batch(jobs, workers)
+        secs = time.perf_counter() - start
+        assert not any(x.error for x in results)
+        print(f'{workers} workers: {secs:>6.2f} s, {amt_rows / secs:>9,.0f} rows/sec')
+        if workers >= min(amt_cores, amt_jobs):
+            break
+        workers = min(workers * 2, amt_cores, amt_jobs)
+
+
+def bench_write(tmp_dir: str, amt_rows: int) -> None:
+    _use_synthetic_files(tmp_dir, amt_rows)
+    ch_txns = file_in.read_ch_txns(0, _ignore).txns
+    gb_txns = file_in.read_gb_txns(0, _ignore).txns
+    txns_grouped = get_txns_grouped(ch_txns, gb_txns, 0, 0)
+    print(f'{len(txns_grouped.merged_txns):,} merged txns')
+
+    for name, write in [('one write call per row', _loop_write_txns_grouped),
+                        ('Logger.txns_grouped', Logger.txns_grouped)]:
+        log = Logger(f'{tmp_dir}/out')
+        start = time.perf_counter()
+        write(log, txns_grouped)
+        print(f'{name:<24} {time.perf_counter() - start:>6.2f} s')
+
+
+def bench_parquet(tmp_dir: str, amt_rows: int) -> None:
+    # needs pandas and pyarrow
+    import pandas as pd
+
+    _use_synthetic_files(tmp_dir, amt_rows)
+    ch_txns = file_in.read_ch_txns(0, _ignore).txns
+    gb_txns = file_in.read_gb_txns(0, _ignore).txns
+    txns_grouped = get_txns_grouped(ch_txns, gb_txns, 0, 0)
+    log = Logger(f'{tmp_dir}/out')
+    print(f'{len(txns_grouped.merged_txns):,} merged txns')
+
+    for name, f in [('write csv', lambda: log.txns_grouped(txns_grouped)),
+                    ('write parquet', lambda: log.txns_grouped_parquet(txns_grouped)),
+                    ('read merged.csv', lambda: pd.read_csv(log.merged_file)),
+                    ('read merged.parquet', lambda: pd.read_parquet(log.merged_parquet_file))]:
+        start = time.perf_counter()
+        f()
+        print(f'{name:<20} {time.perf_counter() - start:>7.3f} s')
+    print(f'merged.csv {os.path.getsize(log.merged_file) / 2**20:.1f} MiB, '
+          f'merged.parquet {os.path.getsize(log.merged_parquet_file) / 2**20:.1f} MiB')
+
+
+def bench_graph(tmp_dir: str, amt_rows: int) -> None:
+    # needs pandas
+    from graph_data import GbAggregates, txns_frame
+
+    _use_synthetic_files(tmp_dir, amt_rows)
+    gb_txns = file_in.read_gb_txns(0, _ignore).txns
+
+    start = time.perf_counter()
+    aggregates = GbAggregates(txns_frame(gb_txns))
+    print(f'{"load and aggregate":<32} {time.perf_counter() - start:>8.3f} s')
+
+    envelope = aggregates.envelopes[0]
+    for name, f in [('loop: most popular titles', lambda: _loop_amt_from_most_popular(gb_txns)),
+                    ('most_popular_titles', aggregates.most_popular_titles),
+                    ('loop: monthly spending', lambda: _loop_monthly_spending_env(gb_txns, envelope)),
+                    ('monthly_cents_env', lambda: aggregates.monthly_cents_env(envelope))]:
+        start = time.perf_counter()
+        f()
+        print(f'{name:<32} {time.perf_counter() - start:>8.3f} s')
+
+
+def bench_cache(tmp_dir: str, amt_rows: int) -> None:
+    # needs pandas
+    from graph_data import load_aggregates
+
+    _use_synthetic_files(tmp_dir, amt_rows)
+    for name in ['no cache', 'cached', 'cached, file touched']:
+        if name == 'cached, file touched':
+            os.utime(file_in.IN_GB_FILE)
+        start = time.perf_counter()
+        load_aggregates(0)
+        print(f'{name:<22} {time.perf_counter() - start:>7.3f} s')
+
+
+def bench_render(tmp_dir: str, amt_rows: int) -> None:
+    # needs pandas and matplotlib
+    from graph_draw import render_all
+    from graph_data import load_aggregates
+
+    _use_synthetic_files(tmp_dir, amt_rows)
+    aggregates = load_aggregates(0)
+    amt_cores = os.cpu_count() or 1
+    workers = 1
+    while True:
+        start = time.perf_counter()
+        out_files = render_all(aggregates, f'{tmp_dir}/graphs', max_workers=workers)
+        secs = time.perf_counter() - start
+        print(f'{workers} workers: {len(out_files)} graphs in {secs:.2f} s, '
+              f'{len(out_files) / secs:.1f} graphs/sec')
+        if workers >= amt_cores:
+            break
+        workers = min(workers * 2, amt_cores)
+
+
+def bench_balance(tmp_dir: str, amt_rows: int) -> None:
+    # needs pandas and matplotlib
+    from matplotlib.figure import Figure
+
+    from datatypes import BALANCE_RESOLUTIONS
+    from graph import Balance
+    from graph_data import GbAggregates, txns_frame
+    from graph_draw import draw
+
+    _use_synthetic_files(tmp_dir, amt_rows)
+    gb_txns = file_in.read_gb_txns(0, _ignore).txns
+    aggregates = GbAggregates(txns_frame(gb_txns))
+
+    def plot_every_txn() -> None:
+        # what the Balance graph did before: one point per txn
+        fig = Figure()
+        dates = [dt.fromtimestamp(x.ts) for x in gb_txns]
+        balances = [x.bal/100 for x in gb_txns]
+        fig.subplots().plot(dates, balances, 'o', color='b', linestyle='solid')
+        fig.savefig(f'{tmp_dir}/balance.png')
+
+    def plot_resolution(resolution: str) -> Callable[[], None]:
+        def plot() -> None:
+            fig = Figure()
+            draw(Balance(resolution), aggregates, fig)
+            fig.savefig(f'{tmp_dir}/balance_{resolution}.png')
+        return plot
+
+    for name, f in [('every txn, no downsampling', plot_every_txn)] + \
+            [(f'by {x}', plot_resolution(x)) for x in BALANCE_RESOLUTIONS]:
+        start = time.perf_counter()
+        f()
+        print(f'{name:<28} {time.perf_counter() - start:>7.3f} s')
+
+
+def bench_prefix(tmp_dir: str, amt_rows: int) -> None:
+    # completing the titles of 1,000 new txns, from `amt_rows` titles
+    _use_synthetic_files(tmp_dir, amt_rows)
+    ch_txns = file_in.read_ch_txns(0, _ignore).txns
+    ch_titles = [x.title for x in ch_txns]
+    new_titles = random.Random(0).sample(ch_titles, min(1000, len(ch_titles)))
+
+    start = time.perf_counter()
+    scanned = [sorted({y for y in ch_titles if y.lower().startswith(x[:3].lower())}, key=str.lower)
+               for x in new_titles]
+    scan_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = SortedPrefixIndex(ch_titles)
+    build_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    completed = [index.starting_with(x[:3]) for x in new_titles]
+    index_secs = time.perf_counter() - start
+
+    assert completed == scanned
+    print(f'scan: {scan_secs:.2f} s, prefix index: {index_secs:.3f} s'
+          f' (+{build_secs:.2f} s to build once)')
+
+
+def bench_categorize(tmp_dir: str, amt_rows: int) -> None:
+    # learns the oldest 90% of `amt_rows` matched txns, then guesses the rest
+    examples = _categorized_examples(amt_rows)
+    amt_learned = len(examples) * 9 // 10
+    learned = Counter(examples[:amt_learned])
+
+    start = time.perf_counter()
+    categorizer = Categorizer()
+    categorizer.sync(learned)
+    learn_secs = time.perf_counter() - start
+
+    model_file = f'{tmp_dir}/categorizer.pickle'
+    start = time.perf_counter()
+    save_categorizer(categorizer, model_file)
+    categorizer = load_categorizer(model_file)
+    cache_secs = time.perf_counter() - start
+
+    # one more run's worth of matched txns
+    start = time.perf_counter()
+    amt_synced = categorizer.sync(Counter(examples[:amt_learned + len(examples) // 100]))
+    sync_secs = time.perf_counter() - start
+    categorizer.sync(learned)
+
+    tests = examples[amt_learned:]
+    start = time.perf_counter()
+    guesses = [categorizer.guess(x[0], x[1], x[2]) for x in tests]
+    guess_secs = time.perf_counter() - start
+
+    right = [(x.gb_title, x.gb_envelope) == y[3:] for x, y in zip(guesses, tests)]
+    accepted = [x.confidence >= AUTO_ACCEPT_CONFIDENCE for x in guesses]
+    amt_accepted = sum(accepted)
+    accepted_right = sum(x and y for x, y in zip(accepted, right))
+
+    print(f'learn {amt_learned:,}: {learn_secs:.2f} s, save and load: {cache_secs:.2f} s,'
+          f' learn {amt_synced:,} more: {sync_secs:.3f} s')
+    print(f'guess {len(tests):,}: {guess_secs:.2f} s,'
+          f' right: {sum(right) / len(tests):.1%}')
+    print(f'auto-accepted at {AUTO_ACCEPT_CONFIDENCE:.0%}: {amt_accepted / len(tests):.1%},'
+          f' {accepted_right / max(amt_accepted, 1):.1%} of them right')
+
+
+def bench_submit(tmp_dir: str, amt_rows: int) -> None:
+    # adds `amt_rows` txns to a local stand-in for goodbudget that takes 10 ms
+    # per request and fails 10% of them. `python3 check.py submit` checks
+    # that adding them again with the same journal doesn't send them again
+    from mock_goodbudget import MockGoodbudget
+
+    ch_lines, _ = synthetic_lines(amt_rows)
+    ch_txns = [_regex_parse_ch_line(i, x) for i, x in enumerate(ch_lines[1:])]
+    planned_txns = [PlannedTxn(x, GoodbudgetTxn(-1, x.ts, x.date, x.title, 'Fun', x.amt_dollars, ''),
+                               'entered', fingerprint)
+                    for x, fingerprint in zip(ch_txns, txn_fingerprints(ch_txns))]
+
+    for max_workers in [1, 8]:
+        server = MockGoodbudget(delay_secs=0.01, fail_rate=0.1).start()
+        journal = SubmitJournal(f'{tmp_dir}/submitted_{max_workers}.sqlite3')
+
+        def connect() -> HttpBackend:
+            backend = HttpBackend(server.url, max_workers)
+            backend.login('', '')
+            return backend
+
+        start = time.perf_counter()
+        queue = SubmitQueue(connect, {'FUN': '1'}, journal, max_workers, backoff_secs=0.01)
+        for planned_txn in planned_txns:
+            queue.put(planned_txn)
+        failed = queue.join()
+        secs = time.perf_counter() - start
+        amt_again = sum(not journal.is_submitted(x.fingerprint) for x in planned_txns)
+        journal.close()
+        server.shutdown()
+
+        print(f'{max_workers} workers: {len(planned_txns) / secs:.0f} txns/s, {len(server.saved):,} saved,'
+              f' {len(failed)} failed, {len(server.requests) - 1:,} requests,'
+              f' {server.amt_connections} connections, {amt_again} not journaled')
+
+
+# modules that reconciling mustn't import, and the most its imports can take
+_STARTUP_HEAVY_MODULES = ['matplotlib', 'numpy', 'pandas', 'pyarrow', 'selenium']
+_STARTUP_BUDGET_SECS = 0.1
+
+
+def bench_startup(tmp_dir: str, amt_rows: int) -> None:
+    # `python3 main.py reconcile` on `amt_rows` rows, with `-X importtime`.
+    # fails if it imports a heavy module or if its imports take too long
+    main_file = os.path.abspath(f'{os.path.dirname(__file__)}/main.py')
+    os.makedirs(f'{tmp_dir}/in')
+    write_synthetic_files(f'{tmp_dir}/in/chase.csv', f'{tmp_dir}/in/goodbudget.csv', amt_rows)
+    with open(f'{tmp_dir}/.env', 'w') as out_file:
+        out_file.write('CH_START_BAL=0\nGB_START_BAL=0\nGB_USERNAME=\nGB_PASSWORD=\n')
+
+    def top_level_imports(args: List[str]) -> Tuple[Dict[str, int], str]:
+        # microseconds each top-level import took, from lines like
+        # "import time: self [us] | cumulative | imported package", where
+        # the imports of imports are indented
+        result = subprocess.run([sys.executable, '-X', 'importtime'] + args,
+                                cwd=tmp_dir, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(result.stdout + result.stderr)
+            exit(1)
+        imports = {}
+        for line in result.stderr.splitlines():
+            if (m := re.match(r'import time:\s+\d+ \|\s+(\d+) \| (\S+)', line)):
+                imports[m[2]] = int(m[1])
+        return imports, result.stderr
+
+    # what the interpreter imports by itself, like `site`, isn't counted,
+    # since it's the same for any script and varies a lot between runs
+    interpreter_imports, _ = top_level_imports(['-c', 'pass'])
+    start = time.perf_counter()
+    all_imports, stderr = top_level_imports([main_file, 'reconcile'])
+    secs = time.perf_counter() - start
+    imports = [(us, name) for name, us in all_imports.items() if name not in interpreter_imports]
+    import_secs = sum(us for us, _ in imports) / 1e6
+    heavy = sorted({m[1] for m in re.finditer(r'\| +(\S+)$', stderr, re.MULTILINE)
+                    if m[1].split('.')[0] in _STARTUP_HEAVY_MODULES})
+
+    print(f'{"whole run":<28} {secs:>7.3f} s')
+    print(f'{"imports":<28} {import_secs:>7.3f} s, budget {_STARTUP_BUDGET_SECS} s')
+    for us, name in sorted(imports, reverse=True)[:5]:
+        print(f'  {name:<26} {us / 1e6:>7.3f} s')
+    if heavy:
+        print(f'Error, reconciling imported {", ".join(heavy)}')
+    if import_secs > _STARTUP_BUDGET_SECS:
+        print('Error, imports took longer than the budget')
+    if heavy or import_secs > _STARTUP_BUDGET_SECS:
+        exit(1)
+
+
+BENCHMARKS = {
+    'parse': bench_parse,
+    'memory': bench_memory,
+    'match': bench_match,
+    'sort': bench_sort,
+    'optimal': bench_optimal,
+    'incremental': bench_incremental,
+    'batch': bench_batch,
+    'write': bench_write,
+    'parquet': bench_parquet,
+    'graph': bench_graph,
+    'cache': bench_cache,
+    'render': bench_render,
+    'balance': bench_balance,
+    'prefix': bench_prefix,
+    'categorize': bench_categorize,
+    'submit': bench_submit,
+    'startup': bench_startup,
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS or len(sys.argv) > 3:
+        print(f'usage: python3 bench.py {{{"|".join(BENCHMARKS)}}} [amt_rows]')
+        exit(1)
+
+    amt_rows = int(sys.argv[2]) if len(sys.argv) == 3 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        BENCHMARKS[sys.argv[1]](tmp_dir, amt_rows)
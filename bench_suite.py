@@ -0,0 +1,153 @@
+from importlib.util import find_spec
+import json
+import os
+import sys
+import tempfile
+from typing import Dict, List
+
+import file_in
+from file_out import Logger
+from match import get_txns_grouped
+from profiling import Profiler, stage, start_profiling, stop_profiling
+from synthetic import SyntheticOptions, write_synthetic_files
+
+# times and memory-profiles every stage of reconciling synthetic files of
+# 10k, 100k and 1M rows: ingest, matching, output and graph aggregation, and
+# compares them to a baseline from a previous run, on the same machine.
+# usage: python3 bench_suite.py [--rows=N,N,...] [--baseline=FILE] [--save-baseline]
+# which exits with 1 if a stage got slower or used more memory than in the
+# baseline by more than the tolerance
+
+SUITE_ROWS = [10_000, 100_000, 1_000_000]
+BASELINE_FILE = './bench_baseline.json'
+# a stage regressed if it's this much slower, or uses this much more memory
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.10
+# differences smaller than these are noise
+_MIN_SECS = 0.05
+_MIN_BYTES = 1 << 20
+_AMT_TIMED_RUNS = 3
+
+# like real exports: a few pending txns and lines that don't parse, and some
+# goodbudget txns too far from their chase txns to be matched
+_OPTIONS = SyntheticOptions(beyond_skew_rate=0.01, amt_pending=10, malformed_rate=0.001)
+
+# the stats of every stage, by amount of rows and by stage
+Results = Dict[str, Dict[str, Dict[str, float]]]
+
+
+def _run_stages(out_dir: str) -> None:
+    with stage('ingest') as s:
+        ch_txns = file_in.read_ch_txns(0, lambda _: None).txns
+        gb_txns = file_in.read_gb_txns(0, lambda _: None).txns
+        s.add_rows(len(ch_txns) + len(gb_txns))
+    with stage('match') as s:
+        txns_grouped = get_txns_grouped(ch_txns, gb_txns, 0, 0)
+        s.add_rows(len(txns_grouped.merged_txns))
+    with stage('output') as s:
+        Logger(out_dir).txns_grouped(txns_grouped)
+        s.add_rows(len(txns_grouped.merged_txns))
+
+    # needs pandas
+    if find_spec('pandas') is not None:
+        from graph_data import GbAggregates, txns_frame
+
+        with stage('graph_aggregation') as s:
+            GbAggregates(txns_frame(gb_txns))
+            s.add_rows(len(gb_txns))
+
+
+def _profiled(out_dir: str, trace_memory: bool) -> Profiler:
+    start_profiling(trace_memory=trace_memory)
+    _run_stages(out_dir)
+    return stop_profiling()
+
+
+def bench_rows(tmp_dir: str, amt_rows: int) -> Dict[str, Dict[str, float]]:
+    # times are the best of a few runs without tracing memory, which slows
+    # everything down. memory is traced in a run of its own
+    file_in.IN_CH_FILE = f'{tmp_dir}/chase.csv'
+    file_in.IN_GB_FILE = f'{tmp_dir}/goodbudget.csv'
+    write_synthetic_files(file_in.IN_CH_FILE, file_in.IN_GB_FILE, amt_rows, options=_OPTIONS)
+
+    stats: Dict[str, Dict[str, float]] = {}
+    for _ in range(_AMT_TIMED_RUNS if amt_rows <= 100_000 else 1):
+        for x in _profiled(f'{tmp_dir}/out', trace_memory=False).stage_stats():
+            best = stats.setdefault(x.name, {'wall_secs': x.wall_secs, 'cpu_secs': x.cpu_secs})
+            best['wall_secs'] = min(best['wall_secs'], x.wall_secs)
+            best['cpu_secs'] = min(best['cpu_secs'], x.cpu_secs)
+            best['rows'] = x.amt_rows
+    for x in _profiled(f'{tmp_dir}/out', trace_memory=True).stage_stats():
+        stats[x.name]['peak_bytes'] = x.peak_bytes
+    return stats
+
+
+def regressions(results: Results, baseline: Results) -> List[str]:
+    found: List[str] = []
+    for amt_rows, stages in results.items():
+        for name, x in stages.items():
+            before = baseline.get(amt_rows, {}).get(name)
+            if before is None:
+                continue
+            if x['wall_secs'] - before['wall_secs'] > max(before['wall_secs'] * TIME_TOLERANCE, _MIN_SECS):
+                found.append(f'{amt_rows} rows, {name}: {before["wall_secs"]:.3f} s -> {x["wall_secs"]:.3f} s')
+            if x['peak_bytes'] - before['peak_bytes'] > max(before['peak_bytes'] * MEMORY_TOLERANCE, _MIN_BYTES):
+                found.append(f'{amt_rows} rows, {name}: {before["peak_bytes"] / (1 << 20):.1f} MiB -> '
+                             f'{x["peak_bytes"] / (1 << 20):.1f} MiB')
+    return found
+
+
+def _print_stats(amt_rows: int, stats: Dict[str, Dict[str, float]]) -> None:
+    print(f'{amt_rows} rows:')
+    for name, x in stats.items():
+        label = '  ' * name.count('/') + name.split('/')[-1]
+        print(f'  {label:<28} {x["wall_secs"]:>8.3f} s {x["cpu_secs"]:>8.3f} s cpu '
+              f'{x["peak_bytes"] / (1 << 20):>8.1f} MiB {x["rows"]:>9,.0f} rows')
+
+
+if __name__ == "__main__":
+    # parse cmd-line args
+    suite_rows = SUITE_ROWS
+    baseline_file = BASELINE_FILE
+    save_baseline = False
+    for arg in sys.argv[1:]:
+        if arg.startswith('--rows=') and all(x.isdigit() for x in arg[len('--rows='):].split(',')):
+            suite_rows = [int(x) for x in arg[len('--rows='):].split(',')]
+        elif arg.startswith('--baseline='):
+            baseline_file = arg[len('--baseline='):]
+        elif arg == '--save-baseline':
+            save_baseline = True
+        else:
+            print('usage: python3 bench_suite.py [--rows=N,N,...] [--baseline=FILE] [--save-baseline]')
+            exit(1)
+
+    results: Results = {}
+    for amt_rows in suite_rows:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results[str(amt_rows)] = bench_rows(tmp_dir, amt_rows)
+        _print_stats(amt_rows, results[str(amt_rows)])
+
+    if save_baseline:
+        # the sizes that weren't run are kept
+        baseline: Results = {}
+        if os.path.exists(baseline_file):
+            with open(baseline_file) as in_file:
+                baseline = json.load(in_file)
+        baseline.update(results)
+        with open(baseline_file, 'w') as out_file:
+            json.dump(baseline, out_file, indent=2)
+            out_file.write('\n')
+        print(f'Saved baseline to: {baseline_file}')
+        exit(0)
+
+    if not os.path.exists(baseline_file):
+        print(f'No baseline in {baseline_file} to compare to, save one with --save-baseline')
+        exit(0)
+    with open(baseline_file) as in_file:
+        found = regressions(results, json.load(in_file))
+    if found:
+        print('Regressions:')
+        for x in found:
+            print(f'  {x}')
+        exit(1)
+    print(f'No regressions against {baseline_file}')
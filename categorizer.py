@@ -0,0 +1,189 @@
+from collections import Counter
+from datetime import datetime as dt
+import math
+import os
+import pickle
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from datatypes import MergedTxn_BothTxns
+
+# guesses the goodbudget title and envelope of a chase txn from the txns that
+# were already matched. it's a naive bayes classifier over the words and
+# character trigrams of the chase title, the size of the amount, whether it's
+# a debit, and the day of the week. it only keeps counts, so it can learn and
+# unlearn txns one at a time, and it's kept on disk between runs so that only
+# the txns that were matched since the last run have to be learned
+
+MODEL_FILE = './in/categorizer.pickle'
+# guesses at least this sure can be added without asking
+AUTO_ACCEPT_CONFIDENCE = 0.95
+
+_MODEL_VERSION = 1
+_ALPHA = 0.1
+_LOG_ALPHA = math.log(_ALPHA)
+_NGRAM_SIZE = 3
+
+# every feature belongs to a group. the likelihoods of the features of a group
+# are averaged, so that a long title doesn't count more than the amount
+_WORD = 'w'
+_NGRAM = 'c'
+_AMOUNT = 'a'
+_DEBIT = 'd'
+_WEEKDAY = 'y'
+_GROUPS = [_WORD, _NGRAM, _AMOUNT, _DEBIT, _WEEKDAY]
+
+_DIGITS_REGEX = re.compile(r'[0-9]+')
+_WORD_REGEX = re.compile(r'[a-z#]+')
+
+# (chase title, amount in cents, timestamp, goodbudget title, goodbudget envelope)
+Example = Tuple[str, int, int, str, str]
+Label = Tuple[str, str]
+
+
+def _features(title: str, amt_cents: int, ts: int) -> List[Tuple[str, str]]:
+    # (group, feature) pairs. numbers in titles, like store numbers and ids,
+    # are replaced with '#', since they're rarely the same twice
+    title = _DIGITS_REGEX.sub('#', title.lower())
+    padded = f' {" ".join(title.split())} '
+    features = [(_WORD, x) for x in set(_WORD_REGEX.findall(title))]
+    features += [(_NGRAM, x) for x in
+                 {padded[i:i + _NGRAM_SIZE] for i in range(len(padded) - _NGRAM_SIZE + 1)}]
+    # amounts within a factor of about 1.4 of each other share a feature
+    features.append((_AMOUNT, str(round(2 * math.log2(abs(amt_cents) + 1)))))
+    features.append((_DEBIT, str(amt_cents < 0)))
+    features.append((_WEEKDAY, str(dt.fromtimestamp(ts).weekday())))
+    return features
+
+
+def examples_of(both_txns: Iterable[MergedTxn_BothTxns]) -> Counter:
+    # quotes are removed from goodbudget titles and envelopes, like when
+    # they're added
+    return Counter((x.ch_txn.title, x.ch_txn.amt_cents, x.ch_txn.ts,
+                    x.gb_txn.title.replace('"', ''), x.gb_txn.envelope.replace('"', ''))
+                   for x in both_txns)
+
+
+class Guess:
+    def __init__(self, gb_title: str, gb_envelope: str, confidence: float):
+        self.gb_title = gb_title
+        self.gb_envelope = gb_envelope
+        # probability that the guess is right, according to the model
+        self.confidence = confidence
+
+
+class Categorizer:
+    def __init__(self):
+        self.version = _MODEL_VERSION
+        self.labels: List[Label] = []
+        self.label_ids: Dict[Label, int] = {}
+        # amount of examples of every label
+        self.label_counts: List[int] = []
+        # for every group: the amount of features of every label, and for
+        # every feature, how many times each label had it
+        self.group_totals: Dict[str, List[int]] = {x: [] for x in _GROUPS}
+        self.feature_counts: Dict[str, Dict[str, Dict[int, int]]] = {x: {} for x in _GROUPS}
+        # every example that was learned, so that `sync` only learns the
+        # difference
+        self.learned: Counter = Counter()
+
+    def _label_id(self, label: Label) -> int:
+        label_id = self.label_ids.get(label)
+        if label_id is None:
+            label_id = self.label_ids[label] = len(self.labels)
+            self.labels.append(label)
+            self.label_counts.append(0)
+            for totals in self.group_totals.values():
+                totals.append(0)
+        return label_id
+
+    def learn(self, example: Example, times: int = 1) -> None:
+        # `times` can be negative, to unlearn an example
+        ch_title, amt_cents, ts, gb_title, gb_envelope = example
+        label_id = self._label_id((gb_title, gb_envelope))
+        self.label_counts[label_id] += times
+        for group, feature in _features(ch_title, amt_cents, ts):
+            self.group_totals[group][label_id] += times
+            counts = self.feature_counts[group].setdefault(feature, {})
+            count = counts.get(label_id, 0) + times
+            if count:
+                counts[label_id] = count
+            else:
+                del counts[label_id]
+                if not counts:
+                    del self.feature_counts[group][feature]
+        self.learned[example] += times
+        if not self.learned[example]:
+            del self.learned[example]
+
+    def sync(self, examples: Counter) -> int:
+        # learns `examples` and unlearns every example that isn't in them
+        # anymore. returns how many examples were learned or unlearned
+        amt_changed = 0
+        for example in examples.keys() | self.learned.keys():
+            times = examples[example] - self.learned[example]
+            if times:
+                self.learn(example, times)
+                amt_changed += abs(times)
+        return amt_changed
+
+    def guess(self, ch_title: str, amt_cents: int, ts: int) -> Optional[Guess]:
+        amt_examples = sum(self.label_counts)
+        if amt_examples == 0:
+            return None
+
+        txn_features = _features(ch_title, amt_cents, ts)
+        by_group: Dict[str, List[str]] = {x: [] for x in _GROUPS}
+        for group, feature in txn_features:
+            if feature in self.feature_counts[group]:
+                by_group[group].append(feature)
+
+        # log of the probability of every label. features that a label never
+        # had only count through its total, so only the labels that had a
+        # feature are looked at for it
+        label_ids = [i for i, count in enumerate(self.label_counts) if count > 0]
+        scores = {i: math.log(self.label_counts[i] / amt_examples) for i in label_ids}
+        for group, features in by_group.items():
+            if not features:
+                continue
+            amt_features = len(self.feature_counts[group])
+            totals = self.group_totals[group]
+            for i in label_ids:
+                scores[i] += _LOG_ALPHA - math.log(totals[i] + _ALPHA * amt_features)
+            weight = 1 / len(features)
+            for feature in features:
+                for i, count in self.feature_counts[group][feature].items():
+                    if i in scores:
+                        scores[i] += weight * (math.log(count + _ALPHA) - _LOG_ALPHA)
+
+        best = max(scores, key=scores.__getitem__)
+        probability = 1 / sum(math.exp(x - scores[best]) for x in scores.values())
+
+        # that's only the probability of the best label out of the ones that
+        # were learned. a title unlike any learned one is probably none of
+        # them, so it's also weighed by how much of the title the best label
+        # had: the share of its trigrams that the label had before
+        ngrams = [x for group, x in txn_features if group == _NGRAM]
+        amt_had = sum(best in self.feature_counts[_NGRAM].get(x, ()) for x in ngrams)
+        gb_title, gb_envelope = self.labels[best]
+        return Guess(gb_title, gb_envelope, probability * amt_had / max(len(ngrams), 1))
+
+
+def load_categorizer(model_file: str = MODEL_FILE) -> Categorizer:
+    # a new categorizer if there's none, or if it was made by another version
+    try:
+        with open(model_file, 'rb') as in_file:
+            categorizer = pickle.load(in_file)
+    except Exception:
+        return Categorizer()
+    if not isinstance(categorizer, Categorizer) or categorizer.version != _MODEL_VERSION:
+        return Categorizer()
+    return categorizer
+
+
+def save_categorizer(categorizer: Categorizer, model_file: str = MODEL_FILE) -> None:
+    # written to a temporary file first, so that it's never half-written
+    tmp_file = f'{model_file}.tmp'
+    with open(tmp_file, 'wb') as out_file:
+        pickle.dump(categorizer, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, model_file)
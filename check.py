@@ -0,0 +1,260 @@
+from functools import cmp_to_key
+import json
+import os
+import random
+import sys
+import tempfile
+from typing import Callable, Dict, List, Tuple
+
+from datatypes import (
+    ChaseTxn,
+    GoodbudgetTxn,
+    MergedTxn,
+    MergedTxn_BothTxns,
+    MergedTxn_ChaseTxn,
+    MergedTxn_GoodbudgetTxn,
+    PlannedTxn,
+)
+from file_in import _parse_ch_line
+from match import _sort_merged_txns
+from mock_goodbudget import MockGoodbudget
+from submit import _LOGIN_PATH, _SAVE_TXN_PATH, HttpBackend, SubmitBackend, SubmitError
+from submit_queue import SubmitJournal, SubmitQueue, txn_fingerprints
+from synthetic import synthetic_lines
+
+# checks of the parts of this repo that can't be tried on real data without
+# touching a real account, or whose behavior a faster rewrite must keep.
+# usage: python3 check.py {sort|submit}
+# which exits with 1 if a check fails
+
+_AMT_SORT_CASES = 2000
+
+
+### Previous implementations, kept to compare against ###################
+def _cmp_sort_merged_txns(merged_txns: List[MergedTxn]) -> List[MergedTxn]:
+    def get_gb_id(txn: MergedTxn) -> int:
+        if isinstance(txn, MergedTxn_ChaseTxn):
+            return 1
+        else:
+            return -txn.gb_txn.id_
+
+    def compare(txn_1: MergedTxn, txn_2: MergedTxn):
+        def get_ts(txn: MergedTxn):
+            if isinstance(txn, MergedTxn_ChaseTxn):
+                return txn.ch_txn.ts
+            else:
+                return txn.gb_txn.ts
+
+        if not isinstance(txn_1, MergedTxn_ChaseTxn) and not isinstance(txn_2, MergedTxn_ChaseTxn):
+            return -1 if txn_1.gb_txn.id_ > txn_2.gb_txn.id_ else 1
+        elif not isinstance(txn_1, MergedTxn_GoodbudgetTxn) and not isinstance(txn_2, MergedTxn_GoodbudgetTxn):
+            return -1 if txn_1.ch_txn.id_ > txn_2.ch_txn.id_ else 1
+        else:
+            txn_1_ts = get_ts(txn_1)
+            txn_2_ts = get_ts(txn_2)
+            if txn_1_ts < txn_2_ts:
+                return -1
+            elif txn_1_ts > txn_2_ts:
+                return 1
+            else:
+                return 0
+
+    sorted_by_gb_id = sorted(merged_txns, key=get_gb_id)
+    return sorted(sorted_by_gb_id, key=cmp_to_key(compare))
+
+
+### Checks ##############################################################
+def _sort_case(rand: random.Random, cross: bool) -> Tuple[List[MergedTxn], List[MergedTxn]]:
+    # merged txns from oldest to newest, with few dates so that many are on
+    # the same date, and their ids as if they were read from files. chase-only
+    # txns go after goodbudget-only txns on the same date, like the sort puts
+    # them. the dates of matched txns are up to a few days apart, and are
+    # never compared. if `cross`, some matched txns are swapped in the
+    # goodbudget file, so that their pairs cross. returns them in that order,
+    # and shuffled
+    amt_txns = rand.randint(0, 12)
+    kinds = [rand.choice(['ch', 'gb', 'both']) for _ in range(amt_txns)]
+    days = sorted(rand.randint(0, 4) for _ in range(amt_txns))
+    order = sorted(range(amt_txns), key=lambda i: (days[i], kinds[i] == 'ch', rand.random()))
+    kinds = [kinds[i] for i in order]
+    days = sorted(days)
+
+    amt_ch = sum(x != 'gb' for x in kinds)
+    amt_gb = sum(x != 'ch' for x in kinds)
+    gb_ids = list(range(amt_gb - 1, -1, -1))
+    both_is = [i for i, x in enumerate(kinds) if x == 'both']
+    if cross and len(both_is) >= 2:
+        # the goodbudget ids of two matched txns are swapped
+        a, b = sorted(rand.sample(both_is, 2))
+        gb_i = {i: j for j, i in enumerate(i for i, x in enumerate(kinds) if x != 'ch')}
+        gb_ids[gb_i[a]], gb_ids[gb_i[b]] = gb_ids[gb_i[b]], gb_ids[gb_i[a]]
+
+    merged_txns: List[MergedTxn] = []
+    ch_id, gb_i = amt_ch, 0
+    for kind, day in zip(kinds, days):
+        ts = day * 86400
+        if kind != 'gb':
+            ch_id -= 1
+            ch_txn = ChaseTxn(ch_id, ts, True, False, '', '', '-1.00')
+        if kind != 'ch':
+            gb_txn = GoodbudgetTxn(gb_ids[gb_i], ts + rand.randint(-3, 3) * 86400 * (kind == 'both'),
+                                   '', '', '', '-1.00', '')
+            gb_i += 1
+        merged_txns.append(MergedTxn_ChaseTxn(ch_txn) if kind == 'ch' else
+                           MergedTxn_GoodbudgetTxn(gb_txn) if kind == 'gb' else
+                           MergedTxn_BothTxns(ch_txn, gb_txn))
+    shuffled = merged_txns[:]
+    rand.shuffle(shuffled)
+    return merged_txns, shuffled
+
+
+def _in_order(merged_txns: List[MergedTxn], has: type, get_id: Callable[[MergedTxn], int]) -> bool:
+    # whether the txns from one file are in the order of that file, newest
+    # first
+    ids = [get_id(x) for x in merged_txns if not isinstance(x, has)]
+    return ids == sorted(ids, reverse=True)
+
+
+def check_sort() -> List[str]:
+    # the merge of both file orders against the sort with a comparator it
+    # replaced. when matched txns are in the same order in both files, the
+    # comparator gives one order, and the merge has to give the same one.
+    # when their pairs cross, the comparator isn't consistent, so there is no
+    # one order to compare to. then the goodbudget order wins: goodbudget txns
+    # stay in file order, and only matched chase txns can be out of it
+    failed: List[str] = []
+    rand = random.Random(0)
+    for case in range(_AMT_SORT_CASES):
+        cross = case % 2 == 1
+        expected, shuffled = _sort_case(rand, cross)
+        merged_txns_sorted = _sort_merged_txns(shuffled)
+        if sorted(map(id, merged_txns_sorted)) != sorted(map(id, expected)):
+            failed.append(f'case {case}: txns were lost or repeated')
+        elif not cross:
+            if [id(x) for x in _cmp_sort_merged_txns(shuffled)] != [id(x) for x in merged_txns_sorted]:
+                failed.append(f'case {case}: not in the order of the comparator sort')
+            if [id(x) for x in expected] != [id(x) for x in merged_txns_sorted]:
+                failed.append(f'case {case}: not in the order of both files')
+        elif not _in_order(merged_txns_sorted, MergedTxn_ChaseTxn, lambda x: x.gb_txn.id_):
+            failed.append(f'case {case}: goodbudget txns not in the order of their file')
+        elif not _in_order([x for x in merged_txns_sorted if isinstance(x, MergedTxn_ChaseTxn)],
+                           MergedTxn_GoodbudgetTxn, lambda x: x.ch_txn.id_):
+            failed.append(f'case {case}: chase-only txns not in the order of their file')
+    return failed
+
+
+def check_submit() -> List[str]:
+    # logs in and adds an expense and an income over http to a local stand-in
+    # for goodbudget
+    failed: List[str] = []
+
+    # a backend that's missing a method can't be made
+    class _Incomplete(SubmitBackend):
+        def login(self, gb_username: str, gb_password: str) -> None:
+            pass
+
+    try:
+        _Incomplete()
+        failed.append('a backend without add_expense and add_income could be made')
+    except TypeError:
+        pass
+
+    server = MockGoodbudget().start()
+    backend = HttpBackend(server.url)
+    try:
+        # goodbudget only saves txns of a logged in session
+        try:
+            backend.add_income(GoodbudgetTxn(-1, 0, '01/02/2020', 'Acme', '', '100.00', ''), 'key-0')
+            failed.append('a txn was saved before logging in')
+        except SubmitError as e:
+            if e.retryable:
+                failed.append(f'saving before logging in can be retried: {e}')
+
+        backend.login('user', 'pass')
+        backend.add_expense({'EATING_OUT': '7'},
+                            GoodbudgetTxn(-1, 0, '01/02/2020', 'Pizza', 'Eating Out', '-12.50', 'lunch'),
+                            'key-1')
+        backend.add_income(GoodbudgetTxn(-1, 0, '01/03/2020', 'Acme', '', '100.00', ''), 'key-2')
+        # sent again, like after a lost response
+        backend.add_income(GoodbudgetTxn(-1, 0, '01/03/2020', 'Acme', '', '100.00', ''), 'key-2')
+    except (OSError, SubmitError) as e:
+        failed.append(f'couldn\'t add txns: {e}')
+    finally:
+        backend.close()
+        server.shutdown()
+
+    logins = [x for x in server.requests if x.path == _LOGIN_PATH]
+    if len(logins) != 1 or logins[0].body != b'_username=user&_password=pass':
+        failed.append(f'expected one login with the username and password, got: '
+                      f'{[x.body for x in logins]}')
+    saves = [x for x in server.requests if x.path == _SAVE_TXN_PATH]
+    if any(x.headers.get('Content-Type') != 'application/json' for x in saves):
+        failed.append('txns weren\'t sent as json')
+    expected: Dict[str, dict] = {
+        'key-1': {'type': 'expense', 'date': '01/02/2020', 'payee': 'Pizza', 'amount': '12.50',
+                  'envelope': '7', 'notes': 'lunch'},
+        'key-2': {'type': 'income', 'date': '01/03/2020', 'payer': 'Acme', 'amount': '100.00',
+                  'notes': ''},
+    }
+    if server.saved != expected:
+        failed.append(f'expected saved txns {json.dumps(expected)}, got {json.dumps(server.saved)}')
+    return failed + _check_submit_again()
+
+
+def _check_submit_again() -> List[str]:
+    # adds txns through a queue to a stand-in that fails some requests, then
+    # adds the same txns again with the same journal, like after a crash.
+    # every txn has to be saved once, and the second run can't send anything
+    failed: List[str] = []
+    ch_lines, _ = synthetic_lines(200)
+    ch_txns = [_parse_ch_line(i, x) for i, x in enumerate(ch_lines)]
+    ch_txns = [x for x in ch_txns if x is not None]
+    planned_txns = [PlannedTxn(x, GoodbudgetTxn(-1, x.ts, x.date, x.title, 'Fun', x.amt_dollars, ''),
+                               'entered', fingerprint)
+                    for x, fingerprint in zip(ch_txns, txn_fingerprints(ch_txns))]
+
+    server = MockGoodbudget(fail_rate=0.2).start()
+
+    def connect() -> HttpBackend:
+        backend = HttpBackend(server.url, 4)
+        backend.login('', '')
+        return backend
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        journal = SubmitJournal(os.path.join(tmp_dir, 'submitted.sqlite3'))
+        amt_saves = []
+        for run in range(2):
+            queue = SubmitQueue(connect, {'FUN': '1'}, journal, 4, max_attempts=10, backoff_secs=0.001)
+            for planned_txn in planned_txns:
+                queue.put(planned_txn)
+            for planned_txn, e in queue.join():
+                failed.append(f'run {run + 1}: couldn\'t add {planned_txn.fingerprint}: {e}')
+            amt_saves.append(sum(x.path == _SAVE_TXN_PATH for x in server.requests))
+        journal.close()
+    server.shutdown()
+
+    if amt_saves[0] <= len(planned_txns):
+        failed.append('the stand-in didn\'t fail any request, so nothing was retried')
+    if sorted(server.saved) != sorted(x.fingerprint for x in planned_txns):
+        failed.append(f'expected {len(planned_txns)} txns saved once each, got {len(server.saved)}')
+    if amt_saves[1] != amt_saves[0]:
+        failed.append(f'adding again sent {amt_saves[1] - amt_saves[0]} txns that were journaled')
+    return failed
+
+
+CHECKS: Dict[str, Callable[[], List[str]]] = {
+    'sort': check_sort,
+    'submit': check_submit,
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in CHECKS:
+        print(f'usage: python3 check.py {{{"|".join(CHECKS)}}}')
+        exit(1)
+
+    failed = CHECKS[sys.argv[1]]()
+    for x in failed:
+        print(f'Error, {x}')
+    if failed:
+        exit(1)
+    print(f'{sys.argv[1]}: ok')
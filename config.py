@@ -1,4 +1,4 @@
-from typing import Dict, Union
+from typing import Dict, Optional, Union
 
 
 def _str_to_int(s: str) -> int:
@@ -29,3 +29,7 @@ class Config:
         else:
             print("Warning: GB_PASSWORD not found in environment")
             self.gb_password = ""
+
+        # where txns are added over http, if it isn't goodbudget. it's only set
+        # to add them to a stand-in for it, like `mock_goodbudget.py`
+        self.gb_url: Optional[str] = env["GB_URL"] if "GB_URL" in env else None
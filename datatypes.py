@@ -1,5 +1,12 @@
-from copy import deepcopy
-from typing import List, Union
+from typing import List, Optional, Union
+
+# resolutions the balance can be graphed at: every txn, or the balance at the
+# end of every day, week or month
+BALANCE_TXN = 'txn'
+BALANCE_DAY = 'day'
+BALANCE_WEEK = 'week'
+BALANCE_MONTH = 'month'
+BALANCE_RESOLUTIONS = [BALANCE_TXN, BALANCE_DAY, BALANCE_WEEK, BALANCE_MONTH]
 
 
 def _dollars_to_cents(dollars: str):
@@ -37,22 +44,35 @@ class GoodbudgetTxn:
         self.bal = 0
 
 
+# merged txns reference the txns they were made from instead of copying them,
+# so setting `bal` on them while merging sets it on the original txns too,
+# over the balance they were read with. goodbudget balances come out the same,
+# since the merged order keeps the order of the goodbudget file. chase balances
+# don't: where matched pairs cross, chase txns are out of the order of the
+# chase file, and its balances are off until every txn of the crossing pairs
+# was added. with many txns of the same amount, that's most chase txns
 class MergedTxn_ChaseTxn:
+    __slots__ = ('ch_txn', 'bal_diff')
+
     def __init__(self, ch_txn: ChaseTxn):
-        self.ch_txn = deepcopy(ch_txn)
+        self.ch_txn = ch_txn
         self.bal_diff = 0
 
 
 class MergedTxn_GoodbudgetTxn:
+    __slots__ = ('gb_txn', 'bal_diff')
+
     def __init__(self, gb_txn: GoodbudgetTxn):
-        self.gb_txn = deepcopy(gb_txn)
+        self.gb_txn = gb_txn
         self.bal_diff = 0
 
 
 class MergedTxn_BothTxns:
+    __slots__ = ('ch_txn', 'gb_txn', 'bal_diff')
+
     def __init__(self, ch_txn: ChaseTxn, gb_txn: GoodbudgetTxn):
-        self.ch_txn = deepcopy(ch_txn)
-        self.gb_txn = deepcopy(gb_txn)
+        self.ch_txn = ch_txn
+        self.gb_txn = gb_txn
         self.bal_diff = 0
 
 
@@ -75,3 +95,40 @@ class TxnsGrouped:
         self.both_txns = both_txns
         self.merged_txns = merged_txns
         self.bal_diff_freq = bal_diff_freq
+
+
+# a pair of files to reconcile in a batch, and what came out of it
+class BatchJob:
+    def __init__(self, ch_file: str, gb_file: str, ch_start_bal: int, gb_start_bal: int,
+                 out_dir: str):
+        self.ch_file = ch_file
+        self.gb_file = gb_file
+        self.ch_start_bal = ch_start_bal
+        self.gb_start_bal = gb_start_bal
+        self.out_dir = out_dir
+
+
+class BatchResult:
+    def __init__(self, job: BatchJob, amt_ch_failed: int = 0, amt_gb_failed: int = 0,
+                 amt_only_ch: int = 0, amt_only_gb: int = 0, amt_both: int = 0,
+                 secs: float = 0, error: Optional[str] = None):
+        self.job = job
+        self.amt_ch_failed = amt_ch_failed
+        self.amt_gb_failed = amt_gb_failed
+        self.amt_only_ch = amt_only_ch
+        self.amt_only_gb = amt_only_gb
+        self.amt_both = amt_both
+        self.secs = secs
+        self.error = error
+
+
+# a chase txn that will be added to goodbudget as `gb_txn`, and how its
+# title and envelope were decided. `fingerprint` identifies the chase txn
+# across runs
+class PlannedTxn:
+    def __init__(self, ch_txn: ChaseTxn, gb_txn: GoodbudgetTxn, source: str,
+                 fingerprint: str = ''):
+        self.ch_txn = ch_txn
+        self.gb_txn = gb_txn
+        self.source = source
+        self.fingerprint = fingerprint
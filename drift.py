@@ -0,0 +1,191 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime as dt
+from itertools import accumulate
+from typing import Callable, Dict, List, Optional, Tuple
+
+from datatypes import MergedTxn, MergedTxn_ChaseTxn, MergedTxn_GoodbudgetTxn
+
+# finds where chase and goodbudget drifted apart, from the balance difference
+# after every merged txn. a segment tree keeps the lowest and highest
+# difference of every range of merged txns, so that the highest or lowest
+# drift between two dates, or the first txn after which the difference was
+# over an amount, are found in logarithmic time, without scanning the txns
+
+_INF = float('inf')
+
+
+def merged_txn_ts(merged_txn: MergedTxn) -> int:
+    if isinstance(merged_txn, MergedTxn_GoodbudgetTxn):
+        return merged_txn.gb_txn.ts
+    return merged_txn.ch_txn.ts
+
+
+def contribution(merged_txn: MergedTxn) -> int:
+    # how much a txn changes the difference. a matched txn changes both
+    # balances the same
+    if isinstance(merged_txn, MergedTxn_ChaseTxn):
+        return merged_txn.ch_txn.amt_cents
+    if isinstance(merged_txn, MergedTxn_GoodbudgetTxn):
+        return -merged_txn.gb_txn.amt_cents
+    return 0
+
+
+class DriftIndex:
+    # `merged_txns` in the order `get_txns_grouped` sorted them, with their
+    # `bal_diff` set. `start_diff` is the difference before any txn
+    def __init__(self, merged_txns: List[MergedTxn], start_diff: int):
+        self.merged_txns = merged_txns
+        self.start_diff = start_diff
+        self.diffs = [x.bal_diff for x in merged_txns]
+        n = len(self.diffs)
+
+        # merged txns are only mostly in order of date, so dates are looked up
+        # in the latest date so far, and in the earliest date from then on
+        tss = [merged_txn_ts(x) for x in merged_txns]
+        self.max_ts_so_far = list(accumulate(tss, max))
+        self.min_ts_from = list(accumulate(reversed(tss), min))[::-1]
+
+        # the first and last merged txn after which every difference was had
+        self.first_of: Dict[int, int] = {}
+        self.last_of: Dict[int, int] = {}
+        for i, diff in enumerate(self.diffs):
+            self.first_of.setdefault(diff, i)
+            self.last_of[diff] = i
+
+        # every txn that's only in one file
+        self.unmatched = [i for i, x in enumerate(merged_txns) if contribution(x)]
+
+        # leaves are at `size + i`, and node `i` covers nodes `2i` and `2i + 1`.
+        # leaves past the end can't be the lowest or highest of anything
+        self.size = 1
+        while self.size < n:
+            self.size *= 2
+        self.mins: List[float] = [_INF] * (2 * self.size)
+        self.maxs: List[float] = [-_INF] * (2 * self.size)
+        self.mins[self.size:self.size + n] = self.diffs
+        self.maxs[self.size:self.size + n] = self.diffs
+        # a level at a time, from the one above the leaves
+        level = self.size // 2
+        while level:
+            children = slice(2 * level, 4 * level, 2), slice(2 * level + 1, 4 * level, 2)
+            self.mins[level:2 * level] = map(min, self.mins[children[0]], self.mins[children[1]])
+            self.maxs[level:2 * level] = map(max, self.maxs[children[0]], self.maxs[children[1]])
+            level //= 2
+
+    def __len__(self) -> int:
+        return len(self.diffs)
+
+    def current_diff(self) -> int:
+        return self.diffs[-1] if self.diffs else self.start_diff
+
+    def index_range(self, start_ts: int, end_ts: int) -> Tuple[int, int]:
+        # the longest range of merged txns, as `[lo, hi)`, that are all from
+        # `start_ts` to `end_ts`. txns that are out of order at its edges,
+        # like ones matched late, are left out
+        lo = bisect_left(self.min_ts_from, start_ts)
+        hi = bisect_right(self.max_ts_so_far, end_ts)
+        return lo, max(lo, hi)
+
+    def _min_max(self, lo: int, hi: int) -> Tuple[float, float]:
+        low, high = _INF, -_INF
+        lo += self.size
+        hi += self.size
+        while lo < hi:
+            if lo % 2:
+                low, high = min(low, self.mins[lo]), max(high, self.maxs[lo])
+                lo += 1
+            if hi % 2:
+                hi -= 1
+                low, high = min(low, self.mins[hi]), max(high, self.maxs[hi])
+            lo //= 2
+            hi //= 2
+        return low, high
+
+    def _find(self, lo: int, hi: int, may_have: Callable[[float, float], bool],
+              last: bool = False) -> Optional[int]:
+        # the first, or last, merged txn in `[lo, hi)` whose difference
+        # `may_have(diff, diff)` is true for. `may_have(low, high)` has to be
+        # true for a node if it's true for any of its txns, so that only the
+        # nodes on the way to the txn and on the edges of the range are visited
+        def visit(node: int, node_lo: int, node_hi: int) -> Optional[int]:
+            if node_hi <= lo or hi <= node_lo or not may_have(self.mins[node], self.maxs[node]):
+                return None
+            if node >= self.size:
+                return node - self.size
+            mid = (node_lo + node_hi) // 2
+            children = [(2 * node, node_lo, mid), (2 * node + 1, mid, node_hi)]
+            for child in reversed(children) if last else children:
+                found = visit(*child)
+                if found is not None:
+                    return found
+            return None
+
+        return visit(1, 0, self.size)
+
+    def lowest_and_highest(self, lo: int, hi: int) -> Optional[Tuple[int, int]]:
+        # the first merged txns in `[lo, hi)` after which the difference was
+        # the lowest and the highest
+        if lo >= hi:
+            return None
+        low, high = self._min_max(lo, hi)
+        return (self._find(lo, hi, lambda x, _: x <= low),
+                self._find(lo, hi, lambda _, x: x >= high))
+
+    def first_became(self, diff: int) -> Optional[int]:
+        # the first merged txn after which the difference was `diff`
+        return self.first_of.get(diff)
+
+    def last_was(self, diff: int) -> Optional[int]:
+        return self.last_of.get(diff)
+
+    def first_over(self, amt_cents: int) -> Optional[int]:
+        # the first merged txn after which chase and goodbudget were more than
+        # `amt_cents` apart
+        return self._find(0, len(self), lambda low, high: high > amt_cents or low < -amt_cents)
+
+    def run_start(self, i: int) -> int:
+        # the first merged txn of the ones up to `i` after which the difference
+        # was always the one after `i`
+        diff = self.diffs[i]
+        found = self._find(0, i, lambda low, high: not low == high == diff, last=True)
+        return found + 1 if found is not None else 0
+
+    def explaining_txns(self) -> Tuple[List[int], List[Tuple[int, int]]]:
+        # unmatched txns whose amounts add up to the current difference: the
+        # ones after the last time the difference was 0, or all of them if it
+        # never was, when the difference at the start counts too. of those, a
+        # chase txn and a goodbudget txn with the same amount are probably the
+        # same txn, too far apart to be matched, so they're returned as pairs,
+        # which add up to 0, instead
+        last_zero = self.last_of.get(0, -1)
+        txns = self.unmatched[bisect_right(self.unmatched, last_zero):]
+
+        # by whether they're chase txns, and what they add to the difference
+        unpaired: Dict[Tuple[bool, int], List[int]] = {}
+        pairs: List[Tuple[int, int]] = []
+        for i in txns:
+            is_ch = isinstance(self.merged_txns[i], MergedTxn_ChaseTxn)
+            amt = contribution(self.merged_txns[i])
+            others = unpaired.get((not is_ch, -amt))
+            if others:
+                pairs.append((others.pop(), i))
+            else:
+                unpaired.setdefault((is_ch, amt), []).append(i)
+        paired = {i for pair in pairs for i in pair}
+        explaining = [i for i in txns if i not in paired]
+        return explaining, pairs
+
+
+def years(index: DriftIndex) -> List[Tuple[int, int, int]]:
+    # every year with merged txns, and the range of them in it
+    if not len(index):
+        return []
+    first = dt.fromtimestamp(index.min_ts_from[0]).year
+    last = dt.fromtimestamp(index.max_ts_so_far[-1]).year
+    ranges = []
+    for year in range(first, last + 1):
+        lo, hi = index.index_range(int(dt(year, 1, 1).timestamp()),
+                                   int(dt(year + 1, 1, 1).timestamp()) - 1)
+        if lo < hi:
+            ranges.append((year, lo, hi))
+    return ranges
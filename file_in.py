@@ -1,14 +1,25 @@
 from datetime import datetime as dt
+from functools import lru_cache
+import os
 import re
-from typing import Generic, List, TypeVar
+from typing import Callable, Generic, Iterable, Iterator, List, Optional, Tuple, TypeVar
 
 from datatypes import ChaseTxn, GoodbudgetTxn
+from profiling import stage
 from regex import CH_REGEX, GB_EXPENSE_REGEX, GB_INCOME_REGEX
+from txn_table import ChaseTxnTable, GoodbudgetTxnTable
 
 IN_CH_FILE = './in/chase.csv'
 IN_GB_FILE = './in/goodbudget.csv'
 
+# amount of txns yielded at a time by `iter_ch_txns` and `iter_gb_txns`
+BATCH_SIZE = 4096
+_BLOCK_SIZE = 1 << 16
 
+
+# the same few hundred dates and titles repeat over thousands of lines, so
+# their conversions are only done once per distinct value
+@lru_cache(maxsize=1 << 14)
 def _shorten(s: str) -> str:
     s = re.sub(r',', '', s)
     s = re.sub(r'\s+', ' ', s)
@@ -19,65 +30,183 @@ def _shorten(s: str) -> str:
     return s
 
 
+@lru_cache(maxsize=None)
+def _date_to_ts(date: str) -> int:
+    # same as `dt.strptime(date, "%m/%d/%Y")`, which is much slower
+    month, day, year = date.split('/')
+    return int(dt(int(year), int(month), int(day)).timestamp())
+
+
+def _count_lines(path: str) -> int:
+    amt_lines = 0
+    with open(path) as in_file:
+        for amt_lines, _ in enumerate(in_file, 1):
+            pass
+    return amt_lines
+
+
+def reversed_lines(path: str) -> Iterator[Tuple[int, str]]:
+    # yield (line number, line) from the last line of the file to the first.
+    # the file is read backwards one block at a time, so that the oldest txns,
+    # which are at the bottom, come out first. line endings are normalized to
+    # '\n' like they would be when reading the file in text mode
+    i = _count_lines(path)
+    with open(path, 'rb') as in_file:
+        pos = in_file.seek(0, os.SEEK_END)
+        tail = b''
+        while pos > 0:
+            size = min(_BLOCK_SIZE, pos)
+            pos -= size
+            in_file.seek(pos)
+            lines = (in_file.read(size) + tail).splitlines(keepends=True)
+
+            # the first line might continue in the previous block
+            tail = lines.pop(0) if pos > 0 and lines else b''
+            for line in reversed(lines):
+                i -= 1
+                yield i, decode_line(line)
+
+
+def decode_line(line: bytes) -> str:
+    stripped = line.rstrip(b'\r\n')
+    if len(stripped) == len(line):
+        return line.decode()
+    return stripped.decode() + '\n'
+
+
 T = TypeVar('T', ChaseTxn, GoodbudgetTxn)
+TableT = TypeVar('TableT', ChaseTxnTable, GoodbudgetTxnTable)
 
 
-class ReadResults(Generic[T]):
-    def __init__(self, txns: List[T], lines_failed: List[str]):
+class ReadResults(Generic[TableT]):
+    def __init__(self, txns: TableT, lines_failed: List[str]):
         self.txns = txns
         self.lines_failed = lines_failed
 
 
-def read_ch_txns(ch_start_bal: int) -> ReadResults[ChaseTxn]:
-    txns: List[ChaseTxn] = []
-    lines_failed: List[str] = []
-    with open(IN_CH_FILE) as in_file:
-        for i, line in enumerate(in_file):
-            if (txn := CH_REGEX.match(line)):
-                txn = txn.groupdict()
-                txns.append(ChaseTxn(
-                    id_=i,
-                    ts=int(dt.strptime(txn['date'], "%m/%d/%Y").timestamp()),
-                    is_debit=txn['deb_or_cred'] == 'DEBIT',
-                    is_pending=txn['balance'] == ' ',
-                    date=txn['date'],
-                    title=_shorten(txn['title']),
-                    amt_dollars=txn['amt']
-                ))
-            else:
-                lines_failed.append(line)
-
-    curr_bal = ch_start_bal
-    for txn in reversed(txns):
+# the regexes in `regex.py` both split a line into its columns and decide
+# whether it can be parsed at all. the columns are pulled out by name in one
+# call, which is cheaper than building a `groupdict()` for every line
+_CH_COLUMNS = ('deb_or_cred', 'date', 'title', 'amt', 'balance')
+_GB_COLUMNS = ('date', 'envelope', 'title', 'amt', 'notes')
+
+
+def _parse_ch_line(i: int, line: str) -> Optional[ChaseTxn]:
+    if not (txn := CH_REGEX.match(line)):
+        return None
+
+    deb_or_cred, date, title, amt, balance = txn.group(*_CH_COLUMNS)
+    return ChaseTxn(
+        id_=i,
+        ts=_date_to_ts(date),
+        is_debit=deb_or_cred == 'DEBIT',
+        is_pending=balance == ' ',
+        date=date,
+        title=_shorten(title),
+        amt_dollars=amt
+    )
+
+
+def _parse_gb_line(i: int, line: str) -> Optional[GoodbudgetTxn]:
+    if not ((txn := GB_EXPENSE_REGEX.match(line)) or (txn := GB_INCOME_REGEX.match(line))):
+        return None
+
+    date, envelope, title, amt, notes = txn.group(*_GB_COLUMNS)
+    return GoodbudgetTxn(
+        id_=i,
+        ts=_date_to_ts(date),
+        date=date,
+        title=_shorten(title),
+        envelope=envelope if envelope != '' else 'Income',
+        amt_dollars=amt,
+        notes=notes
+    )
+
+
+def _parse_lines(numbered_lines: Iterable[Tuple[int, str]],
+                 parse_line: Callable[[int, str], Optional[T]],
+                 start_bal: int, on_fail: Callable[[str], None],
+                 batch_size: int) -> Iterator[List[T]]:
+    batch: List[T] = []
+    curr_bal = start_bal
+    for i, line in numbered_lines:
+        if (txn := parse_line(i, line)) is None:
+            on_fail(line)
+            continue
+
         curr_bal += txn.amt_cents
         txn.bal = curr_bal
-
+        batch.append(txn)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+# `parse_ch_lines` and `parse_gb_lines` parse (line number, line) pairs that go
+# from the oldest txn to the newest one, like `iter_ch_txns` and `iter_gb_txns`
+# do for a whole file
+def parse_ch_lines(numbered_lines: Iterable[Tuple[int, str]], ch_start_bal: int,
+                   on_fail: Callable[[str], None],
+                   batch_size: int = BATCH_SIZE) -> Iterator[List[ChaseTxn]]:
+    return _parse_lines(numbered_lines, _parse_ch_line, ch_start_bal, on_fail, batch_size)
+
+
+def parse_gb_lines(numbered_lines: Iterable[Tuple[int, str]], gb_start_bal: int,
+                   on_fail: Callable[[str], None],
+                   batch_size: int = BATCH_SIZE) -> Iterator[List[GoodbudgetTxn]]:
+    return _parse_lines(numbered_lines, _parse_gb_line, gb_start_bal, on_fail, batch_size)
+
+
+# `iter_ch_txns` and `iter_gb_txns` yield the txns of a file in batches, from
+# the oldest txn to the newest one, with `bal` already set. lines that can't be
+# parsed are passed to `on_fail` as they're found, from the bottom of the file
+# to the top. only one batch and one block of the file are held in memory.
+# `in_file` defaults to `IN_CH_FILE` or `IN_GB_FILE`
+def iter_ch_txns(ch_start_bal: int, on_fail: Callable[[str], None],
+                 batch_size: int = BATCH_SIZE,
+                 in_file: Optional[str] = None) -> Iterator[List[ChaseTxn]]:
+    return parse_ch_lines(reversed_lines(in_file or IN_CH_FILE), ch_start_bal, on_fail, batch_size)
+
+
+def iter_gb_txns(gb_start_bal: int, on_fail: Callable[[str], None],
+                 batch_size: int = BATCH_SIZE,
+                 in_file: Optional[str] = None) -> Iterator[List[GoodbudgetTxn]]:
+    return parse_gb_lines(reversed_lines(in_file or IN_GB_FILE), gb_start_bal, on_fail, batch_size)
+
+
+def _read_txns(txn_batches: Iterator[List[T]], txns: TableT,
+               lines_failed: List[str]) -> ReadResults[TableT]:
+    # reading the file and parsing its lines are interleaved
+    with stage('parse') as s:
+        for batch in txn_batches:
+            txns.extend(batch)
+        s.add_rows(len(txns))
+
+    # restore the order of the file: newest txn first
+    with stage('reverse') as s:
+        txns.reverse()
+        lines_failed.reverse()
+        s.add_rows(len(txns))
     return ReadResults(txns, lines_failed)
 
 
-def read_gb_txns(gb_start_bal: int) -> ReadResults[GoodbudgetTxn]:
-    txns: List[GoodbudgetTxn] = []
+# `read_ch_txns` and `read_gb_txns` return every txn in a table, newest first.
+# if `on_fail` is given, lines that can't be parsed are streamed to it instead
+# of being collected in `ReadResults.lines_failed`
+def read_ch_txns(ch_start_bal: int,
+                 on_fail: Optional[Callable[[str], None]] = None,
+                 in_file: Optional[str] = None) -> ReadResults[ChaseTxnTable]:
     lines_failed: List[str] = []
-    with open(IN_GB_FILE) as in_file:
-        for i, line in enumerate(in_file):
-            if (txn := GB_EXPENSE_REGEX.match(line)) or (txn := GB_INCOME_REGEX.match(line)):
-                txn = txn.groupdict()
-                txns.append(GoodbudgetTxn(
-                    id_=i,
-                    ts=int(dt.strptime(txn['date'], "%m/%d/%Y").timestamp()),
-                    date=txn['date'],
-                    title=_shorten(txn['title']),
-                    envelope=(txn['envelope'] if txn['envelope']
-                              != '' else 'Income'),
-                    amt_dollars=txn['amt'],
-                    notes=txn['notes']
-                ))
-            else:
-                lines_failed.append(line)
-
-    curr_bal = gb_start_bal
-    for txn in reversed(txns):
-        curr_bal += txn.amt_cents
-        txn.bal = curr_bal
+    txn_batches = iter_ch_txns(ch_start_bal, on_fail or lines_failed.append, in_file=in_file)
+    return _read_txns(txn_batches, ChaseTxnTable(), lines_failed)
 
-    return ReadResults(txns, lines_failed)
+
+def read_gb_txns(gb_start_bal: int,
+                 on_fail: Optional[Callable[[str], None]] = None,
+                 in_file: Optional[str] = None) -> ReadResults[GoodbudgetTxnTable]:
+    lines_failed: List[str] = []
+    txn_batches = iter_gb_txns(gb_start_bal, on_fail or lines_failed.append, in_file=in_file)
+    return _read_txns(txn_batches, GoodbudgetTxnTable(), lines_failed)
@@ -1,16 +1,26 @@
 from datetime import datetime as dt
+from importlib.util import find_spec
+import json
+import os
 from pathlib import Path
-from typing import List
+import tempfile
+from typing import Dict, List, Optional, TextIO, Tuple
 
 from datatypes import (
     BalanceDifferenceFrequency,
+    BatchResult,
     ChaseTxn,
     GoodbudgetTxn,
     MergedTxn,
     MergedTxn_ChaseTxn,
     MergedTxn_GoodbudgetTxn,
+    PlannedTxn,
     TxnsGrouped,
 )
+from drift import DriftIndex, contribution, years
+from file_in import reversed_lines
+from profiling import Profiler
+from txn_table import table_indices
 
 
 ### Helper Values and Functions #########################################
@@ -31,53 +41,194 @@ def _gb_txn_to_row(gb_txn: GoodbudgetTxn) -> str:
 
 
 _MERGED_TXN_FIELD_NAMES = f'Txn Type,{_CH_FIELD_NAMES},{_GB_FIELD_NAMES},Balance Difference'
+_EMPTY_CH_ROW = ',' * (_AMT_CH_FIELDS - 1)
+_EMPTY_GB_ROW = ',' * (_AMT_GB_FIELDS - 1)
 
+# values of the `match_type` column of `merged.parquet`
+_MATCH_TYPES = ['BOTH', 'CHASE', 'GOODBUDGET']
+_MATCH_TYPE_BOTH, _MATCH_TYPE_CHASE, _MATCH_TYPE_GOODBUDGET = range(len(_MATCH_TYPES))
 
-def _merged_txn_to_row(merged_txn: MergedTxn) -> str:
-    txn_type = 'BOTH'
 
-    if isinstance(merged_txn, MergedTxn_ChaseTxn):
-        txn_type = 'CHASE'
-        gb_row = ',' * (_AMT_GB_FIELDS - 1)
-    else:
-        gb_row = _gb_txn_to_row(merged_txn.gb_txn)
+def _bal_and_freq_to_row(bal_and_freq: BalanceDifferenceFrequency) -> str:
+    return f'{bal_and_freq.balance/100},{bal_and_freq.frequency}'
 
-    if isinstance(merged_txn, MergedTxn_GoodbudgetTxn):
-        txn_type = 'GOODBUDGET'
-        ch_row = ',' * (_AMT_CH_FIELDS - 1)
-    else:
-        ch_row = _ch_txn_to_row(merged_txn.ch_txn)
 
-    return ','.join([txn_type, ch_row, gb_row, str(merged_txn.bal_diff/100)])
+_BATCH_FIELD_NAMES = 'Chase File,Goodbudget File,Output Dir,Unparsed Chase Lines,Unparsed Goodbudget Lines,' \
+    'Unmatched Chase Txns,Unmatched Goodbudget Txns,Matched Txns,Seconds,Error'
 
 
-def _bal_and_freq_to_row(bal_and_freq: BalanceDifferenceFrequency) -> str:
-    return f'{bal_and_freq.balance/100},{bal_and_freq.frequency}'
+def _batch_result_to_row(result: BatchResult) -> str:
+    job = result.job
+    error = (result.error or '').replace(',', ';')
+    return f'{job.ch_file},{job.gb_file},{job.out_dir},{result.amt_ch_failed},{result.amt_gb_failed},' \
+        f'{result.amt_only_ch},{result.amt_only_gb},{result.amt_both},{result.secs:.2f},{error}'
 
 
-### Export #############################################################
+_PLAN_FIELD_NAMES = 'Chase Date,Chase Title,Chase Txn Amount,Goodbudget Title,Goodbudget Envelope,' \
+    'Goodbudget Notes,Source'
 
-OUT_DIR = f'./out/{dt.now().strftime("%Y-%m-%dT%H:%M")}'
 
+def _planned_txn_to_row(planned_txn: PlannedTxn) -> str:
+    ch_txn, gb_txn = planned_txn.ch_txn, planned_txn.gb_txn
+    return f'{ch_txn.date},{ch_txn.title},{ch_txn.amt_dollars},{gb_txn.title},{gb_txn.envelope},' \
+        f'{gb_txn.notes},{planned_txn.source}'
 
-class Logger:
-    def __init__(self):
-        Path(OUT_DIR).mkdir(exist_ok=True)
 
-        self.ch_file = f'{OUT_DIR}/chase.csv'
-        self.gb_file = f'{OUT_DIR}/goodbudget.csv'
-        self.both_file = f'{OUT_DIR}/both.csv'
-        self.merged_file = f'{OUT_DIR}/merged.csv'
-        self.bal_diff_freq_file = f'{OUT_DIR}/bal_diff_freq.csv'
-        self.log_file = f'{OUT_DIR}/log.txt'
+# rows of the merged file that explain the current balance difference. where a
+# row is in the merged file is kept, to see what's around it
+_DRIFT_FIELD_NAMES = f'Reason,{{}},{_MERGED_TXN_FIELD_NAMES}'
+_DRIFT_UNMATCHED = 'UNMATCHED'
+_DRIFT_PAIRED = 'PAIRED'
 
-    def lines_failed(self, lines_failed: List[str]) -> None:
-        with open(self.log_file, 'a') as out_file:
-            out_file.write(f'Didn\'t parse {len(lines_failed)} lines:\n')
-            for line in lines_failed:
-                out_file.write(f'{line}')
 
+def _drift_txn_to_row(reason: str, i: int, merged_txn: MergedTxn) -> str:
+    if isinstance(merged_txn, MergedTxn_ChaseTxn):
+        row = f'CHASE,{_ch_txn_to_row(merged_txn.ch_txn)},{_EMPTY_GB_ROW}'
+    elif isinstance(merged_txn, MergedTxn_GoodbudgetTxn):
+        row = f'GOODBUDGET,{_EMPTY_CH_ROW},{_gb_txn_to_row(merged_txn.gb_txn)}'
+    else:
+        row = f'BOTH,{_ch_txn_to_row(merged_txn.ch_txn)},{_gb_txn_to_row(merged_txn.gb_txn)}'
+    return f'{reason},{i},{row},{merged_txn.bal_diff/100}'
+
+
+def _merged_position(out_format: str) -> Tuple[str, str, int]:
+    # merged txn `i` is at line `i + 2` of merged.csv, after the header, or at
+    # row `i` of merged.parquet. returns what a position is called in the
+    # merged file that was written, its name, and what's added to `i`
+    if out_format == OUT_PARQUET:
+        return 'row', 'merged.parquet', 0
+    return 'line', 'merged.csv', 2
+
+
+def _drift_point(index: DriftIndex, i: Optional[int], out_format: str) -> str:
+    # the date of a merged txn, and where it is in the merged file
+    if i is None:
+        return 'NEVER'
+    merged_txn = index.merged_txns[i]
+    txn = merged_txn.gb_txn if isinstance(merged_txn, MergedTxn_GoodbudgetTxn) else merged_txn.ch_txn
+    position, merged_file, offset = _merged_position(out_format)
+    return f'{txn.date} ({position} {i + offset} of {merged_file})'
+
+
+class _ArrowColumns:
+    # the attributes of a list of txns, some of which can be None, as arrow
+    # arrays. when the txns are rows of one `ChaseTxnTable` or
+    # `GoodbudgetTxnTable`, the columns of the table are used directly instead
+    # of reading every txn
+    def __init__(self, txns: list):
+        import pyarrow as pa
+
+        self.pa = pa
+        self.txns = txns
+        found = table_indices(txns)
+        self.table = found[0] if found else None
+        self.indices = pa.array(found[1], pa.int64()) if found else None
+
+    def _take(self, values):
+        return values.take(self.indices)
+
+    def _from_txns(self, attr: str, type_):
+        return self.pa.array([None if x is None else getattr(x, attr) for x in self.txns], type_)
+
+    def ints(self, attr: str):
+        column = self.table.__dict__.get(attr) if self.table is not None else None
+        if column is None:
+            return self._from_txns(attr, self.pa.int64())
+        values = self.pa.Array.from_buffers(self.pa.int64(), len(column), [None, self.pa.py_buffer(column)])
+        return self._take(values)
+
+    def bools(self, attr: str):
+        return self._from_txns(attr, self.pa.bool_())
+
+    def strs(self, attr: str):
+        # dictionary-encoded, like the columns of the tables
+        pa = self.pa
+        column = self.table.__dict__.get(attr) if self.table is not None else None
+        if column is None:
+            return self._from_txns(attr, pa.string()).dictionary_encode()
+        codes = pa.Array.from_buffers(pa.uint32(), len(column.codes), [None, pa.py_buffer(column.codes)])
+        values = pa.DictionaryArray.from_arrays(codes.cast(pa.int32()), pa.array(column.values, pa.string()))
+        return self._take(values)
+
+    def dates(self):
+        # only the distinct dates are parsed
+        import pyarrow.compute as pc
+
+        dates = self.strs('date')
+        days = pc.strptime(dates.dictionary, format='%m/%d/%Y', unit='s').cast(self.pa.date32())
+        return self.pa.DictionaryArray.from_arrays(dates.indices, days).dictionary_decode()
+
+
+### Export #############################################################
+
+OUT_DIR = f'./out/{dt.now().strftime("%Y-%m-%dT%H:%M")}'
+_WRITE_BUFFER_SIZE = 1 << 20
+
+# reports can be written as csv files, or as parquet files, which need pyarrow
+OUT_CSV = 'csv'
+OUT_PARQUET = 'parquet'
+OUT_FORMATS = [OUT_CSV, OUT_PARQUET]
+PARQUET_AVAILABLE = find_spec('pyarrow') is not None
+
+
+class FailedLinesWriter:
+    # lines that failed to parse come from the bottom of the file to the top,
+    # and every line of a file can fail, like when it's the wrong export. so
+    # they're written to a spill file next to the log as they're found, and
+    # copied to the log in the order of the file, after how many there are,
+    # when it's closed
+    def __init__(self, log_file: str):
+        self.log_file = log_file
+        fd, self.spill_file = tempfile.mkstemp(prefix='failed_lines.', dir=os.path.dirname(log_file))
+        self.spill: TextIO = os.fdopen(fd, 'w')
+        self.amt_failed = 0
+
+    def write(self, line: str) -> None:
+        # the last line of a file may not end with a newline
+        self.spill.write(line if line.endswith('\n') else line + '\n')
+        self.amt_failed += 1
+
+    def close(self) -> None:
+        self.spill.close()
+        with open(self.log_file, 'a') as out_file:
+            out_file.write(f'Didn\'t parse {self.amt_failed} lines:\n')
+            for _, line in reversed_lines(self.spill_file):
+                out_file.write(line)
             out_file.write('\n\n')
+        os.remove(self.spill_file)
+
+    def __enter__(self) -> 'FailedLinesWriter':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+class Logger:
+    # `out_dir` defaults to `OUT_DIR`
+    def __init__(self, out_dir: Optional[str] = None):
+        out_dir = out_dir or OUT_DIR
+        Path(out_dir).mkdir(parents=True, exist_ok=True)
+
+        self.ch_file = f'{out_dir}/chase.csv'
+        self.gb_file = f'{out_dir}/goodbudget.csv'
+        self.both_file = f'{out_dir}/both.csv'
+        self.merged_file = f'{out_dir}/merged.csv'
+        self.bal_diff_freq_file = f'{out_dir}/bal_diff_freq.csv'
+        self.merged_parquet_file = f'{out_dir}/merged.parquet'
+        self.bal_diff_freq_parquet_file = f'{out_dir}/bal_diff_freq.parquet'
+        self.batch_summary_file = f'{out_dir}/summary.csv'
+        self.plan_file = f'{out_dir}/plan.csv'
+        self.log_file = f'{out_dir}/log.txt'
+        self.profile_file = f'{out_dir}/profile.json'
+        self.profile_pstats_file = f'{out_dir}/profile.pstats'
+        self.drift_file = f'{out_dir}/drift.txt'
+        self.drift_txns_file = f'{out_dir}/drift.csv'
+
+    # lines that failed to parse are written to it as they're found, and
+    # added to the log when it's closed
+    def failed_lines_writer(self) -> FailedLinesWriter:
+        return FailedLinesWriter(self.log_file)
 
     def amt_matched_and_unmatched(self, txns_grouped: TxnsGrouped) -> None:
         with open(self.log_file, 'a') as out_file:
@@ -89,27 +240,183 @@ class Logger:
                 f'AMT OF MATCHED TXNS: {len(txns_grouped.both_txns)}\n')
 
     def txns_grouped(self, txns_grouped: TxnsGrouped) -> None:
-        with open(self.ch_file, 'w') as out_file:
-            out_file.write(f'{_CH_FIELD_NAMES}\n')
-            for txn in txns_grouped.only_ch_txns:
-                out_file.write(f"{_ch_txn_to_row(txn)}\n")
-
-        with open(self.gb_file, 'w') as out_file:
-            out_file.write(f'{_GB_FIELD_NAMES}\n')
-            for txn in txns_grouped.only_gb_txns:
-                out_file.write(f"{_gb_txn_to_row(txn)}\n")
-
-        with open(self.both_file, 'w') as out_file:
-            out_file.write(f'{_MERGED_TXN_FIELD_NAMES}\n')
-            for txn in txns_grouped.both_txns:
-                out_file.write(f"{_merged_txn_to_row(txn)}\n")
-
-        with open(self.merged_file, 'w') as out_file:
-            out_file.write(f'{_MERGED_TXN_FIELD_NAMES}\n')
-            for txn in txns_grouped.merged_txns:
-                out_file.write(f"{_merged_txn_to_row(txn)}\n")
-
-        with open(self.bal_diff_freq_file, 'w') as out_file:
-            out_file.write('Balance,Frequency\n')
-            for bal_and_freq in txns_grouped.bal_diff_freq:
-                out_file.write(f"{_bal_and_freq_to_row(bal_and_freq)}\n")
+        # every row is formatted once, in a single pass over `merged_txns`.
+        # rows of unmatched txns are kept by id, because `only_ch_txns` and
+        # `only_gb_txns` are in the order of their files instead
+        ch_rows: Dict[int, str] = {}
+        gb_rows: Dict[int, str] = {}
+        both_lines = [f'{_MERGED_TXN_FIELD_NAMES}\n']
+        merged_lines = [f'{_MERGED_TXN_FIELD_NAMES}\n']
+        for txn in txns_grouped.merged_txns:
+            if isinstance(txn, MergedTxn_ChaseTxn):
+                ch_row = ch_rows[txn.ch_txn.id_] = f'{_ch_txn_to_row(txn.ch_txn)}\n'
+                merged_lines.append(f'CHASE,{ch_row[:-1]},{_EMPTY_GB_ROW},{txn.bal_diff/100}\n')
+            elif isinstance(txn, MergedTxn_GoodbudgetTxn):
+                gb_row = gb_rows[txn.gb_txn.id_] = f'{_gb_txn_to_row(txn.gb_txn)}\n'
+                merged_lines.append(f'GOODBUDGET,{_EMPTY_CH_ROW},{gb_row[:-1]},{txn.bal_diff/100}\n')
+            else:
+                line = f'BOTH,{_ch_txn_to_row(txn.ch_txn)},{_gb_txn_to_row(txn.gb_txn)},{txn.bal_diff/100}\n'
+                both_lines.append(line)
+                merged_lines.append(line)
+
+        ch_lines = [f'{_CH_FIELD_NAMES}\n']
+        ch_lines.extend(ch_rows.get(txn.id_) or f'{_ch_txn_to_row(txn)}\n'
+                        for txn in txns_grouped.only_ch_txns)
+        gb_lines = [f'{_GB_FIELD_NAMES}\n']
+        gb_lines.extend(gb_rows.get(txn.id_) or f'{_gb_txn_to_row(txn)}\n'
+                        for txn in txns_grouped.only_gb_txns)
+        bal_diff_freq_lines = ['Balance,Frequency\n']
+        bal_diff_freq_lines.extend(f'{_bal_and_freq_to_row(x)}\n' for x in txns_grouped.bal_diff_freq)
+
+        for out_file_name, lines in [(self.ch_file, ch_lines), (self.gb_file, gb_lines),
+                                     (self.both_file, both_lines), (self.merged_file, merged_lines),
+                                     (self.bal_diff_freq_file, bal_diff_freq_lines)]:
+            with open(out_file_name, 'w', buffering=_WRITE_BUFFER_SIZE) as out_file:
+                out_file.writelines(lines)
+
+    # writes the same data as `txns_grouped`, as two parquet files with typed
+    # columns: `merged.parquet`, where `only_ch_txns`, `only_gb_txns` and
+    # `both_txns` are the rows of each `match_type`, and `bal_diff_freq.parquet`.
+    # amounts and balances are in cents, and the side of a txn that isn't in a
+    # file is null
+    def txns_grouped_parquet(self, txns_grouped: TxnsGrouped) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        match_types: List[int] = []
+        ch_txns: List[Optional[ChaseTxn]] = []
+        gb_txns: List[Optional[GoodbudgetTxn]] = []
+        for txn in txns_grouped.merged_txns:
+            if isinstance(txn, MergedTxn_ChaseTxn):
+                match_types.append(_MATCH_TYPE_CHASE)
+                ch_txns.append(txn.ch_txn)
+                gb_txns.append(None)
+            elif isinstance(txn, MergedTxn_GoodbudgetTxn):
+                match_types.append(_MATCH_TYPE_GOODBUDGET)
+                ch_txns.append(None)
+                gb_txns.append(txn.gb_txn)
+            else:
+                match_types.append(_MATCH_TYPE_BOTH)
+                ch_txns.append(txn.ch_txn)
+                gb_txns.append(txn.gb_txn)
+
+        ch = _ArrowColumns(ch_txns)
+        gb = _ArrowColumns(gb_txns)
+        merged = pa.table({
+            'match_type': pa.DictionaryArray.from_arrays(
+                pa.array(match_types, pa.int8()), pa.array(_MATCH_TYPES)),
+            'ch_id': ch.ints('id_'),
+            'ch_date': ch.dates(),
+            'ch_title': ch.strs('title'),
+            'ch_is_pending': ch.bools('is_pending'),
+            'ch_amt_cents': ch.ints('amt_cents'),
+            'ch_bal_cents': ch.ints('bal'),
+            'gb_id': gb.ints('id_'),
+            'gb_date': gb.dates(),
+            'gb_title': gb.strs('title'),
+            'gb_envelope': gb.strs('envelope'),
+            'gb_notes': gb.strs('notes'),
+            'gb_amt_cents': gb.ints('amt_cents'),
+            'gb_bal_cents': gb.ints('bal'),
+            'bal_diff_cents': pa.array([x.bal_diff for x in txns_grouped.merged_txns], pa.int64()),
+        })
+        pq.write_table(merged, self.merged_parquet_file)
+
+        bal_diff_freq = pa.table({
+            'bal_diff_cents': pa.array([x.balance for x in txns_grouped.bal_diff_freq], pa.int64()),
+            'frequency': pa.array([x.frequency for x in txns_grouped.bal_diff_freq], pa.int64()),
+        })
+        pq.write_table(bal_diff_freq, self.bal_diff_freq_parquet_file)
+
+    def batch_summary(self, results: List[BatchResult]) -> None:
+        with open(self.batch_summary_file, 'w') as out_file:
+            out_file.write(f'{_BATCH_FIELD_NAMES}\n')
+            for result in results:
+                out_file.write(f'{_batch_result_to_row(result)}\n')
+
+        with open(self.log_file, 'a') as out_file:
+            out_file.write(f'AMT OF FILE PAIRS: {len(results)}\n')
+            out_file.write(
+                f'AMT OF FAILED FILE PAIRS: {sum(1 for x in results if x.error)}\n')
+            out_file.write(
+                f'AMT OF UNMATCHED CHASE TXNS: {sum(x.amt_only_ch for x in results)}\n')
+            out_file.write(
+                f'AMT OF UNMATCHED GOODBUDGET TXNS: {sum(x.amt_only_gb for x in results)}\n')
+            out_file.write(
+                f'AMT OF MATCHED TXNS: {sum(x.amt_both for x in results)}\n')
+
+    def plan(self, planned_txns: List[PlannedTxn]) -> None:
+        with open(self.plan_file, 'w') as out_file:
+            out_file.write(f'{_PLAN_FIELD_NAMES}\n')
+            for planned_txn in planned_txns:
+                out_file.write(f'{_planned_txn_to_row(planned_txn)}\n')
+
+    # the stages of a run, as a table in the log and as json. with cProfile,
+    # also every function, as a file that `pstats` can read
+    def profile(self, profiler: Profiler) -> None:
+        stage_stats = profiler.stage_stats()
+        with open(self.log_file, 'a') as out_file:
+            out_file.write(f'PROFILE, {profiler.wall_secs:.3f}s IN TOTAL:\n')
+            out_file.write(f'{"stage":<40} {"calls":>6} {"wall s":>9} {"cpu s":>9} '
+                           f'{"rows":>10} {"peak MiB":>9}\n')
+            for x in stage_stats:
+                name = '  ' * x.depth + x.name.split('/')[-1]
+                out_file.write(f'{name:<40} {x.calls:>6} {x.wall_secs:>9.3f} {x.cpu_secs:>9.3f} '
+                               f'{x.amt_rows:>10} {x.peak_bytes / (1 << 20):>9.1f}\n')
+            out_file.write('\n')
+
+        with open(self.profile_file, 'w') as out_file:
+            json.dump({
+                'wall_secs': profiler.wall_secs,
+                'stages': [{'name': x.name, 'calls': x.calls, 'wall_secs': x.wall_secs,
+                            'cpu_secs': x.cpu_secs, 'rows': x.amt_rows, 'peak_bytes': x.peak_bytes}
+                           for x in stage_stats],
+            }, out_file, indent=2)
+            out_file.write('\n')
+
+        if profiler.cprofile is not None:
+            profiler.cprofile.dump_stats(self.profile_pstats_file)
+
+    # where chase and goodbudget drifted apart: when the current difference
+    # started, the lowest and highest difference of every year, and the
+    # unmatched txns that explain the current difference, in drift.csv
+    # `out_format` is the format the merged txns were written in
+    def drift(self, index: DriftIndex, out_format: str = OUT_CSV) -> None:
+        current = index.current_diff()
+        explaining, pairs = index.explaining_txns()
+        with open(self.drift_file, 'w') as out_file:
+            out_file.write(f'DIFFERENCE (CHASE - GOODBUDGET) AT THE START: {index.start_diff/100}\n')
+            out_file.write(f'CURRENT DIFFERENCE: {current/100}\n')
+            if len(index):
+                out_file.write(f'DIFFERENCE HAS BEEN {current/100} SINCE: '
+                               f'{_drift_point(index, index.run_start(len(index) - 1), out_format)}\n')
+                out_file.write(f'DIFFERENCE FIRST BECAME {current/100} ON: '
+                               f'{_drift_point(index, index.first_became(current), out_format)}\n')
+            out_file.write(f'DIFFERENCE WAS LAST 0 ON: {_drift_point(index, index.last_was(0), out_format)}\n')
+            out_file.write(f'CHASE AND GOODBUDGET WERE FIRST MORE THAN 1.0 APART ON: '
+                           f'{_drift_point(index, index.first_over(100), out_format)}\n\n')
+
+            out_file.write('LOWEST AND HIGHEST DIFFERENCE PER YEAR:\n')
+            out_file.write('Year,Lowest Difference,Lowest On,Highest Difference,Highest On\n')
+            for year, lo, hi in years(index):
+                low_i, high_i = index.lowest_and_highest(lo, hi)
+                out_file.write(f'{year},{index.diffs[low_i]/100},{_drift_point(index, low_i, out_format)},'
+                               f'{index.diffs[high_i]/100},{_drift_point(index, high_i, out_format)}\n')
+            out_file.write('\n')
+
+            # since the difference was last 0, or since the start, when the
+            # difference at the start counts too
+            since = 'THE START' if index.last_was(0) is None else 'THE DIFFERENCE WAS LAST 0'
+            amt = sum(contribution(index.merged_txns[i]) for i in explaining)
+            out_file.write(f'AMT OF UNMATCHED TXNS SINCE {since}: {len(explaining)}, ADDING UP TO {amt/100}\n')
+            out_file.write(f'AMT OF PAIRS OF UNMATCHED TXNS WITH THE SAME AMOUNT, PROBABLY TOO FAR APART '
+                           f'TO BE MATCHED: {len(pairs)}\n')
+
+        position, _, offset = _merged_position(out_format)
+        with open(self.drift_txns_file, 'w') as out_file:
+            out_file.write(f'{_DRIFT_FIELD_NAMES.format(f"Merged {position.title()}")}\n')
+            for i in explaining:
+                out_file.write(f'{_drift_txn_to_row(_DRIFT_UNMATCHED, i + offset, index.merged_txns[i])}\n')
+            for pair in pairs:
+                for i in pair:
+                    out_file.write(f'{_drift_txn_to_row(_DRIFT_PAIRED, i + offset, index.merged_txns[i])}\n')
@@ -1,15 +1,16 @@
-from datetime import datetime as dt, timedelta
-from typing import Dict, List, Union
+import re
+import sys
+import time
+from typing import List, Union
 
-from dotenv import dotenv_values
-from matplotlib import pyplot
+from datatypes import BALANCE_DAY, BALANCE_RESOLUTIONS
 
-from config import Config
-from datatypes import GoodbudgetTxn
-from file_in import read_gb_txns
-from pandas import Timestamp
-import pandas
+# what to graph is asked for here. graphs are drawn by `graph_draw.py`, which
+# is only imported, along with matplotlib and pandas, once the arguments and
+# the .env file are known to be right
 
+# formats `--render-all` can write
+RENDER_FORMATS = ['png', 'svg']
 
 # for graphs with more than one line / bar
 COLORS = ['b', 'g', 'r', 'c', 'm', 'y',
@@ -17,7 +18,8 @@ COLORS = ['b', 'g', 'r', 'c', 'm', 'y',
 
 
 class Balance:
-    pass
+    def __init__(self, resolution: str = BALANCE_DAY):
+        self.resolution = resolution
 
 
 class AmtFromMostPopular:
@@ -35,8 +37,8 @@ class AmtSpentPerTitle:
 
 
 class MonthlySpendingEnv:
-    def __init__(self, envelope: str):
-        self.envelope = envelope
+    def __init__(self, envelopes: List[str]):
+        self.envelopes = envelopes
 
 
 class MonthlySpendingTitle:
@@ -54,6 +56,10 @@ Selection = Union[
 ]
 
 
+class Quit:
+    pass
+
+
 class Err:
     def __init__(self, err: str):
         self.err = err
@@ -75,13 +81,36 @@ def get_envelope(envelopes: List[str]) -> Union[Err, str]:
     if isinstance(envelope_result, Err):
         return envelope_result
 
-    if envelope_result < 0 or envelope_result > len(envelopes):
+    if envelope_result < 0 or envelope_result >= len(envelopes):
         return Err("Envelope chosen out of range.")
 
     return envelopes[envelope_result]
 
 
-def get_selection(envelopes: List[str]) -> Union[Err, Selection]:
+def get_envelopes(envelopes: List[str]) -> Union[Err, List[str]]:
+    for i, envelope in enumerate(envelopes):
+        print(f'({i}) {envelope}')
+
+    envelopes_chosen = input(
+        'Choose the envelopes you would like by entering their numbers, separated by commas: ')
+    envelopes_result: List[str] = []
+    for envelope_chosen in envelopes_chosen.split(','):
+        envelope_result = safe_int(envelope_chosen.strip())
+        if isinstance(envelope_result, Err):
+            return envelope_result
+
+        if envelope_result < 0 or envelope_result >= len(envelopes):
+            return Err("Envelope chosen out of range.")
+
+        envelopes_result.append(envelopes[envelope_result])
+
+    if len(envelopes_result) > len(COLORS):
+        return Err(f"At most {len(COLORS)} envelopes can be chosen.")
+
+    return envelopes_result
+
+
+def get_selection(envelopes: List[str]) -> Union[Err, Quit, Selection]:
     selection = input(
         """Select an option to graph:
     (1) Balance as a function of time
@@ -90,9 +119,13 @@ def get_selection(envelopes: List[str]) -> Union[Err, Selection]:
     (4) Amount spent per title, in a given envelope
     (5) Amount spent per month, in a given envelope
     (6) Amount spent per month, for a given title
+    (q) Quit
     """
     )
 
+    if selection.strip() == 'q':
+        return Quit()
+
     selection_result = safe_int(selection)
     if isinstance(selection_result, Err):
         return selection_result
@@ -100,9 +133,14 @@ def get_selection(envelopes: List[str]) -> Union[Err, Selection]:
     if selection_result < 1:
         return Err("Selection must be greater than or equal to 1.")
     elif selection_result > 6:
-        return Err("Selection must be less than or equal to 4.")
+        return Err("Selection must be less than or equal to 6.")
     elif selection_result == 1:
-        return Balance()
+        resolution = input(f'resolution ({", ".join(BALANCE_RESOLUTIONS)}) [{BALANCE_DAY}]: ').strip()
+        if not resolution:
+            return Balance()
+        if resolution not in BALANCE_RESOLUTIONS:
+            return Err(f"Resolution must be one of: {', '.join(BALANCE_RESOLUTIONS)}.")
+        return Balance(resolution)
     elif selection_result == 2:
         return AmtFromMostPopular()
     elif selection_result == 3:
@@ -116,157 +154,71 @@ def get_selection(envelopes: List[str]) -> Union[Err, Selection]:
             return envelope_result
         return AmtSpentPerTitle(envelope_result)
     elif selection_result == 5:
-        envelope_result = get_envelope(envelopes)
-        if isinstance(envelope_result, Err):
-            return envelope_result
-        return MonthlySpendingEnv(envelope_result)
+        envelopes_result = get_envelopes(envelopes)
+        if isinstance(envelopes_result, Err):
+            return envelopes_result
+        return MonthlySpendingEnv(envelopes_result)
     else:
         title = input('title: ')
         return MonthlySpendingTitle(title)
 
 
-def graph(selection: Selection, txns: List[GoodbudgetTxn], date_range: List[Timestamp]):
-    if isinstance(selection, Balance):
-        dates = [dt.fromtimestamp(x.ts) for x in txns]
-        balances = [x.bal/100 for x in txns]
+def _slug(s: str) -> str:
+    return re.sub(r'[^A-Za-z0-9]+', '_', s).strip('_').lower()
 
-        pyplot.plot_date(dates, balances, color='b', linestyle='solid')
-        pyplot.show()
+
+def selection_file_name(i: int, selection: Selection) -> str:
+    # numbered, because different names can have the same slug
+    if isinstance(selection, Balance):
+        name = f'balance_by_{selection.resolution}'
     elif isinstance(selection, AmtFromMostPopular):
-        env_to_title_to_amt_txns: Dict[str, Dict[str, int]] = {}
-        for txn in txns:
-            envelope = txn.envelope
-            title = txn.title
-            if envelope not in env_to_title_to_amt_txns:
-                env_to_title_to_amt_txns[envelope] = {title: 1}
-            elif title not in env_to_title_to_amt_txns[envelope]:
-                env_to_title_to_amt_txns[envelope][title] = 1
-            else:
-                env_to_title_to_amt_txns[envelope][title] += 1
-
-        envelopes: List[str] = []
-        most_txns_list: List[int] = []
-        titles_with_most_txns: List[str] = []
-        for envelope in env_to_title_to_amt_txns:
-            most_txns = 0
-            title_with_most_txns = ''
-            for title in env_to_title_to_amt_txns[envelope]:
-                curr_txns = env_to_title_to_amt_txns[envelope][title]
-                if curr_txns > most_txns:
-                    most_txns = curr_txns
-                    title_with_most_txns = title
-            envelopes.append(envelope)
-            most_txns_list.append(most_txns)
-            titles_with_most_txns.append(title_with_most_txns)
-
-        _, ax = pyplot.subplots()
-        ax.bar(envelopes, most_txns_list)
-        for i, title in enumerate(titles_with_most_txns):
-            ax.text(i - 0.25, most_txns_list[i] + 3, title,
-                    color='blue', size='small', rotation=45)
-        pyplot.show()
+        name = 'most_popular_titles'
     elif isinstance(selection, AmtTxnsPerTitle):
-        title_to_amt_txns: Dict[str, int] = {}
-        for txn in txns:
-            if txn.envelope == selection.envelope:
-                title = txn.title
-                if title not in title_to_amt_txns:
-                    title_to_amt_txns[title] = 1
-                else:
-                    title_to_amt_txns[title] += 1
-
-        _, ax = pyplot.subplots()
-        ax.bar(list(title_to_amt_txns.keys()),
-               list(title_to_amt_txns.values()))
-        pyplot.setp(ax.get_xticklabels(), rotation=45, ha="right",
-                    rotation_mode="anchor", size='small')
-        pyplot.show()
+        name = f'txns_per_title_{_slug(selection.envelope)}'
     elif isinstance(selection, AmtSpentPerTitle):
-        title_spent: Dict[str, int] = {}
-        for txn in txns:
-            if txn.envelope == selection.envelope:
-                if txn.title not in title_spent:
-                    title_spent[txn.title] = txn.amt_cents
-                else:
-                    title_spent[txn.title] += txn.amt_cents
-
-        _, ax = pyplot.subplots()
-
-        dollars = [(x / 100) * -1 for x in title_spent.values()]
-        ax.bar(title_spent.keys(), dollars,
-               color='b', label=selection.envelope)
-
-        ax.legend()
-        pyplot.setp(ax.get_xticklabels(), rotation=45, ha="right",
-                    rotation_mode="anchor", size='small')
-
-        pyplot.show()
+        name = f'spent_per_title_{_slug(selection.envelope)}'
     elif isinstance(selection, MonthlySpendingEnv):
-        env_month_spent: Dict[str, Dict[dt, int]] = {}
-        for txn in txns:
-            # TODO: allow more than one envelope to be passed in
-            if txn.envelope == selection.envelope:
-                date_obj = dt.fromtimestamp(txn.ts)
-                first_of_month = date_obj.replace(day=1)
-                if txn.envelope not in env_month_spent:
-                    env_month_spent[txn.envelope] = {
-                        first_of_month: txn.amt_cents}
-                elif first_of_month not in env_month_spent[txn.envelope]:
-                    env_month_spent[txn.envelope][first_of_month] = txn.amt_cents
-                else:
-                    env_month_spent[txn.envelope][first_of_month] += txn.amt_cents
-
-        _, ax = pyplot.subplots()
-        width = 5
-
-        for i, envelope in enumerate(env_month_spent):
-            dollars: List[float] = []
-            for month in date_range:
-                if month not in env_month_spent[envelope]:
-                    dollars.append(0)
-                else:
-                    dollars.append(
-                        (env_month_spent[envelope][month] / 100) * -1)
-            ax.bar([x - timedelta(days=i * 5) for x in date_range],
-                   dollars, width, color=COLORS[i], label=envelope)
-
-        ax.xaxis_date()
-        ax.legend()
-        pyplot.setp(ax.get_xticklabels(), rotation=45, ha="right",
-                    rotation_mode="anchor", size='small')
-
-        pyplot.show()
-    elif isinstance(selection, MonthlySpendingTitle):
-        month_spent: Dict[dt, int] = {}
-        for txn in txns:
-            if txn.title == selection.title:
-                date_obj = dt.fromtimestamp(txn.ts)
-                first_of_month = date_obj.replace(day=1)
-                if first_of_month not in month_spent:
-                    month_spent[first_of_month] = txn.amt_cents
-                else:
-                    month_spent[first_of_month] += txn.amt_cents
-
-        _, ax = pyplot.subplots()
-        width = 5
-
-        dollars: List[float] = []
-        for month in date_range:
-            if month not in month_spent:
-                dollars.append(0)
-            else:
-                dollars.append((month_spent[month] / 100) * -1)
-        ax.bar(date_range, dollars, width, color='b', label=selection.title)
-
-        ax.xaxis_date()
-        ax.legend()
-        pyplot.setp(ax.get_xticklabels(), rotation=45, ha="right",
-                    rotation_mode="anchor", size='small')
-
-        pyplot.show()
+        name = f'monthly_spending_{"_".join(_slug(x) for x in selection.envelopes)}'
+    else:
+        name = f'monthly_spending_title_{_slug(selection.title)}'
+    return f'{i:04}_{name}'
+
+
+def main(args: List[str]) -> None:
+    # parse cmd-line args
+    in_session = False
+    render_dir = None
+    render_format = None
+    max_workers = None
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "--session" and not in_session:
+            in_session = True
+        elif arg == "--render-all" and render_dir is None and i + 1 < len(args):
+            render_dir = args[i + 1]
+            i += 1
+        elif arg.startswith("--format=") and render_format is None and arg[len("--format="):] in RENDER_FORMATS:
+            render_format = arg[len("--format="):]
+        elif arg.startswith("--workers=") and max_workers is None and arg[len("--workers="):].isdigit() \
+                and int(arg[len("--workers="):]) > 0:
+            max_workers = int(arg[len("--workers="):])
+        else:
+            print("usage: python3 graph.py [--session]\n"
+                  f"       python3 graph.py --render-all OUT_DIR [--format={'|'.join(RENDER_FORMATS)}] [--workers=N]")
+            exit(1)
+        i += 1
+    # defaults of the flags that weren't given
+    render_format = render_format or RENDER_FORMATS[0]
+
+    if in_session and render_dir is not None:
+        print("Error, --session can't be used with --render-all.")
+        exit(1)
 
+    from dotenv import dotenv_values
+
+    from config import Config
 
-if __name__ == "__main__":
     # load config
     ENV = dotenv_values(".env")
     if not ENV:
@@ -274,33 +226,34 @@ if __name__ == "__main__":
         exit(1)
     config = Config(ENV)
 
-    # get txns
-    gb_txns = read_gb_txns(config.gb_start_bal).txns
-
-    # get envelopes, earliest, and latest date
-    seen = set()
-    envelopes: List[str] = []
-    earliest_date = dt.fromtimestamp(0)
-    latest_date = dt.fromtimestamp(0)
-    for txn in gb_txns:
-        if "Unallocated" not in txn.envelope and txn.envelope not in seen:
-            seen.add(txn.envelope)
-            envelopes.append(txn.envelope)
-        curr_date = dt.fromtimestamp(txn.ts)
-        if earliest_date.timestamp() == 0 or curr_date < earliest_date:
-            earliest_date = curr_date.replace(day=1)
-        if curr_date > latest_date:
-            latest_date = curr_date
-    date_range = pandas.date_range(
-        earliest_date, latest_date, freq='MS').to_list()
+    from graph_data import load_aggregates
+    from graph_draw import graph, render_all, session
+
+    # aggregate everything the graphs need, or load it from the cache
+    aggregates = load_aggregates(config.gb_start_bal)
+
+    if render_dir is not None:
+        start = time.perf_counter()
+        out_files = render_all(aggregates, render_dir, render_format, max_workers)
+        secs = time.perf_counter() - start
+        print(f"Rendered {len(out_files)} graphs to {render_dir} in {secs:.1f}s "
+              f"({len(out_files) / secs:.1f} graphs/sec)")
+        exit(0)
 
     try:
-        selection_result = get_selection(envelopes)
-        if isinstance(selection_result, Err):
-            print('Error,', selection_result.err)
+        if in_session:
+            session(aggregates)
         else:
-            graph(selection_result, gb_txns, date_range)
+            selection_result = get_selection(aggregates.envelopes)
+            if isinstance(selection_result, Err):
+                print('Error,', selection_result.err)
+            elif not isinstance(selection_result, Quit):
+                graph(selection_result, aggregates)
 
     except EOFError:
         print('Exiting.\n')
         exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,234 @@
+import hashlib
+import os
+import pickle
+from typing import List, Optional, Sequence, Tuple
+
+import numpy
+import pandas
+
+from datatypes import BALANCE_DAY, BALANCE_MONTH, BALANCE_TXN, BALANCE_WEEK, GoodbudgetTxn
+import file_in
+from txn_table import GoodbudgetTxnTable, _StrColumn
+
+# the data behind every graph in `graph.py`. goodbudget txns are loaded into
+# one DataFrame, and everything a graph needs is a groupby over it, computed
+# once. groups are in the order in which they first appear in the file.
+# the aggregates are cached next to the goodbudget file, so that they're only
+# computed again when the file changes
+
+_CACHE_VERSION = 2
+_BLOCK_SIZE = 1 << 16
+
+_PERIODS = {BALANCE_WEEK: 'W', BALANCE_MONTH: 'M'}
+
+
+def _categorical(column: _StrColumn) -> pandas.Categorical:
+    return pandas.Categorical.from_codes(
+        numpy.frombuffer(column.codes, dtype=numpy.uint32).astype(numpy.int32),
+        categories=pandas.Index(column.values, dtype=object))
+
+
+def txns_frame(txns: Sequence[GoodbudgetTxn]) -> pandas.DataFrame:
+    # one row per txn, in the order of `txns`, with columns `date`,
+    # `envelope`, `title`, `amt_cents` and `bal`. `date` is the date of the txn
+    # at midnight, like `dt.fromtimestamp(txn.ts)`
+    if isinstance(txns, GoodbudgetTxnTable):
+        # straight from the columns of the table. only distinct dates are parsed
+        dates = _categorical(txns.date)
+        frame = pandas.DataFrame({
+            'date': pandas.to_datetime(dates.categories, format='%m/%d/%Y')[dates.codes],
+            'envelope': _categorical(txns.envelope),
+            'title': _categorical(txns.title),
+            'amt_cents': numpy.frombuffer(txns.amt_cents, dtype=numpy.int64),
+            'bal': numpy.frombuffer(txns.bal, dtype=numpy.int64),
+        })
+    else:
+        frame = pandas.DataFrame({
+            'date': pandas.to_datetime([x.date for x in txns], format='%m/%d/%Y'),
+            'envelope': pandas.Categorical([x.envelope for x in txns]),
+            'title': pandas.Categorical([x.title for x in txns]),
+            'amt_cents': numpy.array([x.amt_cents for x in txns], dtype=numpy.int64),
+            'bal': numpy.array([x.bal for x in txns], dtype=numpy.int64),
+        })
+
+    frame['month'] = frame['date'].dt.to_period('M').dt.to_timestamp()
+    return frame
+
+
+def _merge_balances(balances: pandas.DataFrame, keys) -> pandas.DataFrame:
+    # merges the rows of `balances` that have the same key into one row, at the
+    # last date of them: the last `close`, the lowest `low` and the highest
+    # `high`. rows with the same key have to be next to each other
+    merged = balances.groupby(keys, sort=False).agg(
+        close=('close', 'last'), low=('low', 'min'), high=('high', 'max'))
+    merged.index = pandas.DatetimeIndex(
+        balances.index.to_series().groupby(keys, sort=False).last().to_numpy(), name='date')
+    return merged
+
+
+def downsample_balances(balances: pandas.DataFrame, max_points: int) -> pandas.DataFrame:
+    # merges consecutive rows of `balances` into at most `max_points` rows, so
+    # that what is graphed doesn't depend on the amount of txns. the lowest and
+    # highest balances of the merged rows are kept
+    if len(balances) <= max_points:
+        return balances
+    buckets = numpy.arange(len(balances)) * max_points // len(balances)
+    return _merge_balances(balances, buckets)
+
+
+class GbAggregates:
+    def __init__(self, frame: pandas.DataFrame):
+        by = dict(sort=False, observed=True)
+
+        # envelopes, except the unallocated one, and every month that has txns
+        envelopes = frame['envelope'].drop_duplicates()
+        self.envelopes: List[str] = [x for x in envelopes if 'Unallocated' not in x]
+        if len(frame):
+            self.date_range = pandas.date_range(
+                frame['month'].min(), frame['date'].max(), freq='MS').to_list()
+        else:
+            self.date_range = []
+
+        # balance as a function of time, in the order of the file
+        self.balance_dates = frame['date']
+        self.balances = frame['bal']
+
+        # balance after the last txn of every day with txns, and the lowest and
+        # highest balance after any of them. txns aren't always in the order
+        # of their dates, so they're sorted by date first, keeping their order
+        by_txn = self._balances_by_txn().sort_index(kind='mergesort')
+        self.daily_balances = _merge_balances(by_txn, by_txn.index.to_numpy())
+
+        # amount of txns and cents per envelope and title
+        self.env_title = frame.groupby(['envelope', 'title'], **by)['amt_cents'] \
+            .agg(['size', 'sum']).rename(columns={'size': 'amt_txns', 'sum': 'cents'})
+
+        # cents per envelope and month, and per title and month
+        self.env_month = frame.groupby(['envelope', 'month'], **by)['amt_cents'].sum()
+        self.title_month = frame.groupby(['title', 'month'], **by)['amt_cents'].sum()
+
+    def most_popular_titles(self) -> Tuple[List[str], List[int], List[str]]:
+        # for every envelope, the title with the most txns and how many it has
+        amt_txns = self.env_title['amt_txns']
+        most_popular = amt_txns.groupby(level='envelope', sort=False, observed=True).idxmax()
+        envelopes = [envelope for envelope, _ in most_popular]
+        titles = [title for _, title in most_popular]
+        return envelopes, amt_txns.loc[list(most_popular)].tolist(), titles
+
+    def _balances_by_txn(self) -> pandas.DataFrame:
+        # in the order in which the balance was computed: from the bottom of
+        # the file to the top
+        bals = self.balances.to_numpy()[::-1]
+        return pandas.DataFrame({'close': bals, 'low': bals, 'high': bals},
+                                index=pandas.DatetimeIndex(self.balance_dates.to_numpy()[::-1], name='date'))
+
+    def balance_series(self, resolution: str, max_points: int) -> pandas.DataFrame:
+        # balances in cents at `resolution`, indexed by date, with the columns
+        # `close`, `low` and `high`. there are at most `max_points` rows. by
+        # txn, they're in the order of the file, from the bottom. otherwise
+        # they're sorted by date
+        if resolution == BALANCE_TXN:
+            balances = self._balances_by_txn()
+        elif resolution == BALANCE_DAY:
+            balances = self.daily_balances
+        else:
+            periods = self.daily_balances.index.to_period(_PERIODS[resolution]).to_numpy()
+            balances = _merge_balances(self.daily_balances, periods)
+        return downsample_balances(balances, max_points)
+
+    def top_titles(self, amt_titles: int) -> List[str]:
+        # the titles with the most txns, across every envelope
+        amt_txns = self.env_title['amt_txns'].groupby(level='title', sort=False, observed=True).sum()
+        return amt_txns.nlargest(amt_titles).index.tolist()
+
+    def amt_txns_per_title(self, envelope: str) -> pandas.Series:
+        return self._in_envelope(envelope)['amt_txns']
+
+    def cents_per_title(self, envelope: str) -> pandas.Series:
+        return self._in_envelope(envelope)['cents']
+
+    def _in_envelope(self, envelope: str) -> pandas.DataFrame:
+        if envelope not in self.env_title.index.get_level_values('envelope'):
+            return self.env_title.iloc[:0].droplevel('envelope')
+        return self.env_title.xs(envelope, level='envelope')
+
+    def monthly_cents_env(self, envelope: str) -> pandas.Series:
+        return self._monthly(self.env_month, envelope)
+
+    def monthly_cents_title(self, title: str) -> pandas.Series:
+        return self._monthly(self.title_month, title)
+
+    def _monthly(self, cents: pandas.Series, key: str) -> pandas.Series:
+        # cents of every month in `date_range`, with 0 for months without txns
+        if key in cents.index.get_level_values(0):
+            cents = cents.xs(key, level=0)
+        else:
+            cents = cents.iloc[:0].droplevel(0)
+        return cents.reindex(self.date_range, fill_value=0)
+
+
+### Cache ###############################################################
+class _CachedAggregates:
+    def __init__(self, key: tuple, mtime_ns: int, file_hash: str, aggregates: GbAggregates):
+        # what the aggregates depend on, besides the contents of the file
+        self.key = key
+        self.mtime_ns = mtime_ns
+        self.file_hash = file_hash
+        self.aggregates = aggregates
+
+
+def _file_hash(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as in_file:
+        while (block := in_file.read(_BLOCK_SIZE)):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _read_cache(cache_file: str) -> Optional[_CachedAggregates]:
+    try:
+        with open(cache_file, 'rb') as in_file:
+            cached = pickle.load(in_file)
+    except Exception:
+        # missing, or written by another version of this program or of pandas
+        return None
+    return cached if isinstance(cached, _CachedAggregates) else None
+
+
+def _write_cache(cache_file: str, cached: _CachedAggregates) -> None:
+    # written to a temporary file first, so that a cache is never half-written
+    tmp_file = f'{cache_file}.tmp'
+    with open(tmp_file, 'wb') as out_file:
+        pickle.dump(cached, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, cache_file)
+
+
+def cache_file_of(in_file: str) -> str:
+    return f'{in_file}.aggregates.pickle'
+
+
+def load_aggregates(gb_start_bal: int, in_file: Optional[str] = None) -> GbAggregates:
+    # the aggregates of a goodbudget file, which defaults to `IN_GB_FILE`. they
+    # come from the cache if the file is the same as when it was made: same
+    # size and modification time, or, if only the modification time changed,
+    # same contents
+    in_file = in_file or file_in.IN_GB_FILE
+    cache_file = cache_file_of(in_file)
+    stat = os.stat(in_file)
+    key = (_CACHE_VERSION, gb_start_bal, stat.st_size)
+
+    cached = _read_cache(cache_file)
+    file_hash = None
+    if cached is not None and cached.key == key:
+        if cached.mtime_ns == stat.st_mtime_ns:
+            return cached.aggregates
+        file_hash = _file_hash(in_file)
+        if cached.file_hash == file_hash:
+            _write_cache(cache_file, _CachedAggregates(key, stat.st_mtime_ns, file_hash, cached.aggregates))
+            return cached.aggregates
+
+    gb_txns = file_in.read_gb_txns(gb_start_bal, in_file=in_file).txns
+    aggregates = GbAggregates(txns_frame(gb_txns))
+    _write_cache(cache_file, _CachedAggregates(
+        key, stat.st_mtime_ns, file_hash or _file_hash(in_file), aggregates))
+    return aggregates
@@ -0,0 +1,172 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import os
+from typing import List, Optional
+
+from matplotlib import pyplot
+from matplotlib.figure import Figure
+
+from datatypes import BALANCE_RESOLUTIONS
+from graph import (
+    AmtFromMostPopular,
+    AmtSpentPerTitle,
+    AmtTxnsPerTitle,
+    Balance,
+    COLORS,
+    Err,
+    MonthlySpendingEnv,
+    MonthlySpendingTitle,
+    Quit,
+    Selection,
+    get_selection,
+    selection_file_name,
+)
+from graph_data import GbAggregates
+
+# amount of titles that `--render-all` graphs the monthly spending of
+RENDER_AMT_TITLES = 20
+
+
+def draw(selection: Selection, aggregates: GbAggregates, fig: Figure):
+    # draws the graph of `selection` on `fig`, replacing what it had
+    fig.clf()
+    ax = fig.subplots()
+    date_range = aggregates.date_range
+    if isinstance(selection, Balance):
+        # at most one point per pixel of width. the band shows the lowest and
+        # highest balance of every point
+        max_points = int(fig.get_figwidth() * fig.dpi)
+        balances = aggregates.balance_series(selection.resolution, max_points) / 100
+
+        ax.fill_between(balances.index, balances['low'], balances['high'],
+                        color='b', alpha=0.25, linewidth=0)
+        ax.plot(balances.index, balances['close'], color='b', linestyle='solid',
+                label=f'balance by {selection.resolution}')
+        ax.xaxis_date()
+        ax.legend()
+    elif isinstance(selection, AmtFromMostPopular):
+        envelopes, most_txns_list, titles_with_most_txns = aggregates.most_popular_titles()
+
+        ax.bar(envelopes, most_txns_list)
+        for i, title in enumerate(titles_with_most_txns):
+            ax.text(i - 0.25, most_txns_list[i] + 3, title,
+                    color='blue', size='small', rotation=45)
+    elif isinstance(selection, AmtTxnsPerTitle):
+        title_to_amt_txns = aggregates.amt_txns_per_title(selection.envelope)
+
+        ax.bar(title_to_amt_txns.index.tolist(), title_to_amt_txns.tolist())
+        pyplot.setp(ax.get_xticklabels(), rotation=45, ha="right",
+                    rotation_mode="anchor", size='small')
+    elif isinstance(selection, AmtSpentPerTitle):
+        title_spent = aggregates.cents_per_title(selection.envelope)
+
+        dollars = ((title_spent / 100) * -1).tolist()
+        ax.bar(title_spent.index.tolist(), dollars,
+               color='b', label=selection.envelope)
+
+        ax.legend()
+        pyplot.setp(ax.get_xticklabels(), rotation=45, ha="right",
+                    rotation_mode="anchor", size='small')
+    elif isinstance(selection, MonthlySpendingEnv):
+        width = 5
+
+        # bars of different envelopes are shifted so that they don't overlap
+        for i, envelope in enumerate(selection.envelopes):
+            month_spent = aggregates.monthly_cents_env(envelope)
+            dollars = ((month_spent / 100) * -1).tolist()
+            ax.bar([x - timedelta(days=i * 5) for x in date_range],
+                   dollars, width, color=COLORS[i], label=envelope)
+
+        ax.xaxis_date()
+        ax.legend()
+        pyplot.setp(ax.get_xticklabels(), rotation=45, ha="right",
+                    rotation_mode="anchor", size='small')
+    elif isinstance(selection, MonthlySpendingTitle):
+        month_spent = aggregates.monthly_cents_title(selection.title)
+
+        width = 5
+
+        dollars = ((month_spent / 100) * -1).tolist()
+        ax.bar(date_range, dollars, width, color='b', label=selection.title)
+
+        ax.xaxis_date()
+        ax.legend()
+        pyplot.setp(ax.get_xticklabels(), rotation=45, ha="right",
+                    rotation_mode="anchor", size='small')
+
+
+def graph(selection: Selection, aggregates: GbAggregates):
+    draw(selection, aggregates, pyplot.figure())
+    pyplot.show()
+
+
+def session(aggregates: GbAggregates):
+    # asks for one selection after another and graphs each of them in the
+    # same window, until the user quits. the aggregates are only loaded once
+    pyplot.ion()
+    fig = pyplot.figure()
+    while True:
+        selection_result = get_selection(aggregates.envelopes)
+        if isinstance(selection_result, Quit):
+            return
+        if isinstance(selection_result, Err):
+            print('Error,', selection_result.err)
+            continue
+
+        # the window may have been closed since the last graph
+        if not pyplot.fignum_exists(fig.number):
+            fig = pyplot.figure()
+        draw(selection_result, aggregates, fig)
+        fig.canvas.draw_idle()
+        pyplot.pause(0.001)
+
+
+### Rendering every graph ##############################################
+def all_selections(aggregates: GbAggregates, amt_titles: int = RENDER_AMT_TITLES) -> List[Selection]:
+    # every selection, for every envelope and for the titles with most txns
+    selections: List[Selection] = [Balance(x) for x in BALANCE_RESOLUTIONS]
+    selections.append(AmtFromMostPopular())
+    for envelope in aggregates.envelopes:
+        selections.append(AmtTxnsPerTitle(envelope))
+        selections.append(AmtSpentPerTitle(envelope))
+        selections.append(MonthlySpendingEnv([envelope]))
+    for title in aggregates.top_titles(amt_titles):
+        selections.append(MonthlySpendingTitle(title))
+    return selections
+
+
+# every worker process gets the aggregates once, and draws every graph on the
+# same figure
+_worker_aggregates: Optional[GbAggregates] = None
+_worker_fig: Optional[Figure] = None
+
+
+def _init_worker(aggregates: GbAggregates) -> None:
+    global _worker_aggregates, _worker_fig
+    _worker_aggregates = aggregates
+    _worker_fig = Figure()
+
+
+def _render(selection: Selection, out_file: str) -> None:
+    draw(selection, _worker_aggregates, _worker_fig)
+    _worker_fig.savefig(out_file)
+
+
+def render_all(aggregates: GbAggregates, out_dir: str, out_format: str = 'png',
+               max_workers: Optional[int] = None) -> List[str]:
+    # writes the graph of every selection to `out_dir`, without a display.
+    # `max_workers` defaults to the number of cores
+    os.makedirs(out_dir, exist_ok=True)
+    selections = all_selections(aggregates)
+    out_files = [f'{out_dir}/{selection_file_name(i, x)}.{out_format}'
+                 for i, x in enumerate(selections)]
+
+    if max_workers == 1:
+        _init_worker(aggregates)
+        for selection, out_file in zip(selections, out_files):
+            _render(selection, out_file)
+    else:
+        with ProcessPoolExecutor(max_workers, initializer=_init_worker,
+                                 initargs=(aggregates,)) as executor:
+            list(executor.map(_render, selections, out_files, chunksize=4))
+    return out_files
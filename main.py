@@ -2,24 +2,150 @@ import sys
 
 from dotenv import dotenv_values
 
-from add_new_txns import add_new_txns
 from config import Config
+from drift import DriftIndex
 from file_in import read_ch_txns, read_gb_txns
-from file_out import Logger, OUT_DIR
-from match import get_txns_grouped
+from file_out import Logger, OUT_CSV, OUT_DIR, OUT_FORMATS, OUT_PARQUET, PARQUET_AVAILABLE
+from match import MATCH_GREEDY, MATCH_MODES, get_txns_grouped
+from profiling import stage, start_profiling, stop_profiling
+
+# python3 main.py [reconcile|add|graph] [flags]. only what reconciling needs
+# is imported up front. what only adding, batches, incremental runs or graphs
+# need, like selenium or matplotlib, is imported when it's used
+SUBCOMMANDS = ['reconcile', 'add', 'graph']
+
+
+def _is_confidence(s: str) -> bool:
+    try:
+        return 0 < float(s) <= 1
+    except ValueError:
+        return False
+
+
+def _usage() -> None:
+    formats = f"[--match={'|'.join(MATCH_MODES)}] [--format={'|'.join(OUT_FORMATS)}] [--profile[=cprofile]]"
+    add = "[--auto-accept[=CONFIDENCE]] [--rules=RULES [--confirm-plan]] [--submit=selenium|http] [--workers=N]"
+    print(f"usage: python3 main.py [reconcile] [--incremental] [--drift] {formats}\n"
+          f"       python3 main.py add {add} [--incremental] [--drift] {formats}\n"
+          f"       python3 main.py [reconcile] --batch=MANIFEST [--workers=N] {formats}\n"
+          f"       python3 main.py graph [--session | --render-all OUT_DIR [--format=png|svg] [--workers=N]]")
+    exit(1)
+
 
 if __name__ == "__main__":
+    # `add` is the same as `--add`, and no subcommand is the same as `reconcile`
+    args = sys.argv[1:]
+    subcommand = args.pop(0) if args and args[0] in SUBCOMMANDS else None
+    if subcommand == 'graph':
+        from graph import main as graph_main
+        graph_main(args)
+        exit(0)
+
     # parse cmd-line args
-    add_txns = False
-    i = 1
-    while i < len(sys.argv):
-        arg = sys.argv[i]
+    add_txns = subcommand == 'add'
+    incremental = False
+    match_mode = None
+    manifest_file = None
+    max_workers = None
+    out_format = None
+    auto_accept = None
+    rules_file = None
+    confirm_plan = False
+    submit_backend = None
+    profile = None
+    drift = False
+    i = 0
+    while i < len(args):
+        arg = args[i]
         if arg == "--add" and not add_txns:
             add_txns = True
+        elif arg == "--incremental" and not incremental:
+            incremental = True
+        elif arg.startswith("--match=") and match_mode is None and arg[len("--match="):] in MATCH_MODES:
+            match_mode = arg[len("--match="):]
+        elif arg.startswith("--batch=") and manifest_file is None:
+            manifest_file = arg[len("--batch="):]
+        elif arg.startswith("--workers=") and max_workers is None and arg[len("--workers="):].isdigit() \
+                and int(arg[len("--workers="):]) > 0:
+            max_workers = int(arg[len("--workers="):])
+        elif arg.startswith("--format=") and out_format is None and arg[len("--format="):] in OUT_FORMATS:
+            out_format = arg[len("--format="):]
+        elif arg == "--auto-accept" and auto_accept is None:
+            auto_accept = ""
+        elif arg.startswith("--auto-accept=") and auto_accept is None \
+                and _is_confidence(arg[len("--auto-accept="):]):
+            auto_accept = arg[len("--auto-accept="):]
+        elif arg.startswith("--rules=") and rules_file is None:
+            rules_file = arg[len("--rules="):]
+        elif arg == "--confirm-plan" and not confirm_plan:
+            confirm_plan = True
+        elif arg.startswith("--submit=") and submit_backend is None:
+            submit_backend = arg[len("--submit="):]
+        elif arg in ["--profile", "--profile=cprofile"] and profile is None:
+            profile = arg
+        elif arg == "--drift" and not drift:
+            drift = True
         else:
-            print("usage: python3 main.py [--add]")
-            exit(1)
+            _usage()
         i += 1
+    # defaults of the flags that weren't given
+    match_mode = match_mode or MATCH_GREEDY
+    out_format = out_format or OUT_CSV
+
+    if add_txns:
+        from add_new_txns import add_new_txns
+        from categorizer import AUTO_ACCEPT_CONFIDENCE
+        from rules import RuleMatcher, read_rules
+        from submit import GB_URL, SUBMIT_BACKENDS, SUBMIT_SELENIUM
+        from submit_queue import MAX_WORKERS
+
+        if submit_backend is not None and submit_backend not in SUBMIT_BACKENDS:
+            _usage()
+        if auto_accept == "":
+            auto_accept = str(AUTO_ACCEPT_CONFIDENCE)
+
+    if (auto_accept is not None or rules_file is not None or confirm_plan or submit_backend is not None) \
+            and not add_txns:
+        print("Error, --auto-accept, --rules, --confirm-plan and --submit can only be used with --add.")
+        exit(1)
+
+    if out_format == OUT_PARQUET and not PARQUET_AVAILABLE:
+        print("Error, --format=parquet needs pyarrow, which can be installed with: pipenv install pyarrow")
+        exit(1)
+
+    # time every stage of the run, and with cProfile, every function
+    if profile is not None:
+        start_profiling(use_cprofile=profile == "--profile=cprofile")
+
+    # reconcile every pair of files in the manifest, instead of the ones in ./in
+    if manifest_file is not None:
+        if add_txns or incremental or drift:
+            print("Error, --batch can't be used with --add, --incremental or --drift.")
+            exit(1)
+        from batch import read_manifest, run_batch
+
+        try:
+            jobs = read_manifest(manifest_file)
+        except (OSError, ValueError) as e:
+            print(f"Error, couldn't read manifest: {e}")
+            exit(1)
+        # each pair is profiled as a whole, since it's reconciled in another
+        # process
+        with stage('run_batch') as s:
+            results = run_batch(jobs, max_workers, match_mode, out_format)
+            s.add_rows(len(results))
+
+        log = Logger()
+        log.batch_summary(results)
+        if (profiler := stop_profiling()) is not None:
+            log.profile(profiler)
+        for result in results:
+            status = f"error: {result.error}" if result.error else \
+                f"{result.amt_both} matched, {result.amt_only_ch} only in Chase, " \
+                f"{result.amt_only_gb} only in Goodbudget"
+            print(f"{result.job.out_dir}: {status}")
+        print(f"Saved summary to: {OUT_DIR}")
+        exit(1 if any(x.error for x in results) else 0)
 
     # load config
     ENV = dotenv_values(".env")
@@ -28,20 +154,54 @@ if __name__ == "__main__":
         exit(1)
     config = Config(ENV)
 
-    # read txns
-    ch_txns_result = read_ch_txns(config.ch_start_bal)
-    gb_txns_result = read_gb_txns(config.gb_start_bal)
-    ch_txns = ch_txns_result.txns
-    gb_txns = gb_txns_result.txns
+    log = Logger()
 
-    txns_grouped = get_txns_grouped(
-        ch_txns, gb_txns, config.ch_start_bal, config.gb_start_bal)
+    # read txns. lines that fail to parse are streamed to the log
+    if incremental:
+        # only parse and re-match what changed since the last incremental run
+        from store import ReconcileStore
+
+        store = ReconcileStore()
+        with log.failed_lines_writer() as failed_lines, stage('read_ch_txns') as s:
+            ch_read = store.read_ch_txns(config.ch_start_bal, failed_lines.write)
+            s.add_rows(len(ch_read.txns))
+        with log.failed_lines_writer() as failed_lines, stage('read_gb_txns') as s:
+            gb_read = store.read_gb_txns(config.gb_start_bal, failed_lines.write)
+            s.add_rows(len(gb_read.txns))
+        ch_txns, gb_txns = ch_read.txns, gb_read.txns
+
+        with stage('get_txns_grouped') as s:
+            txns_grouped = store.get_txns_grouped(
+                ch_read, gb_read, config.ch_start_bal, config.gb_start_bal, match_mode)
+            s.add_rows(len(txns_grouped.merged_txns))
+        store.close()
+    else:
+        with log.failed_lines_writer() as failed_lines, stage('read_ch_txns') as s:
+            ch_txns = read_ch_txns(config.ch_start_bal, failed_lines.write).txns
+            s.add_rows(len(ch_txns))
+        with log.failed_lines_writer() as failed_lines, stage('read_gb_txns') as s:
+            gb_txns = read_gb_txns(config.gb_start_bal, failed_lines.write).txns
+            s.add_rows(len(gb_txns))
+
+        with stage('get_txns_grouped') as s:
+            txns_grouped = get_txns_grouped(
+                ch_txns, gb_txns, config.ch_start_bal, config.gb_start_bal, match_mode)
+            s.add_rows(len(txns_grouped.merged_txns))
 
-    log = Logger()
-    log.lines_failed(ch_txns_result.lines_failed)
-    log.lines_failed(gb_txns_result.lines_failed)
     log.amt_matched_and_unmatched(txns_grouped)
-    log.txns_grouped(txns_grouped)
+    with stage('write_reports') as s:
+        if out_format == OUT_PARQUET:
+            log.txns_grouped_parquet(txns_grouped)
+        else:
+            log.txns_grouped(txns_grouped)
+        s.add_rows(len(txns_grouped.merged_txns))
+
+    # where chase and goodbudget drifted apart
+    if drift:
+        with stage('drift') as s:
+            log.drift(DriftIndex(txns_grouped.merged_txns, config.ch_start_bal - config.gb_start_bal),
+                      out_format)
+            s.add_rows(len(txns_grouped.merged_txns))
     print(f"Saved to: {OUT_DIR}")
 
     if add_txns:
@@ -50,10 +210,34 @@ if __name__ == "__main__":
             print("Error, no .envelopes.env file found.")
             exit(1)
 
+        rules = None
+        if rules_file is not None:
+            try:
+                rules = read_rules(rules_file)
+            except (OSError, ValueError) as e:
+                print(f"Error, couldn't read rules: {e}")
+                exit(1)
+            unknown = [x for x in rules
+                       if x.gb_envelope and x.gb_envelope.replace(' ', '_').upper() not in ENVELOPES]
+            if unknown:
+                print(f"Error, {rules_file}, line {unknown[0].line_num}: "
+                      f"envelope {unknown[0].gb_envelope} isn't in .envelopes.env")
+                exit(1)
+            try:
+                rules = RuleMatcher(rules)
+            except ValueError as e:
+                print(f"Error, {rules_file}, {e}")
+                exit(1)
+
         last_gb_txn_ts = gb_txns[0].ts if len(gb_txns) > 0 else 0
 
-        add_new_txns(txns_grouped, ENVELOPES, config.gb_username,
-                     config.gb_password, last_gb_txn_ts)
+        # includes the time spent answering
+        with stage('add_new_txns'):
+            add_new_txns(txns_grouped, ENVELOPES, config.gb_username,
+                         config.gb_password, last_gb_txn_ts, log,
+                         float(auto_accept) if auto_accept is not None else None, rules,
+                         submit_backend or SUBMIT_SELENIUM, config.gb_url or GB_URL,
+                         max_workers or MAX_WORKERS, confirm_plan)
 
         # print amts
         amt_pending = 0
@@ -63,3 +247,7 @@ if __name__ == "__main__":
 
         print(
             f"\nAll done! Dollar amount not added from pending txns: ${amt_pending/100}")
+
+    if (profiler := stop_profiling()) is not None:
+        log.profile(profiler)
+        print(f"Saved profile to: {log.profile_file}")
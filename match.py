@@ -1,5 +1,5 @@
-from functools import cmp_to_key
-from typing import Dict, List
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
 
 from datatypes import (
     BalanceDifferenceFrequency,
@@ -11,107 +11,275 @@ from datatypes import (
     MergedTxn_GoodbudgetTxn,
     TxnsGrouped,
 )
+from profiling import stage
 
 MAX_DAYS_APART = 7
 
+# how chase txns are paired with goodbudget txns of the same amount
+MATCH_GREEDY = 'greedy'
+MATCH_OPTIMAL = 'optimal'
+MATCH_MODES = [MATCH_GREEDY, MATCH_OPTIMAL]
+
+
+def _in_file_order(merged_txns: List[MergedTxn], get_id: Callable[[MergedTxn], int]) -> List[MergedTxn]:
+    # the id of a txn is its line number and files list the newest txns first,
+    # so walking the ids backwards gives the txns from oldest to newest
+    ids = [get_id(merged_txn) for merged_txn in merged_txns]
+    by_id: List[Optional[MergedTxn]] = [None] * (max(ids, default=-1) + 1)
+    for id_, merged_txn in zip(ids, merged_txns):
+        by_id[id_] = merged_txn
+    return [merged_txn for merged_txn in reversed(by_id) if merged_txn is not None]
+
 
 def _sort_merged_txns(merged_txns: List[MergedTxn]) -> List[MergedTxn]:
-    def get_gb_id(txn: MergedTxn) -> int:
-        if isinstance(txn, MergedTxn_ChaseTxn):
-            return 1
-        else:
-            return -txn.gb_txn.id_
+    # chase txns have to stay in the order of the chase file, and goodbudget
+    # txns in the order of the goodbudget file. so both orders are merged like
+    # in merge sort: a chase-only txn and a goodbudget-only txn go by date, and
+    # a matched txn waits until it's next in both files
+    ch_side = _in_file_order(
+        [x for x in merged_txns if not isinstance(x, MergedTxn_GoodbudgetTxn)],
+        lambda x: x.ch_txn.id_)
+    gb_side = _in_file_order(
+        [x for x in merged_txns if not isinstance(x, MergedTxn_ChaseTxn)],
+        lambda x: x.gb_txn.id_)
 
-    def compare(txn_1: MergedTxn, txn_2: MergedTxn):
-        def get_ts(txn: MergedTxn):
-            if isinstance(txn, MergedTxn_ChaseTxn):
-                return txn.ch_txn.ts
+    merged_txns_sorted: List[MergedTxn] = []
+    added: Set[int] = set()
+    ch_i, gb_i = 0, 0
+    while ch_i < len(ch_side) and gb_i < len(gb_side):
+        ch_next, gb_next = ch_side[ch_i], gb_side[gb_i]
+        if id(ch_next) in added:
+            ch_i += 1
+        elif ch_next is gb_next:
+            merged_txns_sorted.append(ch_next)
+            ch_i += 1
+            gb_i += 1
+        elif isinstance(ch_next, MergedTxn_ChaseTxn) and isinstance(gb_next, MergedTxn_GoodbudgetTxn):
+            # on the same date, the goodbudget txn goes first
+            if ch_next.ch_txn.ts < gb_next.gb_txn.ts:
+                merged_txns_sorted.append(ch_next)
+                ch_i += 1
             else:
-                return txn.gb_txn.ts
-
-        if not isinstance(txn_1, MergedTxn_ChaseTxn) and not isinstance(txn_2, MergedTxn_ChaseTxn):
-            return -1 if txn_1.gb_txn.id_ > txn_2.gb_txn.id_ else 1
-        elif not isinstance(txn_1, MergedTxn_GoodbudgetTxn) and not isinstance(txn_2, MergedTxn_GoodbudgetTxn):
-            return -1 if txn_1.ch_txn.id_ > txn_2.ch_txn.id_ else 1
+                merged_txns_sorted.append(gb_next)
+                gb_i += 1
+        elif isinstance(ch_next, MergedTxn_ChaseTxn):
+            # `gb_next` is matched with a chase txn that comes after `ch_next`
+            merged_txns_sorted.append(ch_next)
+            ch_i += 1
         else:
-            txn_1_ts = get_ts(txn_1)
-            txn_2_ts = get_ts(txn_2)
-            if txn_1_ts < txn_2_ts:
-                return -1
-            elif txn_1_ts > txn_2_ts:
-                return 1
-            else:
-                return 0
+            # either `ch_next` is matched with a goodbudget txn that comes after
+            # `gb_next`, or both are matched and their pairs cross. in that
+            # case the goodbudget order wins
+            merged_txns_sorted.append(gb_next)
+            added.add(id(gb_next))
+            gb_i += 1
+
+    # if there are some txns left in one side but not the other,
+    # add the ones that haven't been added yet
+    merged_txns_sorted.extend(x for x in ch_side[ch_i:] if id(x) not in added)
+    merged_txns_sorted.extend(gb_side[gb_i:])
 
-    sorted_by_gb_id = sorted(merged_txns, key=get_gb_id)
-    return sorted(sorted_by_gb_id, key=cmp_to_key(compare))
+    return merged_txns_sorted
 
 
-def get_txns_grouped(ch_txns: List[ChaseTxn], gb_txns: List[GoodbudgetTxn],
-                     ch_start_bal: int, gb_start_bal: int) -> TxnsGrouped:
-    # sort by amount, on a tie, give priority to the earlier txn
-    ch_sorted = sorted(ch_txns, key=lambda x: (x.amt_cents, -x.id_))
-    gb_sorted = sorted(gb_txns, key=lambda x: (x.amt_cents, -x.id_))
+_MAX_SECS_APART = MAX_DAYS_APART * 60 * 60 * 24
 
-    # merge chase txns and gb txns
+
+class _AmtBucket:
+    # goodbudget txns with the same amount, sorted by date. on the same date,
+    # the earlier txn in the file goes first
+    def __init__(self):
+        self.ts: List[int] = []
+        self.gb_txns: List[GoodbudgetTxn] = []
+        self.unmatched: List[GoodbudgetTxn] = []
+        self.next_i = 0
+
+    def pop_earliest(self, ts: int) -> Optional[GoodbudgetTxn]:
+        # chase txns are matched from oldest to newest, so a goodbudget txn that
+        # is too old for one chase txn is too old for every chase txn after it,
+        # and the unmatched txns that are still in range always start at `next_i`
+        i = bisect_left(self.ts, ts - _MAX_SECS_APART, self.next_i)
+        self.unmatched.extend(self.gb_txns[self.next_i:i])
+        self.next_i = i
+        if i == len(self.ts) or self.ts[i] - ts > _MAX_SECS_APART:
+            return None
+
+        self.next_i += 1
+        return self.gb_txns[i]
+
+    def rest_unmatched(self) -> List[GoodbudgetTxn]:
+        return self.unmatched + self.gb_txns[self.next_i:]
+
+
+def _match_txns(ch_txns: Sequence[ChaseTxn], gb_txns: Sequence[GoodbudgetTxn]) -> List[MergedTxn]:
+    # index the goodbudget txns by amount
+    gb_by_amt: Dict[int, _AmtBucket] = {}
+    for gb_txn in sorted(gb_txns, key=lambda x: (x.ts, -x.id_)):
+        if gb_txn.amt_cents not in gb_by_amt:
+            gb_by_amt[gb_txn.amt_cents] = _AmtBucket()
+        bucket = gb_by_amt[gb_txn.amt_cents]
+        bucket.ts.append(gb_txn.ts)
+        bucket.gb_txns.append(gb_txn)
+
+    # from the oldest chase txn to the newest, match each one with the earliest
+    # unmatched goodbudget txn of the same amount that is within
+    # `MAX_DAYS_APART`. leaving the later goodbudget txns for the later chase
+    # txns matches as many txns as possible
     merged_txns: List[MergedTxn] = []
-    ch_i, gb_i = 0, 0
-    while ch_i < len(ch_sorted) and gb_i < len(gb_sorted):
-        ch_txn, gb_txn = ch_sorted[ch_i], gb_sorted[gb_i]
-        if ch_txn.amt_cents < gb_txn.amt_cents:
+    for ch_txn in sorted(ch_txns, key=lambda x: (x.ts, -x.id_)):
+        bucket = gb_by_amt.get(ch_txn.amt_cents)
+        gb_txn = bucket.pop_earliest(ch_txn.ts) if bucket else None
+        if gb_txn is None:
             merged_txns.append(MergedTxn_ChaseTxn(ch_txn))
-            ch_i += 1
-        elif ch_txn.amt_cents > gb_txn.amt_cents:
-            merged_txns.append(MergedTxn_GoodbudgetTxn(gb_txn))
-            gb_i += 1
         else:
-            days_apart = (gb_txn.ts - ch_txn.ts) / (60 * 60 * 24)
-            if days_apart < (MAX_DAYS_APART * -1):
-                # if gb too far in past, add it by itself
-                merged_txns.append(MergedTxn_GoodbudgetTxn(gb_txn))
-                gb_i += 1
-            elif days_apart > MAX_DAYS_APART:
-                # if ch too far in past, add it by itself
-                merged_txns.append(MergedTxn_ChaseTxn(ch_txn))
-                ch_i += 1
-            else:
-                merged_txns.append(MergedTxn_BothTxns(ch_txn, gb_txn))
-                ch_i += 1
-                gb_i += 1
+            merged_txns.append(MergedTxn_BothTxns(ch_txn, gb_txn))
+
+    for bucket in gb_by_amt.values():
+        merged_txns.extend(MergedTxn_GoodbudgetTxn(x) for x in bucket.rest_unmatched())
 
-    # if there are some txns left in one list but not the other,
-    # add those txns individually
-    while ch_i < len(ch_sorted):
-        merged_txns.append(MergedTxn_ChaseTxn(ch_sorted[ch_i]))
-        ch_i += 1
-    while gb_i < len(gb_sorted):
-        merged_txns.append(MergedTxn_GoodbudgetTxn(gb_sorted[gb_i]))
-        gb_i += 1
+    return merged_txns
 
+
+# choices when building `_min_cost_pairs`'s table
+_SKIP_CH, _SKIP_GB, _PAIR = 0, 1, 2
+
+
+def _min_cost_pairs(ch_ts: List[int], gb_ts: List[int]) -> List[Tuple[int, int]]:
+    # pair the indexes of two sorted lists of dates so that as many pairs as
+    # possible are within `MAX_DAYS_APART`, and, among those, the total amount
+    # of time between the dates of each pair is the lowest.
+    # two pairs that cross can always be uncrossed without making either of
+    # them longer than `MAX_DAYS_APART` or making their total longer, so only
+    # pairings that keep both lists in order are tried, like in a diff. row
+    # `i` of the table only covers the goodbudget txns that `ch_ts[i]` could
+    # be paired with, so its size is about the number of candidate pairs.
+    # a score is `amount of pairs * pair_value - total secs apart`, so one more
+    # pair always beats any amount of secs
+    pair_value = (len(ch_ts) + 1) * _MAX_SECS_APART + 1
+    rows: List[Tuple[int, int, List[int]]] = []
+    prev_lo, prev_hi, prev_scores = 0, 0, [0]
+
+    for ts in ch_ts:
+        lo = bisect_left(gb_ts, ts - _MAX_SECS_APART)
+        hi = bisect_right(gb_ts, ts + _MAX_SECS_APART)
+
+        # goodbudget txns past the previous row were too late for every
+        # previous chase txn, so they don't change its best score
+        if hi > prev_hi:
+            prev_scores = prev_scores + [prev_scores[-1]] * (hi - prev_hi)
+        prev_scores = prev_scores[lo - prev_lo:]
+
+        best = prev_scores[0]
+        scores = [best]
+        choices = [_SKIP_CH]
+        for k in range(1, hi - lo + 1):
+            left, best, choice = best, prev_scores[k], _SKIP_CH
+            if left > best:
+                best, choice = left, _SKIP_GB
+            paired = prev_scores[k - 1] + pair_value - abs(gb_ts[lo + k - 1] - ts)
+            if paired > best:
+                best, choice = paired, _PAIR
+            scores.append(best)
+            choices.append(choice)
+
+        rows.append((lo, hi, choices))
+        prev_lo, prev_hi, prev_scores = lo, hi, scores
+
+    # walk the choices back from the end of both lists
+    pairs: List[Tuple[int, int]] = []
+    i, j = len(ch_ts), len(gb_ts)
+    while i > 0:
+        lo, hi, choices = rows[i - 1]
+        j = min(j, hi)
+        choice = choices[j - lo]
+        if choice == _PAIR:
+            pairs.append((i - 1, j - 1))
+            i -= 1
+            j -= 1
+        elif choice == _SKIP_GB:
+            j -= 1
+        else:
+            i -= 1
+
+    return pairs
+
+
+def _match_txns_optimal(ch_txns: Sequence[ChaseTxn], gb_txns: Sequence[GoodbudgetTxn]) -> List[MergedTxn]:
+    ch_by_amt: Dict[int, List[ChaseTxn]] = {}
+    for ch_txn in sorted(ch_txns, key=lambda x: (x.ts, -x.id_)):
+        ch_by_amt.setdefault(ch_txn.amt_cents, []).append(ch_txn)
+    gb_by_amt: Dict[int, List[GoodbudgetTxn]] = {}
+    for gb_txn in sorted(gb_txns, key=lambda x: (x.ts, -x.id_)):
+        gb_by_amt.setdefault(gb_txn.amt_cents, []).append(gb_txn)
+
+    merged_txns: List[MergedTxn] = []
+    for amt, ch_bucket in ch_by_amt.items():
+        gb_bucket = gb_by_amt.pop(amt, [])
+        pairs = _min_cost_pairs([x.ts for x in ch_bucket], [x.ts for x in gb_bucket])
+
+        ch_paired = [False] * len(ch_bucket)
+        gb_paired = [False] * len(gb_bucket)
+        for ch_i, gb_i in pairs:
+            ch_paired[ch_i] = gb_paired[gb_i] = True
+            merged_txns.append(MergedTxn_BothTxns(ch_bucket[ch_i], gb_bucket[gb_i]))
+
+        merged_txns.extend(MergedTxn_ChaseTxn(x)
+                           for x, paired in zip(ch_bucket, ch_paired) if not paired)
+        merged_txns.extend(MergedTxn_GoodbudgetTxn(x)
+                           for x, paired in zip(gb_bucket, gb_paired) if not paired)
+
+    # amounts that only goodbudget has
+    for gb_bucket in gb_by_amt.values():
+        merged_txns.extend(MergedTxn_GoodbudgetTxn(x) for x in gb_bucket)
+
+    return merged_txns
+
+
+def match_txns(ch_txns: Sequence[ChaseTxn], gb_txns: Sequence[GoodbudgetTxn],
+               match_mode: str = MATCH_GREEDY) -> List[MergedTxn]:
+    if match_mode == MATCH_OPTIMAL:
+        return _match_txns_optimal(ch_txns, gb_txns)
+    return _match_txns(ch_txns, gb_txns)
+
+
+def get_txns_grouped(ch_txns: Sequence[ChaseTxn], gb_txns: Sequence[GoodbudgetTxn],
+                     ch_start_bal: int, gb_start_bal: int,
+                     match_mode: str = MATCH_GREEDY) -> TxnsGrouped:
+    with stage('match_txns') as s:
+        merged_txns = match_txns(ch_txns, gb_txns, match_mode)
+        s.add_rows(len(ch_txns) + len(gb_txns))
+    return group_merged_txns(merged_txns, ch_start_bal, gb_start_bal)
+
+
+def group_merged_txns(merged_txns: List[MergedTxn], ch_start_bal: int, gb_start_bal: int) -> TxnsGrouped:
     # sort by earliest txn
-    merged_txns_sorted = _sort_merged_txns(merged_txns)
+    with stage('sort_merged_txns') as s:
+        merged_txns_sorted = _sort_merged_txns(merged_txns)
+        s.add_rows(len(merged_txns))
 
     # set MergedTxn.bal_diff
-    bal_diff_freq: Dict[int, int] = {}
-    ch_bal, gb_bal = ch_start_bal, gb_start_bal
-    for merged_txn in merged_txns_sorted:
-        if isinstance(merged_txn, (MergedTxn_ChaseTxn, MergedTxn_BothTxns)):
-            ch_bal += merged_txn.ch_txn.amt_cents
-            merged_txn.ch_txn.bal = ch_bal
-        if isinstance(merged_txn, (MergedTxn_GoodbudgetTxn, MergedTxn_BothTxns)):
-            gb_bal += merged_txn.gb_txn.amt_cents
-            merged_txn.gb_txn.bal = gb_bal
-
-        # store in dict:
-        # NEGATIVE: CHASE IS LOWER THAN GOODBUDGET
-        # POSITIVE: CHASE IS HIGHER THAN GOODBUDGET
-        diff = ch_bal - gb_bal
-        if diff in bal_diff_freq:
-            bal_diff_freq[diff] += 1
-        else:
-            bal_diff_freq[diff] = 1
+    with stage('balances') as s:
+        bal_diff_freq: Dict[int, int] = {}
+        ch_bal, gb_bal = ch_start_bal, gb_start_bal
+        for merged_txn in merged_txns_sorted:
+            if isinstance(merged_txn, (MergedTxn_ChaseTxn, MergedTxn_BothTxns)):
+                ch_bal += merged_txn.ch_txn.amt_cents
+                merged_txn.ch_txn.bal = ch_bal
+            if isinstance(merged_txn, (MergedTxn_GoodbudgetTxn, MergedTxn_BothTxns)):
+                gb_bal += merged_txn.gb_txn.amt_cents
+                merged_txn.gb_txn.bal = gb_bal
+
+            # store in dict:
+            # NEGATIVE: CHASE IS LOWER THAN GOODBUDGET
+            # POSITIVE: CHASE IS HIGHER THAN GOODBUDGET
+            diff = ch_bal - gb_bal
+            if diff in bal_diff_freq:
+                bal_diff_freq[diff] += 1
+            else:
+                bal_diff_freq[diff] = 1
 
-        merged_txn.bal_diff = diff
+            merged_txn.bal_diff = diff
+        s.add_rows(len(merged_txns_sorted))
 
     # sort by balance differences that occur the most and store in its own class
     bal_diff_freq_sorted = [BalanceDifferenceFrequency(x[0], x[1])
@@ -120,23 +288,25 @@ def get_txns_grouped(ch_txns: List[ChaseTxn], gb_txns: List[GoodbudgetTxn],
                                             reverse=True)]
 
     # split merged_txns into 3 different lists
-    only_ch_txns: List[ChaseTxn] = []
-    only_gb_txns: List[GoodbudgetTxn] = []
-    both_txns: List[MergedTxn_BothTxns] = []
-    for txn in merged_txns_sorted:
-        if isinstance(txn, MergedTxn_ChaseTxn):
-            only_ch_txns.append(txn.ch_txn)
-        elif isinstance(txn, MergedTxn_GoodbudgetTxn):
-            only_gb_txns.append(txn.gb_txn)
-        else:
-            both_txns.append(txn)
-
-    # restore sorting of only_ch_txns and only_gb_txns by using
-    # the id they were given when they were read
-    # reverse=True because the smaller the ID, the newer the txn and
-    # we want the older txns first
-    only_ch_txns_ssorted = sorted(only_ch_txns, key=lambda x: -x.id_)
-    only_gb_txns_ssorted = sorted(only_gb_txns, key=lambda x: -x.id_)
+    with stage('split') as s:
+        only_ch_txns: List[ChaseTxn] = []
+        only_gb_txns: List[GoodbudgetTxn] = []
+        both_txns: List[MergedTxn_BothTxns] = []
+        for txn in merged_txns_sorted:
+            if isinstance(txn, MergedTxn_ChaseTxn):
+                only_ch_txns.append(txn.ch_txn)
+            elif isinstance(txn, MergedTxn_GoodbudgetTxn):
+                only_gb_txns.append(txn.gb_txn)
+            else:
+                both_txns.append(txn)
+
+        # restore sorting of only_ch_txns and only_gb_txns by using
+        # the id they were given when they were read
+        # reverse=True because the smaller the ID, the newer the txn and
+        # we want the older txns first
+        only_ch_txns_ssorted = sorted(only_ch_txns, key=lambda x: -x.id_)
+        only_gb_txns_ssorted = sorted(only_gb_txns, key=lambda x: -x.id_)
+        s.add_rows(len(merged_txns_sorted))
 
     return TxnsGrouped(
         only_ch_txns=only_ch_txns_ssorted,
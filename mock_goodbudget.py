@@ -0,0 +1,111 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from submit import _LOGIN_PATH, _SAVE_TXN_PATH
+
+# a local stand-in for goodbudget, to try adding txns with the http backend
+# without touching a real account. it accepts any login, and records every
+# request. txns sent again with the same idempotency key are only saved once.
+# run it with `python3 mock_goodbudget.py [port]` and set GB_URL in the .env
+# file to the url it prints
+
+_SESSION = 'mock-session'
+
+
+class RecordedRequest:
+    def __init__(self, method: str, path: str, headers: dict, body: bytes):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: 'MockGoodbudget'
+
+    def log_message(self, *_) -> None:
+        return None
+
+    def _respond(self, status: int, headers: List[Tuple[str, str]] = []) -> None:
+        self.send_response(status)
+        for header in headers:
+            self.send_header(*header)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.record(RecordedRequest('POST', self.path, dict(self.headers), body))
+        if self.server.delay_secs:
+            time.sleep(self.server.delay_secs)
+
+        if self.path == _LOGIN_PATH:
+            self._respond(302, [('Location', '/home'),
+                                ('Set-Cookie', f'PHPSESSID={_SESSION}; Path=/; HttpOnly')])
+        elif self.path == _SAVE_TXN_PATH:
+            if f'PHPSESSID={_SESSION}' not in (self.headers.get('Cookie') or ''):
+                self._respond(401)
+            elif self.server.fails():
+                self._respond(503)
+            else:
+                self.server.save(self.headers.get('Idempotency-Key'), json.loads(body))
+                self._respond(200)
+        else:
+            self._respond(404)
+
+
+class MockGoodbudget(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, delay_secs: float = 0, fail_rate: float = 0, seed: int = 0):
+        super().__init__(('127.0.0.1', port), _Handler)
+        # how long every request takes, and the share of txns that fail with
+        # 503 Service Unavailable
+        self.delay_secs = delay_secs
+        self.fail_rate = fail_rate
+        self.rand = random.Random(seed)
+        self.requests: List[RecordedRequest] = []
+        # saved txns, by idempotency key, or by their order if they have none
+        self.saved: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.amt_connections = 0
+
+    def record(self, request: RecordedRequest) -> None:
+        with self.lock:
+            self.requests.append(request)
+
+    def fails(self) -> bool:
+        with self.lock:
+            return self.rand.random() < self.fail_rate
+
+    def save(self, idempotency_key: Optional[str], txn: dict) -> None:
+        with self.lock:
+            self.saved.setdefault(idempotency_key or str(len(self.saved)), txn)
+
+    def get_request(self):
+        self.amt_connections += 1
+        return super().get_request()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self) -> 'MockGoodbudget':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == "__main__":
+    server = MockGoodbudget(int(sys.argv[1]) if len(sys.argv) > 1 else 8000)
+    print(f'Serving on {server.url}. Press Ctrl+C to stop.')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        for request in server.requests:
+            print(request.method, request.path, request.body.decode())
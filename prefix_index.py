@@ -0,0 +1,39 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class SortedPrefixIndex:
+    # distinct strings, sorted without case, to find the ones that start with
+    # a prefix, ignoring case
+    def __init__(self, strs: Iterable[str] = ()):
+        self.keys: List[Tuple[str, str]] = sorted({(x.lower(), x) for x in strs})
+
+    def insert(self, s: str) -> None:
+        key = (s.lower(), s)
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            self.keys.insert(i, key)
+
+    def starting_with(self, prefix: str) -> List[str]:
+        prefix = prefix.lower()
+        i = bisect_left(self.keys, (prefix, ''))
+        options: List[str] = []
+        while i < len(self.keys) and self.keys[i][0].startswith(prefix):
+            options.append(self.keys[i][1])
+            i += 1
+        return options
+
+
+def completer(index: SortedPrefixIndex) -> Callable[[str, int], Optional[str]]:
+    # a readline completer. readline calls it with `state` 0, 1, 2... for the
+    # same `text` until it returns None, so options are only looked up once
+    last: Dict[str, List[str]] = {}
+
+    def complete(text: str, state: int) -> Optional[str]:
+        if state == 0 or text not in last:
+            last.clear()
+            last[text] = index.starting_with(text)
+        options = last[text]
+        return options[state] if state < len(options) else None
+
+    return complete
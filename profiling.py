@@ -0,0 +1,160 @@
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Union
+
+# times the stages of a run, like reading each file, matching and writing the
+# reports, when it's run with `--profile`. every stage records its wall time,
+# the cpu time of the thread that ran it, the rows it processed and the peak
+# memory allocated while it ran, over the memory allocated when it started.
+# stages started inside another stage, in the same thread, are its sub-stages,
+# and stages with the same name and parent are added up. when profiling is off,
+# `stage` returns a stage that does nothing, so stages can be left in the code
+
+
+class StageStats:
+    def __init__(self, name: str, depth: int):
+        # `name` is prefixed with the names of its parents, like "match/sort"
+        self.name = name
+        self.depth = depth
+        self.calls = 0
+        self.wall_secs = 0.0
+        self.cpu_secs = 0.0
+        self.amt_rows = 0
+        self.peak_bytes = 0
+
+
+class _NoStage:
+    def __enter__(self) -> '_NoStage':
+        return self
+
+    def __exit__(self, *_) -> None:
+        pass
+
+    def add_rows(self, amt_rows: int) -> None:
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+class Stage:
+    def __init__(self, profiler: 'Profiler', name: str):
+        self.profiler = profiler
+        self.name = name
+        self.amt_rows = 0
+        self.peak_bytes = 0
+
+    def add_rows(self, amt_rows: int) -> None:
+        self.amt_rows += amt_rows
+
+    def __enter__(self) -> 'Stage':
+        self.profiler._enter(self)
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, *_) -> None:
+        wall_secs = time.perf_counter() - self.wall_start
+        cpu_secs = time.thread_time() - self.cpu_start
+        self.profiler._exit(self, wall_secs, cpu_secs)
+
+
+class Profiler:
+    # `use_cprofile` also profiles every function called by the main thread.
+    # tracing memory makes everything else slower, so it can be left out
+    def __init__(self, use_cprofile: bool = False, trace_memory: bool = True):
+        self.stats: Dict[str, StageStats] = {}
+        self.trace_memory = trace_memory
+        self.lock = threading.Lock()
+        # stages that are running, in every thread, and the ones of each thread
+        self.open_stages: List[Stage] = []
+        self.local = threading.local()
+        self.cprofile = None
+        if use_cprofile:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+        self.wall_secs = 0.0
+
+    def start(self) -> None:
+        self.wall_start = time.perf_counter()
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.cprofile is not None:
+            self.cprofile.enable()
+
+    def stop(self) -> None:
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        if self.trace_memory:
+            tracemalloc.stop()
+        self.wall_secs = time.perf_counter() - self.wall_start
+
+    def _fold_peak(self) -> None:
+        # every running stage was running when the peak since the last fold
+        # happened. the peak is reset, so that the next one is only of the
+        # stages that are running from now on
+        if not self.trace_memory:
+            return
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        for stage in self.open_stages:
+            stage.peak_bytes = max(stage.peak_bytes, peak_bytes)
+        tracemalloc.reset_peak()
+
+    def _enter(self, stage: Stage) -> None:
+        parents: List[Stage] = self.local.__dict__.setdefault('parents', [])
+        stage.path = f'{parents[-1].path}/{stage.name}' if parents else stage.name
+        stage.depth = len(parents)
+        parents.append(stage)
+        with self.lock:
+            self._fold_peak()
+            stage.start_bytes = tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+            self.open_stages.append(stage)
+
+    def _exit(self, stage: Stage, wall_secs: float, cpu_secs: float) -> None:
+        self.local.parents.pop()
+        with self.lock:
+            self._fold_peak()
+            self.open_stages.remove(stage)
+            stats = self.stats.get(stage.path)
+            if stats is None:
+                stats = self.stats[stage.path] = StageStats(stage.path, stage.depth)
+            stats.calls += 1
+            stats.wall_secs += wall_secs
+            stats.cpu_secs += cpu_secs
+            stats.amt_rows += stage.amt_rows
+            stats.peak_bytes = max(stats.peak_bytes, stage.peak_bytes - stage.start_bytes)
+
+    def stage_stats(self) -> List[StageStats]:
+        # in the order in which they first ended, with sub-stages after their
+        # parents
+        stats = list(self.stats.values())
+        order = {x.name: i for i, x in enumerate(stats)}
+        return sorted(stats, key=lambda x: [order['/'.join(x.name.split('/')[:i + 1])]
+                                            for i in range(x.depth + 1)])
+
+
+_profiler: Optional[Profiler] = None
+
+
+def start_profiling(use_cprofile: bool = False, trace_memory: bool = True) -> None:
+    global _profiler
+    _profiler = Profiler(use_cprofile, trace_memory)
+    _profiler.start()
+
+
+def stop_profiling() -> Optional[Profiler]:
+    # the profiler, or None if profiling wasn't started
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+def stage(name: str) -> Union[Stage, _NoStage]:
+    # `with stage('name') as s: ...`, and `s.add_rows(n)` for the rows it
+    # processed
+    if _profiler is None:
+        return _NO_STAGE
+    return Stage(_profiler, name)
@@ -0,0 +1,100 @@
+import csv
+import re
+from typing import List, Optional, Pattern
+
+from datatypes import ChaseTxn
+
+# rules that decide the goodbudget title, envelope and notes of chase txns, so
+# that they can be added without asking about them. they come from a csv file
+# with a header and one line per rule. `match` is `prefix`, for chase titles
+# that start with `pattern`, or `regex`, for chase titles that `pattern`
+# matches from their start. both ignore case. the first rule that matches a
+# title is used
+RULE_FIELD_NAMES = ['match', 'pattern', 'gb_title', 'gb_envelope', 'notes']
+RULE_PREFIX = 'prefix'
+RULE_REGEX = 'regex'
+RULE_MATCHES = [RULE_PREFIX, RULE_REGEX]
+
+_GROUP_NAME = '_rule'
+
+
+class Rule:
+    def __init__(self, match: str, pattern: str, gb_title: str, gb_envelope: str, notes: str,
+                 line_num: int):
+        self.match = match
+        self.pattern = pattern
+        self.gb_title = gb_title
+        self.gb_envelope = gb_envelope
+        self.notes = notes
+        # line of the rule in its file
+        self.line_num = line_num
+
+    def regex(self) -> str:
+        return re.escape(self.pattern) if self.match == RULE_PREFIX else f'(?:{self.pattern})'
+
+
+def read_rules(rules_file: str) -> List[Rule]:
+    rules: List[Rule] = []
+    with open(rules_file, newline='') as in_file:
+        reader = csv.DictReader(in_file)
+        missing = set(RULE_FIELD_NAMES) - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f'{rules_file} is missing columns: {", ".join(sorted(missing))}')
+
+        for row in reader:
+            where = f'{rules_file}, line {reader.line_num}'
+            if row['match'] not in RULE_MATCHES:
+                raise ValueError(f'{where}: match must be one of: {", ".join(RULE_MATCHES)}')
+            if not row['pattern'] or not row['gb_title']:
+                raise ValueError(f'{where}: pattern and gb_title can\'t be empty')
+            rule = Rule(row['match'], row['pattern'], row['gb_title'], row['gb_envelope'] or '',
+                        row['notes'] or '', reader.line_num)
+            try:
+                re.compile(rule.regex())
+            except re.error as e:
+                raise ValueError(f'{where}: invalid regex: {e}')
+            rules.append(rule)
+    return rules
+
+
+class RuleMatcher:
+    # every rule is an alternative of one regex, in the order of the rules, so
+    # a title is only matched once instead of once per rule. the alternative
+    # that matched is known from its group name. debits can only be added with
+    # an envelope, so they're matched with a regex of only the rules that have
+    # one
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        self.regex = self._combine(list(range(len(rules))))
+        self.debit_regex = self._combine([i for i, x in enumerate(rules) if x.gb_envelope])
+
+    def _combine(self, rule_nums: List[int]) -> Optional[Pattern[str]]:
+        if not rule_nums:
+            return None
+        alternatives = [f'(?P<{_GROUP_NAME}{i}>{self.rules[i].regex()})' for i in rule_nums]
+        try:
+            return re.compile('|'.join(alternatives), re.IGNORECASE)
+        except re.error as e:
+            # patterns that are valid by themselves, like ones with flags or
+            # group names, may not be valid next to each other
+            msg = f'patterns can\'t be combined into one regex: {e}'
+            if e.pos is not None:
+                # the alternative the error is in
+                end = 0
+                for i, alternative in zip(rule_nums, alternatives):
+                    end += len(alternative) + 1
+                    if e.pos < end:
+                        msg = f'line {self.rules[i].line_num}: pattern can\'t be combined with ' \
+                              f'the other rules: {e.msg}'
+                        break
+            raise ValueError(msg)
+
+    def match(self, ch_txn: ChaseTxn) -> Optional[Rule]:
+        regex = self.debit_regex if ch_txn.is_debit else self.regex
+        if regex is None:
+            return None
+        # chase titles keep the quotes around them
+        match = regex.match(ch_txn.title.strip('"'))
+        if match is None:
+            return None
+        return self.rules[int(match.lastgroup[len(_GROUP_NAME):])]
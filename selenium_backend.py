@@ -0,0 +1,113 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator, Union
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver import Chrome
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.webdriver.support.select import Select
+
+from datatypes import GoodbudgetTxn
+from submit import SubmitBackend, SubmitError, envelope_id, flip_sign
+
+_DASHBOARD_URL = 'https://goodbudget.com/home'
+
+
+class Driver(SubmitBackend):
+    # the selenium backend
+    def __init__(self):
+        self.chrome = Chrome()
+        self.chrome.get('https://goodbudget.com/login')
+        self.chrome.implicitly_wait(10)
+
+    def login(self, gb_username: str, gb_password: str):
+        self.chrome.find_element_by_id(
+            'username').send_keys(gb_username)
+        self.chrome.find_element_by_id(
+            'password').send_keys(gb_password)
+
+        # login submit button
+        self.chrome.find_element_by_xpath(
+            '//*[@id="content"]/div/div/div/section[2]/div/div/div/div/div/section/div/div/div[1]/div/div/section/div/div/div/div/div/div[1]/div/form/div/div[4]/button').click()
+
+    def _click_add_txn(self): self.chrome.find_element_by_xpath(
+        '/html/body/div[1]/div/div/div/div[1]/a[2]').click()
+
+    def _click_save_txn(self): self.chrome.find_element_by_id(
+        'addTransactionSave').click()
+
+    @contextmanager
+    def _filling_in(self) -> Iterator[None]:
+        # filling in a txn can fail because of something that doesn't happen
+        # again, like a page that loaded slowly, so it can be retried from the
+        # dashboard. it's only used until the txn is saved, so that a retry
+        # can't add it twice
+        try:
+            yield
+        except WebDriverException as e:
+            try:
+                self.chrome.get(_DASHBOARD_URL)
+            except WebDriverException:
+                pass
+            raise SubmitError(f'couldn\'t fill in the txn: {e.msg}', retryable=True)
+
+    def add_expense(self, envelopes_dict: Dict[str, Union[str, None]],
+                    gb_txn: GoodbudgetTxn, idempotency_key: str = ''):
+        with self._filling_in():
+            self._click_add_txn()
+
+            date_field = self.chrome.find_element_by_id('expense-date')
+            date_field.clear()
+            date_field.send_keys(gb_txn.date)
+
+            payee_el: WebElement = self.chrome.find_element_by_id(
+                'expense-receiver')
+            payee_el.send_keys(gb_txn.title)
+            payee_el.send_keys(Keys.RETURN)
+
+            amt = flip_sign(gb_txn.amt_dollars)
+            amt_el = self.chrome.find_element_by_id('expense-amount')
+            amt_el.click()
+            amt_el.send_keys(amt)
+
+            # select envelope
+            Select(self.chrome.find_element_by_xpath(
+                '//*[@id="expenseCredit"]/form/fieldset/div[4]/div/select')
+            ).select_by_value(envelope_id(envelopes_dict, gb_txn.envelope))
+
+            if gb_txn.notes:
+                self.chrome \
+                    .find_element_by_id('expense-notes') \
+                    .send_keys(gb_txn.notes)
+
+        self._click_save_txn()
+
+    def add_income(self, gb_txn: GoodbudgetTxn, idempotency_key: str = ''):
+        with self._filling_in():
+            self._click_add_txn()
+
+            self.chrome.find_element_by_xpath(
+                '//*[@id="myTab"]/li[3]/a').click()  # click income tab
+
+            date_field = self.chrome.find_element_by_id('income-date')
+            date_field.clear()
+            date_field.send_keys(gb_txn.date)
+
+            payer_el: WebElement = self.chrome.find_element_by_id(
+                'income-payer')
+            payer_el.send_keys(gb_txn.title)
+            payer_el.send_keys(Keys.RETURN)
+
+            self.chrome.find_element_by_xpath(
+                '//*[@id="income"]/form/fieldset/div[3]/div/input') \
+                .send_keys(gb_txn.amt_dollars)
+
+            if gb_txn.notes:
+                self.chrome \
+                    .find_element_by_id('income-notes') \
+                    .send_keys(gb_txn.notes)
+
+        self._click_save_txn()
+
+    def close(self):
+        self.chrome.quit()
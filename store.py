@@ -0,0 +1,380 @@
+from bisect import bisect_left
+import hashlib
+import os
+import sqlite3
+from typing import Callable, Generic, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from datatypes import (
+    MergedTxn,
+    MergedTxn_BothTxns,
+    MergedTxn_ChaseTxn,
+    MergedTxn_GoodbudgetTxn,
+    TxnsGrouped,
+)
+import file_in
+from match import MATCH_GREEDY, MAX_DAYS_APART, group_merged_txns, match_txns
+from txn_table import ChaseTxnTable, GoodbudgetTxnTable
+
+# keeps what was parsed and matched in previous runs, so that a run only has to
+# parse the lines that were added to the top of each file since then, and only
+# has to re-match the txns that are close in date to those lines.
+#
+# every file is stored as a "region": everything after its first line and after
+# any pending txn, which are the lines that can still change. the next export
+# of the file has to end with exactly the same bytes, which is checked with the
+# hash of the region. if it doesn't, the file is parsed and matched from scratch.
+# stored txns are keyed by their position from the bottom of the file, which
+# stays the same when new lines are added to the top
+
+STORE_FILE = './in/reconcile.sqlite3'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    start_bal INTEGER NOT NULL,
+    region_size INTEGER NOT NULL,
+    region_hash TEXT NOT NULL,
+    region_lines INTEGER NOT NULL,
+    region_bal INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ch_txns (
+    pos INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    is_debit INTEGER NOT NULL,
+    is_pending INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    title TEXT NOT NULL,
+    amt_dollars TEXT NOT NULL,
+    amt_cents INTEGER NOT NULL,
+    bal INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS gb_txns (
+    pos INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    title TEXT NOT NULL,
+    envelope TEXT NOT NULL,
+    amt_dollars TEXT NOT NULL,
+    notes TEXT NOT NULL,
+    amt_cents INTEGER NOT NULL,
+    bal INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failed_lines (
+    file TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    line TEXT NOT NULL,
+    PRIMARY KEY (file, pos)
+);
+CREATE TABLE IF NOT EXISTS matches (
+    ch_pos INTEGER PRIMARY KEY,
+    gb_pos INTEGER NOT NULL,
+    ch_ts INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS matches_ch_ts ON matches (ch_ts);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+_CH = 'ch'
+_GB = 'gb'
+_MAX_SECS_APART = MAX_DAYS_APART * 60 * 60 * 24
+_BLOCK_SIZE = 1 << 16
+
+
+def _hash_from(path: str, offset: int) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as in_file:
+        in_file.seek(offset)
+        while (block := in_file.read(_BLOCK_SIZE)):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _line_offset(path: str, amt_lines: int) -> int:
+    # byte offset at which line number `amt_lines` starts. lines end like in
+    # `file_in.reversed_lines`, so the line ends of each block are counted,
+    # and it's only split into lines once the line is in it
+    offset = 0
+    amt_left = amt_lines
+    carry = b''
+    with open(path, 'rb') as in_file:
+        while (block := in_file.read(_BLOCK_SIZE)):
+            # a '\r' at the end of a block might be the start of a '\r\n'
+            block = carry + block
+            carry = b'\r' if block.endswith(b'\r') else b''
+            block = block[:len(block) - len(carry)]
+
+            amt_in_block = block.count(b'\n') + block.count(b'\r') - block.count(b'\r\n')
+            if amt_in_block >= amt_left:
+                return offset + sum(len(line) for line in block.splitlines(keepends=True)[:amt_left])
+            amt_left -= amt_in_block
+            offset += len(block)
+    return offset + len(carry)
+
+
+class _FileState:
+    def __init__(self, start_bal: int, region_size: int, region_hash: str,
+                 region_lines: int, region_bal: int):
+        self.start_bal = start_bal
+        self.region_size = region_size
+        self.region_hash = region_hash
+        self.region_lines = region_lines
+        self.region_bal = region_bal
+
+
+class _NumberedLines:
+    # (line number, line) pairs, remembering the number of the last one handed
+    # out, so that the line number of a line that failed to parse is known
+    def __init__(self, numbered_lines: Iterable[Tuple[int, str]]):
+        self.numbered_lines = numbered_lines
+        self.i = -1
+        self.amt_lines = 0
+
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        for self.i, line in self.numbered_lines:
+            self.amt_lines = max(self.amt_lines, self.i + 1)
+            yield self.i, line
+
+
+TableT = TypeVar('TableT', ChaseTxnTable, GoodbudgetTxnTable)
+
+
+class StoredReadResults(Generic[TableT]):
+    def __init__(self, txns: TableT, amt_lines: int, head_ids: List[int],
+                 region_start: int, rebuilt: bool):
+        self.txns = txns
+        self.amt_lines = amt_lines
+        # ids of the txns that were parsed in this run
+        self.head_ids = head_ids
+        # line number where the part of the file that is stored starts
+        self.region_start = region_start
+        # whether the stored txns couldn't be used
+        self.rebuilt = rebuilt
+
+    def pos(self, id_: int) -> int:
+        return self.amt_lines - 1 - id_
+
+    def index(self, pos: int) -> int:
+        # index in `txns` of the txn at position `pos` from the bottom
+        return bisect_left(self.txns.id_, self.amt_lines - 1 - pos)
+
+
+class ReconcileStore:
+    def __init__(self, path: str = STORE_FILE):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.db.commit()
+        self.db.close()
+
+    ### Reading #########################################################
+    def _file_state(self, name: str) -> Optional[_FileState]:
+        row = self.db.execute(
+            'SELECT start_bal, region_size, region_hash, region_lines, region_bal'
+            ' FROM files WHERE name = ?', (name,)).fetchone()
+        return _FileState(*row) if row else None
+
+    def _head(self, path: str, state: Optional[_FileState], start_bal: int) -> Optional[bytes]:
+        # the bytes that were added before the stored region, or None if the
+        # file doesn't end with the stored region anymore
+        if state is None or state.start_bal != start_bal:
+            return None
+
+        head_size = os.path.getsize(path) - state.region_size
+        if head_size < 0 or _hash_from(path, head_size) != state.region_hash:
+            return None
+
+        with open(path, 'rb') as in_file:
+            head = in_file.read(head_size)
+        if head and not head.endswith((b'\n', b'\r')):
+            return None
+        return head
+
+    def _read(self, name: str, path: str, table: TableT, start_bal: int,
+              on_fail: Callable[[str], None],
+              parse_lines: Callable, select_stored: str,
+              is_pending: Callable) -> StoredReadResults[TableT]:
+        state = self._file_state(name)
+        head = self._head(path, state, start_bal)
+        rebuilt = state is None or head is None
+        if rebuilt:
+            self.db.execute(f'DELETE FROM {name}_txns')
+            self.db.execute('DELETE FROM failed_lines WHERE file = ?', (name,))
+            numbered_lines = _NumberedLines(file_in.reversed_lines(path))
+            region_bal = start_bal
+        else:
+            head_lines = head.splitlines(keepends=True)
+            numbered_lines = _NumberedLines(reversed(
+                [(i, file_in.decode_line(line)) for i, line in enumerate(head_lines)]))
+            region_bal = state.region_bal
+            for (line,) in self.db.execute(
+                    'SELECT line FROM failed_lines WHERE file = ? ORDER BY pos', (name,)):
+                on_fail(line)
+
+        # parse the new lines, from the oldest to the newest
+        head_failed: List[Tuple[int, str]] = []
+
+        def on_head_fail(line: str) -> None:
+            head_failed.append((numbered_lines.i, line))
+            on_fail(line)
+
+        head_txns = []
+        for batch in parse_lines(numbered_lines, region_bal, on_head_fail):
+            head_txns.extend(batch)
+        if rebuilt:
+            amt_lines = numbered_lines.amt_lines
+        else:
+            amt_lines = len(head_lines) + state.region_lines
+
+        # newest txns first: the new ones, then the stored ones
+        for txn in reversed(head_txns):
+            table.append(txn)
+        if not rebuilt:
+            stored = self.db.execute(select_stored).fetchall()
+            if stored:
+                pos, *columns = zip(*stored)
+                table.extend_columns([amt_lines - 1 - x for x in pos], *columns)
+
+        # from now on, everything after the first line and the last pending
+        # txn is stored
+        region_start = max([1] + [txn.id_ + 1 for txn in head_txns if is_pending(txn)])
+        region_start = min(region_start, amt_lines)
+        return self._save_region(name, path, table, start_bal, head_txns, head_failed,
+                                 amt_lines, region_start, region_bal, rebuilt)
+
+    def _save_region(self, name: str, path: str, table: TableT, start_bal: int,
+                     head_txns: list, head_failed: List[Tuple[int, str]],
+                     amt_lines: int, region_start: int, region_bal: int,
+                     rebuilt: bool) -> StoredReadResults[TableT]:
+        read_results = StoredReadResults(table, amt_lines, [x.id_ for x in head_txns],
+                                         region_start, rebuilt)
+
+        stored_txns = [x for x in head_txns if x.id_ >= region_start]
+        if stored_txns:
+            # `head_txns` go from the oldest to the newest
+            region_bal = stored_txns[-1].bal
+        if name == _CH:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO ch_txns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(read_results.pos(x.id_), x.ts, x.is_debit, x.is_pending, x.date,
+                  x.title, x.amt_dollars, x.amt_cents, x.bal) for x in stored_txns])
+        else:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO gb_txns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(read_results.pos(x.id_), x.ts, x.date, x.title, x.envelope,
+                  x.amt_dollars, x.notes, x.amt_cents, x.bal) for x in stored_txns])
+        self.db.executemany(
+            'INSERT OR REPLACE INTO failed_lines VALUES (?, ?, ?)',
+            [(name, read_results.pos(i), line) for i, line in head_failed if i >= region_start])
+
+        region_offset = _line_offset(path, region_start)
+        self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)', (
+            name, start_bal, os.path.getsize(path) - region_offset,
+            _hash_from(path, region_offset), amt_lines - region_start, region_bal))
+        return read_results
+
+    # `read_ch_txns` and `read_gb_txns` are like the ones in `file_in`, but only
+    # parse the lines that aren't stored yet
+    def read_ch_txns(self, ch_start_bal: int,
+                     on_fail: Callable[[str], None]) -> StoredReadResults[ChaseTxnTable]:
+        return self._read(_CH, file_in.IN_CH_FILE, ChaseTxnTable(), ch_start_bal, on_fail,
+                          file_in.parse_ch_lines, 'SELECT * FROM ch_txns ORDER BY pos DESC',
+                          lambda x: x.is_pending)
+
+    def read_gb_txns(self, gb_start_bal: int,
+                     on_fail: Callable[[str], None]) -> StoredReadResults[GoodbudgetTxnTable]:
+        return self._read(_GB, file_in.IN_GB_FILE, GoodbudgetTxnTable(), gb_start_bal, on_fail,
+                          file_in.parse_gb_lines, 'SELECT * FROM gb_txns ORDER BY pos DESC',
+                          lambda _: False)
+
+    ### Matching ########################################################
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def get_txns_grouped(self, ch_read: StoredReadResults[ChaseTxnTable],
+                         gb_read: StoredReadResults[GoodbudgetTxnTable],
+                         ch_start_bal: int, gb_start_bal: int, match_mode: str) -> TxnsGrouped:
+        ch_txns, gb_txns = ch_read.txns, gb_read.txns
+
+        # with `MATCH_GREEDY`, a stored match can only change if one of its txns
+        # is close enough in date to a txn that is new, or that was new in the
+        # last run. with `MATCH_OPTIMAL`, a new txn can change the pairs of
+        # every txn with the same amount, so everything is matched again
+        head_ts = [ch_txns.ts[bisect_left(ch_txns.id_, i)] for i in ch_read.head_ids] \
+            + [gb_txns.ts[bisect_left(gb_txns.id_, i)] for i in gb_read.head_ids]
+        prev_head_ts = self._meta('head_ts')
+        if prev_head_ts is not None:
+            head_ts.append(int(prev_head_ts))
+        if ch_read.rebuilt or gb_read.rebuilt or match_mode != MATCH_GREEDY \
+                or self._meta('match_mode') != match_mode:
+            cutoff = None
+        elif head_ts:
+            cutoff = min(head_ts) - _MAX_SECS_APART
+        else:
+            cutoff = max(list(ch_txns.ts) + list(gb_txns.ts), default=0) + 1
+
+        merged_txns: List[MergedTxn] = []
+        # 1 for every txn whose stored match is kept
+        kept_ch = bytearray(len(ch_txns))
+        kept_gb = bytearray(len(gb_txns))
+        if cutoff is not None:
+            for ch_pos, gb_pos in self.db.execute(
+                    'SELECT ch_pos, gb_pos FROM matches WHERE ch_ts < ?', (cutoff,)).fetchall():
+                ch_i, gb_i = ch_read.index(ch_pos), gb_read.index(gb_pos)
+                kept_ch[ch_i] = 1
+                kept_gb[gb_i] = 1
+                merged_txns.append(MergedTxn_BothTxns(ch_txns[ch_i], gb_txns[gb_i]))
+
+        # everything else that is close enough to the new txns is matched
+        # again. older txns keep being unmatched
+        window_ch, window_gb = [], []
+        for i, ts in enumerate(ch_txns.ts):
+            if kept_ch[i]:
+                continue
+            if cutoff is None or ts >= cutoff:
+                window_ch.append(ch_txns[i])
+            else:
+                merged_txns.append(MergedTxn_ChaseTxn(ch_txns[i]))
+        for i, ts in enumerate(gb_txns.ts):
+            if kept_gb[i]:
+                continue
+            if cutoff is None or ts >= cutoff - _MAX_SECS_APART:
+                window_gb.append(gb_txns[i])
+            else:
+                merged_txns.append(MergedTxn_GoodbudgetTxn(gb_txns[i]))
+
+        rematched = match_txns(window_ch, window_gb, match_mode)
+        merged_txns.extend(rematched)
+        self._save_matches(ch_read, gb_read, rematched, cutoff, head_ts, match_mode)
+
+        return group_merged_txns(merged_txns, ch_start_bal, gb_start_bal)
+
+    def _save_matches(self, ch_read: StoredReadResults[ChaseTxnTable],
+                      gb_read: StoredReadResults[GoodbudgetTxnTable],
+                      rematched: List[MergedTxn], cutoff: Optional[int],
+                      head_ts: List[int], match_mode: str) -> None:
+        if cutoff is None:
+            self.db.execute('DELETE FROM matches')
+        else:
+            self.db.execute('DELETE FROM matches WHERE ch_ts >= ?', (cutoff,))
+
+        # only matches between stored txns are kept
+        self.db.executemany('INSERT OR REPLACE INTO matches VALUES (?, ?, ?)', [
+            (ch_read.pos(x.ch_txn.id_), gb_read.pos(x.gb_txn.id_), x.ch_txn.ts)
+            for x in rematched
+            if isinstance(x, MergedTxn_BothTxns)
+            and x.ch_txn.id_ >= ch_read.region_start and x.gb_txn.id_ >= gb_read.region_start])
+
+        new_head_ts = [ch_read.txns.ts[bisect_left(ch_read.txns.id_, i)]
+                       for i in ch_read.head_ids if i < ch_read.region_start] \
+            + [gb_read.txns.ts[bisect_left(gb_read.txns.id_, i)]
+               for i in gb_read.head_ids if i < gb_read.region_start]
+        self.db.execute('DELETE FROM meta WHERE key = ?', ('head_ts',))
+        if new_head_ts:
+            self.db.execute('INSERT INTO meta VALUES (?, ?)', ('head_ts', str(min(new_head_ts))))
+        self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', ('match_mode', match_mode))
+        self.db.commit()
@@ -0,0 +1,179 @@
+from abc import ABC, abstractmethod
+from http.client import HTTPConnection, HTTPException, HTTPResponse, HTTPSConnection
+from http.cookies import SimpleCookie
+import json
+from queue import LifoQueue
+import threading
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlencode, urlsplit
+
+from datatypes import GoodbudgetTxn
+
+# ways of adding txns to goodbudget: by driving the web app in a browser with
+# selenium, or with http requests, like the ones the goodbudget web app makes,
+# which is much faster. the http endpoints have only been tried against
+# mock_goodbudget.py, not the real goodbudget, so http is opt-in
+
+SUBMIT_HTTP = 'http'
+SUBMIT_SELENIUM = 'selenium'
+SUBMIT_BACKENDS = [SUBMIT_HTTP, SUBMIT_SELENIUM]
+
+GB_URL = 'https://goodbudget.com'
+
+_LOGIN_PATH = '/login_check'
+_SAVE_TXN_PATH = '/api/transactions/save'
+_TIMEOUT_SECS = 30
+
+
+class SubmitError(Exception):
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        # whether the same request could work if it's sent again
+        self.retryable = retryable
+
+
+class SubmitBackend(ABC):
+    # `idempotency_key` identifies a txn, so that sending it again after a
+    # failure doesn't add it twice, where the backend allows for it
+
+    # how many threads can add txns at once
+    max_workers = 1
+
+    @abstractmethod
+    def login(self, gb_username: str, gb_password: str) -> None:
+        pass
+
+    @abstractmethod
+    def add_expense(self, envelopes_dict: Dict[str, Union[str, None]],
+                    gb_txn: GoodbudgetTxn, idempotency_key: str = '') -> None:
+        pass
+
+    @abstractmethod
+    def add_income(self, gb_txn: GoodbudgetTxn, idempotency_key: str = '') -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def envelope_id(envelopes_dict: Dict[str, Union[str, None]], envelope: str) -> str:
+    # envelopes are keyed like EATING_OUT in .envelopes.env
+    return envelopes_dict[envelope.replace(' ', '_').upper()] or ''
+
+
+def flip_sign(amt_dollars: str) -> str:
+    # expenses are entered as positive amounts
+    return amt_dollars.replace('-', '') if '-' in amt_dollars else '-' + amt_dollars
+
+
+class _ConnectionPool:
+    # keep-alive connections to one host, reused by every request. a
+    # connection is only used by one request at a time
+    def __init__(self, url: str, size: int):
+        parts = urlsplit(url)
+        self.connection_class = HTTPSConnection if parts.scheme == 'https' else HTTPConnection
+        self.netloc = parts.netloc
+        self.connections: LifoQueue = LifoQueue()
+        for _ in range(size):
+            self.connections.put(None)
+
+    def _connect(self) -> HTTPConnection:
+        return self.connection_class(self.netloc, timeout=_TIMEOUT_SECS)
+
+    def request(self, method: str, path: str, body: Optional[bytes],
+                headers: Dict[str, str]) -> Tuple[HTTPResponse, bytes]:
+        connection = self.connections.get()
+        reused = connection is not None
+        try:
+            if not reused:
+                connection = self._connect()
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+            except (ConnectionError, HTTPException):
+                if not reused:
+                    raise
+                # the server closed the kept-alive connection before reading
+                # the request, so it's sent again on a new one
+                connection.close()
+                connection = self._connect()
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+            # the whole response is read, so that the connection can be reused
+            return response, response.read()
+        except BaseException:
+            if connection is not None:
+                connection.close()
+            connection = None
+            raise
+        finally:
+            self.connections.put(connection)
+
+    def close(self) -> None:
+        while not self.connections.empty():
+            connection = self.connections.get()
+            if connection is not None:
+                connection.close()
+
+
+class HttpBackend(SubmitBackend):
+    # posts txns straight to goodbudget, over `pool_size` kept-alive
+    # connections. the session cookie that login sets is sent with every
+    # request
+    def __init__(self, url: str = GB_URL, pool_size: int = 1):
+        self.pool = _ConnectionPool(url, pool_size)
+        self.max_workers = pool_size
+        self.host = urlsplit(url).netloc
+        self.cookies: Dict[str, str] = {}
+        self.cookies_lock = threading.Lock()
+
+    def _request(self, method: str, path: str, body: Optional[bytes] = None,
+                 content_type: Optional[str] = None,
+                 idempotency_key: str = '') -> Tuple[HTTPResponse, bytes]:
+        headers = {'Host': self.host, 'Connection': 'keep-alive'}
+        if content_type:
+            headers['Content-Type'] = content_type
+        if idempotency_key:
+            headers['Idempotency-Key'] = idempotency_key
+        with self.cookies_lock:
+            if self.cookies:
+                headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+
+        response, response_body = self.pool.request(method, path, body, headers)
+        cookies = SimpleCookie()
+        for header in response.headers.get_all('Set-Cookie') or []:
+            cookies.load(header)
+        with self.cookies_lock:
+            self.cookies.update((k, x.value) for k, x in cookies.items())
+
+        if response.status >= 400:
+            raise SubmitError(f'{method} {path}: {response.status} {response.reason}',
+                              retryable=response.status >= 500 or response.status == 429)
+        return response, response_body
+
+    def login(self, gb_username: str, gb_password: str) -> None:
+        response, _ = self._request(
+            'POST', _LOGIN_PATH,
+            urlencode({'_username': gb_username, '_password': gb_password}).encode(),
+            'application/x-www-form-urlencoded')
+        # a failed login redirects back to the login page
+        if 'login' in (response.getheader('Location') or ''):
+            raise SubmitError('login failed, check GB_USERNAME and GB_PASSWORD')
+
+    def _save_txn(self, txn: Dict[str, str], idempotency_key: str) -> None:
+        self._request('POST', _SAVE_TXN_PATH, json.dumps(txn).encode(), 'application/json',
+                      idempotency_key)
+
+    def add_expense(self, envelopes_dict: Dict[str, Union[str, None]],
+                    gb_txn: GoodbudgetTxn, idempotency_key: str = '') -> None:
+        self._save_txn({'type': 'expense', 'date': gb_txn.date, 'payee': gb_txn.title,
+                        'amount': flip_sign(gb_txn.amt_dollars),
+                        'envelope': envelope_id(envelopes_dict, gb_txn.envelope),
+                        'notes': gb_txn.notes}, idempotency_key)
+
+    def add_income(self, gb_txn: GoodbudgetTxn, idempotency_key: str = '') -> None:
+        self._save_txn({'type': 'income', 'date': gb_txn.date, 'payer': gb_txn.title,
+                        'amount': gb_txn.amt_dollars, 'notes': gb_txn.notes}, idempotency_key)
+
+    def close(self) -> None:
+        self.pool.close()
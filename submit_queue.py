@@ -0,0 +1,138 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from datatypes import ChaseTxn, PlannedTxn
+from profiling import stage
+from submit import SubmitBackend, SubmitError
+
+# adds planned txns to goodbudget in the background, while the next ones are
+# still being decided, a few at a time. a txn that fails is tried again after
+# waiting longer and longer. every txn that was added is written to a journal,
+# keyed by a fingerprint of its chase txn, so that running again after a crash
+# doesn't add it twice
+
+JOURNAL_FILE = './in/submitted.sqlite3'
+MAX_WORKERS = 4
+MAX_ATTEMPTS = 4
+BACKOFF_SECS = 0.5
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS submitted (
+    fingerprint TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    title TEXT NOT NULL,
+    amt_dollars TEXT NOT NULL,
+    gb_title TEXT NOT NULL,
+    gb_envelope TEXT NOT NULL,
+    submitted_at INTEGER NOT NULL
+);
+'''
+
+
+def txn_fingerprints(ch_txns: List[ChaseTxn]) -> List[str]:
+    # the date, title and amount of every txn, and how many txns with the
+    # same ones come before it from the bottom of the file, which stays the
+    # same when new txns are added to the top
+    fingerprints: List[str] = [''] * len(ch_txns)
+    amt_seen: Dict[str, int] = {}
+    for i in reversed(range(len(ch_txns))):
+        txn = ch_txns[i]
+        key = f'{txn.date}\x1f{txn.title}\x1f{txn.amt_dollars}'
+        amt_seen[key] = amt_seen.get(key, 0) + 1
+        fingerprints[i] = hashlib.sha256(f'{key}\x1f{amt_seen[key]}'.encode()).hexdigest()
+    return fingerprints
+
+
+class SubmitJournal:
+    def __init__(self, path: str = JOURNAL_FILE):
+        # written to by the threads that add txns
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+
+    def is_submitted(self, fingerprint: str) -> bool:
+        with self.lock:
+            return self.db.execute('SELECT 1 FROM submitted WHERE fingerprint = ?',
+                                   (fingerprint,)).fetchone() is not None
+
+    def add(self, planned_txn: PlannedTxn) -> None:
+        ch_txn, gb_txn = planned_txn.ch_txn, planned_txn.gb_txn
+        with self.lock:
+            self.db.execute('INSERT OR IGNORE INTO submitted VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (planned_txn.fingerprint, ch_txn.date, ch_txn.title, ch_txn.amt_dollars,
+                             gb_txn.title, gb_txn.envelope, int(time.time())))
+            self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def _is_retryable(e: Exception) -> bool:
+    # connection errors and errors of the server, not of the request
+    return isinstance(e, OSError) or (isinstance(e, SubmitError) and e.retryable)
+
+
+class SubmitQueue:
+    # `backend` is made and logged into with `connect` by `start`, or when the
+    # first txn is added if it wasn't started. txns are added by up to
+    # `max_workers` threads, or fewer if the backend can't be used by that
+    # many at once
+    def __init__(self, connect: Callable[[], SubmitBackend],
+                 envelopes_dict: Dict[str, Union[str, None]], journal: SubmitJournal,
+                 max_workers: int, max_attempts: int = MAX_ATTEMPTS,
+                 backoff_secs: float = BACKOFF_SECS):
+        self.connect = connect
+        self.backend: Optional[SubmitBackend] = None
+        self.envelopes_dict = envelopes_dict
+        self.journal = journal
+        self.max_attempts = max_attempts
+        self.backoff_secs = backoff_secs
+        self.max_workers = max_workers
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.futures: List[Tuple[PlannedTxn, Future]] = []
+
+    def _submit(self, planned_txn: PlannedTxn) -> None:
+        for attempt in range(self.max_attempts):
+            try:
+                # one round-trip to goodbudget
+                with stage('add_txn') as s:
+                    if planned_txn.ch_txn.is_debit:
+                        self.backend.add_expense(self.envelopes_dict, planned_txn.gb_txn,
+                                                 planned_txn.fingerprint)
+                    else:
+                        self.backend.add_income(planned_txn.gb_txn, planned_txn.fingerprint)
+                    s.add_rows(1)
+                break
+            except Exception as e:
+                if attempt == self.max_attempts - 1 or not _is_retryable(e):
+                    raise
+                time.sleep(self.backoff_secs * 2 ** attempt)
+        self.journal.add(planned_txn)
+
+    def start(self) -> None:
+        with stage('login'):
+            self.backend = self.connect()
+        self.executor = ThreadPoolExecutor(min(self.max_workers, self.backend.max_workers))
+
+    def put(self, planned_txn: PlannedTxn) -> None:
+        # a txn that was added in a previous run isn't added again
+        if self.journal.is_submitted(planned_txn.fingerprint):
+            return
+        if self.backend is None:
+            self.start()
+        self.futures.append((planned_txn, self.executor.submit(self._submit, planned_txn)))
+
+    def join(self) -> List[Tuple[PlannedTxn, BaseException]]:
+        # waits for every txn to be added, and returns the txns that couldn't
+        # be, with their errors
+        if self.executor is not None:
+            self.executor.shutdown()
+        errors = [(x, future.exception()) for x, future in self.futures
+                  if future.exception() is not None]
+        if self.backend is not None:
+            self.backend.close()
+        return errors
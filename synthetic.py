@@ -0,0 +1,165 @@
+from datetime import datetime as dt, timedelta
+import random
+import sys
+from typing import List, Optional, Tuple
+
+from match import MAX_DAYS_APART
+
+# writes fake Chase and Goodbudget exports, in the same format as the real ones,
+# so the rest of this repo can be run and benchmarked without real bank data.
+# usage: python3 synthetic.py [--rows=N] [--seed=N] [--dup-amts=RATE] [--skew=DAYS]
+#            [--beyond-skew=RATE] [--in-gb=RATE] [--pending=N] [--malformed=RATE] [OUT_DIR]
+# which writes OUT_DIR/chase.csv and OUT_DIR/goodbudget.csv, in ./in by default
+
+_TITLES = ['AMAZON MKTPLACE PMTS AMZN.COM/BILL', 'NETFLIX.COM', 'SPOTIFY USA',
+           'TRADER JOE S #552 NEW YORK NY', 'VENMO PAYMENT 1019338312', 'CON ED OF NY',
+           'UBER TRIP HELP.UBER.COM', 'SHELL OIL 57444', 'DUANE READE #14179',
+           'ACME CORP PAYROLL PPD ID: 1234567', 'STARBUCKS STORE 07894']
+_ENVELOPES = ['Groceries', 'Rent', 'Bills', '"Eating Out"', 'Transportation', 'Fun',
+              '[Unallocated]']
+# amounts that many txns have, like subscriptions, which make matching harder
+_DUP_AMTS = [-999, -1599]
+_START_DATE = dt(2015, 1, 1)
+
+
+class SyntheticOptions:
+    def __init__(self, dup_amt_rate: float = 0.4, max_skew_days: int = 3,
+                 beyond_skew_rate: float = 0, in_gb_rate: float = 0.9,
+                 amt_pending: int = 0, malformed_rate: float = 0):
+        # share of txns with one of `_DUP_AMTS`. of the others, a third are
+        # credits
+        self.dup_amt_rate = dup_amt_rate
+        # a goodbudget txn is up to `max_skew_days` away from its chase txn,
+        # or, for a share of `beyond_skew_rate` of them, more than
+        # `MAX_DAYS_APART` away, so that they can't be matched
+        self.max_skew_days = max_skew_days
+        self.beyond_skew_rate = beyond_skew_rate
+        # share of chase txns that are in goodbudget too
+        self.in_gb_rate = in_gb_rate
+        # the newest `amt_pending` chase txns are pending, and not in goodbudget
+        self.amt_pending = amt_pending
+        # share of lines of each file that are followed by a line that can't
+        # be parsed
+        self.malformed_rate = malformed_rate
+
+
+def _ch_line(date: dt, title: str, amt_cents: int, bal: str) -> str:
+    deb_or_cred = 'DEBIT' if amt_cents < 0 else 'CREDIT'
+    return f'{deb_or_cred},{date.strftime("%m/%d/%Y")},"{title}",{amt_cents/100:.2f},ACH_DEBIT,{bal},,\n'
+
+
+def _gb_amt(amt_cents: int) -> str:
+    amt = f'{amt_cents/100:,.2f}'
+    return f'"{amt}"' if ',' in amt else amt
+
+
+def _gb_line(date: dt, title: str, envelope: str, amt_cents: int) -> str:
+    date_str = date.strftime("%m/%d/%Y")
+    amt = _gb_amt(amt_cents)
+    if amt_cents < 0:
+        return f'{date_str},{envelope},"Chase Account",{title},,,{amt},CLR,\n'
+    return f'{date_str},,"Chase Account",{title},,,{amt},,"{envelope}|{amt}"\n'
+
+
+def _malformed(line: str, rand: random.Random) -> str:
+    # a line like `line` that neither file format matches: cut off after the
+    # month, with dashes in the date, or with semicolons instead of commas
+    date_i = line.index('/') - 2
+    return rand.choice([line[:date_i + 2] + '\n',
+                        line.replace('/', '-', 2),
+                        line.replace(',', ';')])
+
+
+def synthetic_lines(amt_rows: int, seed: int = 0,
+                    options: Optional[SyntheticOptions] = None) -> Tuple[List[str], List[str]]:
+    # returns the lines of a Chase file and of a Goodbudget file, newest first
+    options = options or SyntheticOptions()
+    rand = random.Random(seed)
+    ch_lines: List[str] = []
+    gb_lines: List[str] = []
+    ch_bal = 0
+    for i in range(amt_rows):
+        date = _START_DATE + timedelta(days=i * 3650 // max(amt_rows, 1))
+        title = rand.choice(_TITLES)
+        if rand.random() < options.dup_amt_rate:
+            amt_cents = rand.choice(_DUP_AMTS)
+        elif rand.random() < 2 / 3:
+            amt_cents = rand.randint(-20000, -100)
+        else:
+            amt_cents = rand.randint(100, 300000)
+
+        # pending txns don't have a balance yet
+        is_pending = i >= amt_rows - options.amt_pending
+        ch_bal += amt_cents
+        ch_lines.append(_ch_line(date, title, amt_cents, ' ' if is_pending else f'{ch_bal/100:.2f}'))
+        if options.malformed_rate and rand.random() < options.malformed_rate:
+            ch_lines.append(_malformed(ch_lines[-1], rand))
+
+        if not is_pending and rand.random() < options.in_gb_rate:
+            if options.beyond_skew_rate and rand.random() < options.beyond_skew_rate:
+                skew_days = rand.choice([-1, 1]) * rand.randint(MAX_DAYS_APART + 1, 2 * MAX_DAYS_APART)
+            else:
+                skew_days = rand.randint(-options.max_skew_days, options.max_skew_days)
+            gb_date = date + timedelta(days=skew_days)
+            gb_lines.append(_gb_line(gb_date, title.title(), rand.choice(_ENVELOPES), amt_cents))
+            if options.malformed_rate and rand.random() < options.malformed_rate:
+                gb_lines.append(_malformed(gb_lines[-1], rand))
+
+    ch_lines.append(
+        'Details,Posting Date,Description,Amount,Type,Balance,Check or Slip #,\n')
+    gb_lines.append(
+        'Date,Envelope,Account,Title,Notes,Check #,Amount,Status,Details\n')
+    ch_lines.reverse()
+    gb_lines.reverse()
+    return ch_lines, gb_lines
+
+
+def write_synthetic_files(ch_file: str, gb_file: str, amt_rows: int, seed: int = 0,
+                          options: Optional[SyntheticOptions] = None) -> None:
+    ch_lines, gb_lines = synthetic_lines(amt_rows, seed, options)
+    with open(ch_file, 'w') as out_file:
+        out_file.writelines(ch_lines)
+    with open(gb_file, 'w') as out_file:
+        out_file.writelines(gb_lines)
+
+
+def _is_rate(s: str) -> bool:
+    try:
+        return 0 <= float(s) <= 1
+    except ValueError:
+        return False
+
+
+if __name__ == "__main__":
+    # parse cmd-line args
+    amt_rows = 10_000
+    seed = 0
+    options = SyntheticOptions()
+    out_dir = './in'
+    for arg in sys.argv[1:]:
+        name, _, value = arg.partition('=')
+        if name == '--rows' and value.isdigit():
+            amt_rows = int(value)
+        elif name == '--seed' and value.isdigit():
+            seed = int(value)
+        elif name == '--dup-amts' and _is_rate(value):
+            options.dup_amt_rate = float(value)
+        elif name == '--skew' and value.isdigit():
+            options.max_skew_days = int(value)
+        elif name == '--beyond-skew' and _is_rate(value):
+            options.beyond_skew_rate = float(value)
+        elif name == '--in-gb' and _is_rate(value):
+            options.in_gb_rate = float(value)
+        elif name == '--pending' and value.isdigit():
+            options.amt_pending = int(value)
+        elif name == '--malformed' and _is_rate(value):
+            options.malformed_rate = float(value)
+        elif not arg.startswith('--'):
+            out_dir = arg
+        else:
+            print("usage: python3 synthetic.py [--rows=N] [--seed=N] [--dup-amts=RATE] [--skew=DAYS]\n"
+                  "           [--beyond-skew=RATE] [--in-gb=RATE] [--pending=N] [--malformed=RATE] [OUT_DIR]")
+            exit(1)
+
+    write_synthetic_files(f'{out_dir}/chase.csv', f'{out_dir}/goodbudget.csv', amt_rows, seed, options)
+    print(f"Wrote {amt_rows} txns to {out_dir}/chase.csv and {out_dir}/goodbudget.csv")
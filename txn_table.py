@@ -0,0 +1,245 @@
+from array import array
+from typing import Callable, Dict, Generic, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from datatypes import ChaseTxn, GoodbudgetTxn
+
+# `ChaseTxnTable` and `GoodbudgetTxnTable` store txns column by column, instead
+# of as one python object per txn. numbers go in typed arrays and strings are
+# dictionary-encoded, so each distinct title, envelope or date is only stored
+# once. indexing a table gives a lightweight row, which has the same attributes
+# as a `ChaseTxn` or a `GoodbudgetTxn` and reads and writes the table directly
+
+_IS_DEBIT = 1
+_IS_PENDING = 2
+
+
+class _StrColumn:
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes = array('I')
+        self._index: Dict[str, int] = {}
+
+    def _code(self, s: str) -> int:
+        code = self._index.get(s)
+        if code is None:
+            code = len(self.values)
+            self._index[s] = code
+            self.values.append(s)
+        return code
+
+    def append(self, s: str) -> None:
+        self.codes.append(self._code(s))
+
+    def extend(self, strs: Iterable[str]) -> None:
+        index, codes = self._index, self.codes
+        for s in strs:
+            code = index.get(s)
+            if code is None:
+                code = self._code(s)
+            codes.append(code)
+
+    def __getitem__(self, i: int) -> str:
+        return self.values[self.codes[i]]
+
+    def __setitem__(self, i: int, s: str) -> None:
+        self.codes[i] = self._code(s)
+
+    def reverse(self) -> None:
+        self.codes.reverse()
+
+
+def _column(name: str) -> property:
+    def get(row: '_TxnRow'):
+        return getattr(row._table, name)[row._i]
+
+    def set_(row: '_TxnRow', value) -> None:
+        getattr(row._table, name)[row._i] = value
+
+    return property(get, set_)
+
+
+def _flag(flag: int) -> property:
+    def get(row: '_TxnRow') -> bool:
+        return bool(row._table.flags[row._i] & flag)
+
+    return property(get)
+
+
+class _TxnRow:
+    __slots__ = ('_table', '_i')
+
+    def __init__(self, table: '_TxnTable', i: int):
+        self._table = table
+        self._i = i
+
+    id_ = _column('id_')
+    ts = _column('ts')
+    amt_cents = _column('amt_cents')
+    bal = _column('bal')
+    date = _column('date')
+    title = _column('title')
+    amt_dollars = _column('amt_dollars')
+
+
+R = TypeVar('R', bound=_TxnRow)
+
+
+class _TxnTable(Generic[R]):
+    row_type: Callable[['_TxnTable', int], R]
+
+    def __init__(self):
+        self.id_ = array('q')
+        self.ts = array('q')
+        self.amt_cents = array('q')
+        self.bal = array('q')
+
+    def _append_common(self, txn) -> None:
+        self.id_.append(txn.id_)
+        self.ts.append(txn.ts)
+        self.amt_cents.append(txn.amt_cents)
+        self.bal.append(txn.bal)
+
+    def _extend_numbers(self, id_: Iterable[int], ts: Iterable[int],
+                        amt_cents: Iterable[int], bal: Iterable[int]) -> None:
+        self.id_.extend(id_)
+        self.ts.extend(ts)
+        self.amt_cents.extend(amt_cents)
+        self.bal.extend(bal)
+
+    def __len__(self) -> int:
+        return len(self.id_)
+
+    def __getitem__(self, i: int) -> R:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('txn table index out of range')
+        return self.row_type(self, i)
+
+    def __iter__(self) -> Iterator[R]:
+        for i in range(len(self)):
+            yield self.row_type(self, i)
+
+    def reverse(self) -> None:
+        for column in self.__dict__.values():
+            column.reverse()
+
+
+class ChaseTxnRow(_TxnRow):
+    __slots__ = ()
+
+    is_debit = _flag(_IS_DEBIT)
+    is_pending = _flag(_IS_PENDING)
+
+    def to_txn(self) -> ChaseTxn:
+        txn = ChaseTxn(self.id_, self.ts, self.is_debit, self.is_pending,
+                       self.date, self.title, self.amt_dollars)
+        txn.bal = self.bal
+        return txn
+
+    # a copy of a row shouldn't copy the whole table
+    def __deepcopy__(self, _) -> ChaseTxn:
+        return self.to_txn()
+
+
+class GoodbudgetTxnRow(_TxnRow):
+    __slots__ = ()
+
+    envelope = _column('envelope')
+    notes = _column('notes')
+
+    def to_txn(self) -> GoodbudgetTxn:
+        txn = GoodbudgetTxn(self.id_, self.ts, self.date, self.title,
+                            self.envelope, self.amt_dollars, self.notes)
+        txn.bal = self.bal
+        return txn
+
+    def __deepcopy__(self, _) -> GoodbudgetTxn:
+        return self.to_txn()
+
+
+class ChaseTxnTable(_TxnTable[ChaseTxnRow]):
+    row_type = ChaseTxnRow
+
+    def __init__(self):
+        super().__init__()
+        self.flags = array('B')
+        self.date = _StrColumn()
+        self.title = _StrColumn()
+        self.amt_dollars = _StrColumn()
+
+    def append(self, txn: ChaseTxn) -> None:
+        self._append_common(txn)
+        self.flags.append((_IS_DEBIT if txn.is_debit else 0)
+                          | (_IS_PENDING if txn.is_pending else 0))
+        self.date.append(txn.date)
+        self.title.append(txn.title)
+        self.amt_dollars.append(txn.amt_dollars)
+
+    def extend(self, txns: Iterable[ChaseTxn]) -> None:
+        for txn in txns:
+            self.append(txn)
+
+    # appends txns column by column, without building a `ChaseTxn` for each
+    def extend_columns(self, id_: Sequence[int], ts: Sequence[int],
+                       is_debit: Sequence[bool], is_pending: Sequence[bool],
+                       date: Sequence[str], title: Sequence[str],
+                       amt_dollars: Sequence[str], amt_cents: Sequence[int],
+                       bal: Sequence[int]) -> None:
+        self._extend_numbers(id_, ts, amt_cents, bal)
+        self.flags.extend([(_IS_DEBIT if debit else 0) | (_IS_PENDING if pending else 0)
+                           for debit, pending in zip(is_debit, is_pending)])
+        self.date.extend(date)
+        self.title.extend(title)
+        self.amt_dollars.extend(amt_dollars)
+
+
+class GoodbudgetTxnTable(_TxnTable[GoodbudgetTxnRow]):
+    row_type = GoodbudgetTxnRow
+
+    def __init__(self):
+        super().__init__()
+        self.date = _StrColumn()
+        self.title = _StrColumn()
+        self.envelope = _StrColumn()
+        self.amt_dollars = _StrColumn()
+        self.notes = _StrColumn()
+
+    def append(self, txn: GoodbudgetTxn) -> None:
+        self._append_common(txn)
+        self.date.append(txn.date)
+        self.title.append(txn.title)
+        self.envelope.append(txn.envelope)
+        self.amt_dollars.append(txn.amt_dollars)
+        self.notes.append(txn.notes)
+
+    def extend(self, txns: Iterable[GoodbudgetTxn]) -> None:
+        for txn in txns:
+            self.append(txn)
+
+    def extend_columns(self, id_: Sequence[int], ts: Sequence[int], date: Sequence[str],
+                       title: Sequence[str], envelope: Sequence[str],
+                       amt_dollars: Sequence[str], notes: Sequence[str],
+                       amt_cents: Sequence[int], bal: Sequence[int]) -> None:
+        self._extend_numbers(id_, ts, amt_cents, bal)
+        self.date.extend(date)
+        self.title.extend(title)
+        self.envelope.extend(envelope)
+        self.amt_dollars.extend(amt_dollars)
+        self.notes.extend(notes)
+
+
+def table_indices(txns: Iterable[Optional[_TxnRow]]) -> Optional[Tuple[_TxnTable, List[Optional[int]]]]:
+    # if every txn is a row of the same table, returns that table and the index
+    # of every row in it, with None where `txns` has None
+    table: Optional[_TxnTable] = None
+    indices: List[Optional[int]] = []
+    for txn in txns:
+        if txn is None:
+            indices.append(None)
+            continue
+        if not isinstance(txn, _TxnRow) or (table is not None and txn._table is not table):
+            return None
+        table = txn._table
+        indices.append(txn._i)
+    return (table, indices) if table is not None else None